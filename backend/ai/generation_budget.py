@@ -0,0 +1,52 @@
+import math
+import threading
+from collections import deque
+
+# Hard ceiling, the old fixed max_tokens
+MAX_TOKENS = 2048
+MIN_TOKENS = 256
+
+# Starting budgets before enough outputs are observed: steps allowed by the
+# prompt x ~20 words each, as JSON, plus the task name and wrapper
+BASE_BUDGETS = {
+    "micro": 1000,
+    "normal": 800,
+    "macro": 600
+}
+
+# Budget = high percentile of observed completions plus headroom
+PERCENTILE = 0.99
+HEADROOM = 1.2
+MIN_SAMPLES = 20
+WINDOW = 500
+
+_lock = threading.Lock()
+_observed = {}
+
+
+def budget_for(step_granularity: str) -> int:
+    """max_tokens for a breakdown at this granularity."""
+    with _lock:
+        samples = sorted(_observed.get(step_granularity, ()))
+
+    if len(samples) < MIN_SAMPLES:
+        return BASE_BUDGETS.get(step_granularity, MAX_TOKENS)
+
+    index = min(len(samples) - 1, math.ceil(PERCENTILE * len(samples)) - 1)
+    budget = math.ceil(samples[index] * HEADROOM)
+    return max(MIN_TOKENS, min(MAX_TOKENS, budget))
+
+
+def record_output(step_granularity: str, completion_tokens: int, truncated: bool = False):
+    """
+    Feed one observed completion length back into the distribution.
+
+    A truncated output only tells us the real length was larger than the
+    budget, so it is recorded as the ceiling to pull the budget up fast.
+    """
+    if completion_tokens is None:
+        return
+
+    with _lock:
+        samples = _observed.setdefault(step_granularity, deque(maxlen=WINDOW))
+        samples.append(MAX_TOKENS if truncated else completion_tokens)
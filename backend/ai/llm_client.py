@@ -1,16 +1,103 @@
 import os
+import logging
+import threading
+import httpx
 from groq import Groq
+from ai.llm_simulator import ReplayLLM, RecordingLLM
 
+logger = logging.getLogger(__name__)
 
-def get_llm():
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _build_http_client() -> httpx.Client:
     """
-    Returns a configured Groq LLM instance.
-    Environment variable required:
-    - GROQ_API_KEY
+    Pooled keep-alive HTTP client shared by every Groq call in this worker,
+    so calls reuse open TCP+TLS connections instead of handshaking each time.
     """
+    return httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=int(_env_float("LLM_MAX_CONNECTIONS", 20)),
+            max_keepalive_connections=int(_env_float("LLM_MAX_KEEPALIVE_CONNECTIONS", 10)),
+            keepalive_expiry=_env_float("LLM_KEEPALIVE_SECONDS", 120)
+        ),
+        timeout=httpx.Timeout(
+            _env_float("LLM_TIMEOUT_SECONDS", 60),
+            connect=_env_float("LLM_CONNECT_TIMEOUT_SECONDS", 5)
+        )
+    )
+
+
+def _build_llm():
+    backend = os.getenv("LLM_BACKEND", "groq").lower()
+
+    if backend == "replay":
+        return ReplayLLM.from_env()
 
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
         raise RuntimeError("GROQ_API_KEY not set in environment variables")
 
-    return Groq(api_key=api_key)
+    client = Groq(
+        api_key=api_key,
+        http_client=_build_http_client(),
+        max_retries=int(_env_float("LLM_MAX_RETRIES", 2))
+    )
+
+    if backend == "record":
+        return RecordingLLM(client, os.getenv("LLM_CASSETTE", "llm_cassette.json"))
+
+    return client
+
+
+def get_llm():
+    """
+    Returns the process-wide LLM client, created on first use.
+
+    LLM_BACKEND selects the backend:
+    - groq (default): live Groq API, requires GROQ_API_KEY
+    - replay: serves recorded completions from LLM_CASSETTE, no network
+    - record: live Groq API, every call appended to LLM_CASSETTE
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_llm()
+
+    return _client
+
+
+def warm_up_llm(connections: int = None):
+    """
+    Pre-open keep-alive connections to Groq in the background so the first
+    task/create of a fresh worker skips the TCP+TLS handshake.
+    """
+    if os.getenv("LLM_BACKEND", "groq").lower() == "replay" or not os.getenv("GROQ_API_KEY"):
+        return
+
+    connections = connections or int(_env_float("LLM_WARM_CONNECTIONS", 2))
+
+    def _open():
+        try:
+            # Cheapest authenticated call; the connection stays in the pool
+            client = get_llm()
+            getattr(client, "client", client).models.list()
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {e}")
+
+    for i in range(connections):
+        threading.Thread(target=_open, name=f"llm-warm-up-{i}", daemon=True).start()
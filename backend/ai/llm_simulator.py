@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+
+FAULT_KINDS = ("rate_limit", "timeout", "malformed", "truncated")
+
+# Rough characters per token for pacing and truncation (English text)
+CHARS_PER_TOKEN = 4
+
+
+class SimulatedAPIError(Exception):
+    """Stand-in for the provider's HTTP errors (e.g. 429)."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+
+
+class SimulatedTimeout(TimeoutError):
+    """Stand-in for a request timeout."""
+
+
+def request_key(model: str, messages: list) -> str:
+    """Cassette key for a request: hash of the model and messages."""
+    raw = json.dumps({"model": model, "messages": messages}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _response(model, content, finish_reason, prompt_tokens, completion_tokens):
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(
+            index=0,
+            message=SimpleNamespace(role="assistant", content=content),
+            finish_reason=finish_reason
+        )],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+    )
+
+
+def _chunk(model, content, finish_reason=None):
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(
+            index=0,
+            delta=SimpleNamespace(content=content),
+            finish_reason=finish_reason
+        )]
+    )
+
+
+def load_cassette(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {"interactions": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class LLMBackend(ABC):
+    """
+    Duck-types the part of the groq.Groq client that ai/task_breaker.py
+    uses: client.chat.completions.create(...).
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @abstractmethod
+    def create(self, model, messages, max_tokens=None, temperature=None, stream=False, **kwargs):
+        """A completion response, or an iterator of chunks when stream=True."""
+
+
+class ReplayLLM(LLMBackend):
+    """
+    Serves recorded completions from a cassette file with realistic pacing.
+
+    Pacing: time-to-first-token, then completion tokens at a fixed rate.
+    speed scales every delay (0 = no sleeping, for fast CI runs).
+    Unknown requests get the cassette entries round-robin unless strict.
+
+    Faults are injected with per-kind probabilities (fault_rates) drawn from
+    a seeded RNG, or forced one at a time with inject_fault().
+    """
+
+    def __init__(self, cassette_path: str, ttft_ms: float = 300, tokens_per_second: float = 250,
+                 speed: float = 1.0, strict: bool = False, fault_rates: dict = None,
+                 seed: int = None, timeout_seconds: float = 30):
+        super().__init__()
+        cassette = load_cassette(cassette_path)
+        self.interactions = cassette["interactions"]
+        self.by_key = {i["key"]: i for i in self.interactions}
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.speed = speed
+        self.strict = strict
+        self.fault_rates = fault_rates or {}
+        self.timeout_seconds = timeout_seconds
+        self._rng = random.Random(seed)
+        self._forced = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            cassette_path=os.getenv("LLM_CASSETTE", "llm_cassette.json"),
+            ttft_ms=float(os.getenv("LLM_REPLAY_TTFT_MS", "300")),
+            tokens_per_second=float(os.getenv("LLM_REPLAY_TPS", "250")),
+            speed=float(os.getenv("LLM_REPLAY_SPEED", "1")),
+            strict=os.getenv("LLM_REPLAY_STRICT", "false").lower() == "true",
+            fault_rates=parse_fault_rates(os.getenv("LLM_FAULTS", "")),
+            seed=int(os.getenv("LLM_FAULT_SEED")) if os.getenv("LLM_FAULT_SEED") else None
+        )
+
+    def inject_fault(self, kind: str, count: int = 1):
+        """Force the next `count` calls to fail with `kind`."""
+        if kind not in FAULT_KINDS:
+            raise ValueError(f"Unknown fault kind: {kind}")
+        with self._lock:
+            self._forced.extend([kind] * count)
+
+    def _pick_fault(self):
+        with self._lock:
+            if self._forced:
+                return self._forced.pop(0)
+            for kind in FAULT_KINDS:
+                rate = self.fault_rates.get(kind, 0)
+                if rate and self._rng.random() < rate:
+                    return kind
+        return None
+
+    def _lookup(self, model, messages):
+        interaction = self.by_key.get(request_key(model, messages))
+        if interaction:
+            return interaction
+
+        if self.strict or not self.interactions:
+            raise SimulatedAPIError(404, "No recorded completion for this request")
+
+        with self._lock:
+            interaction = self.interactions[self._next % len(self.interactions)]
+            self._next += 1
+        return interaction
+
+    def _sleep(self, seconds):
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds * self.speed)
+
+    def create(self, model, messages, max_tokens=None, temperature=None, stream=False, **kwargs):
+        fault = self._pick_fault()
+
+        if fault == "rate_limit":
+            self._sleep(self.ttft_ms / 1000 / 4)
+            raise SimulatedAPIError(429, "Rate limit reached for model")
+
+        if fault == "timeout":
+            self._sleep(kwargs.get("timeout") or self.timeout_seconds)
+            raise SimulatedTimeout("Request timed out.")
+
+        recorded = self._lookup(model, messages)["response"]
+        content = recorded["content"]
+        prompt_tokens = recorded.get("prompt_tokens", 0)
+        completion_tokens = recorded.get("completion_tokens") or max(1, len(content) // CHARS_PER_TOKEN)
+        finish_reason = recorded.get("finish_reason", "stop")
+
+        if fault == "malformed":
+            content = content.replace("{", "", 1).replace('"', "'")
+
+        # Honour max_tokens the way the real API does
+        limit = max_tokens
+        if fault == "truncated":
+            half = max(1, completion_tokens // 2)
+            limit = min(limit, half) if limit else half
+
+        if limit and completion_tokens > limit:
+            content = content[:limit * CHARS_PER_TOKEN]
+            completion_tokens = limit
+            finish_reason = "length"
+
+        if stream:
+            return self._stream(model, content, completion_tokens, finish_reason)
+
+        self._sleep(self.ttft_ms / 1000 + completion_tokens / self.tokens_per_second)
+        return _response(model, content, finish_reason, prompt_tokens, completion_tokens)
+
+    def _stream(self, model, content, completion_tokens, finish_reason):
+        self._sleep(self.ttft_ms / 1000)
+
+        pieces = [content[i:i + CHARS_PER_TOKEN] for i in range(0, len(content), CHARS_PER_TOKEN)]
+        per_piece = (completion_tokens / self.tokens_per_second) / max(len(pieces), 1)
+
+        for piece in pieces:
+            yield _chunk(model, piece)
+            self._sleep(per_piece)
+
+        yield _chunk(model, "", finish_reason)
+
+
+class RecordingLLM(LLMBackend):
+    """Passes calls through to a live client and appends them to a cassette."""
+
+    def __init__(self, client, cassette_path: str):
+        super().__init__()
+        self.client = client
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, max_tokens=None, temperature=None, stream=False, **kwargs):
+        # Always record the full (non-streamed) completion
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        )
+
+        usage = getattr(response, "usage", None)
+        interaction = {
+            "key": request_key(model, messages),
+            "request": {"model": model, "messages": messages, "max_tokens": max_tokens},
+            "response": {
+                "content": response.choices[0].message.content,
+                "finish_reason": response.choices[0].finish_reason,
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(usage, "completion_tokens", 0)
+            }
+        }
+
+        with self._lock:
+            cassette = load_cassette(self.cassette_path)
+            cassette["interactions"] = [
+                i for i in cassette["interactions"] if i["key"] != interaction["key"]
+            ] + [interaction]
+            with open(self.cassette_path, "w", encoding="utf-8") as f:
+                json.dump(cassette, f, indent=2, ensure_ascii=False)
+
+        if stream:
+            content = interaction["response"]["content"]
+            return iter([
+                _chunk(model, content),
+                _chunk(model, "", interaction["response"]["finish_reason"])
+            ])
+
+        return response
+
+
+def parse_fault_rates(spec: str) -> dict:
+    """Parse "rate_limit=0.1,timeout=0.05" into {"rate_limit": 0.1, ...}."""
+    rates = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        kind, _, rate = part.partition("=")
+        kind = kind.strip()
+        if kind not in FAULT_KINDS:
+            raise ValueError(f"Unknown fault kind: {kind}")
+        rates[kind] = float(rate)
+    return rates
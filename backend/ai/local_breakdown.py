@@ -0,0 +1,138 @@
+import re
+from ai.schemas import NeuroUserProfile, NeuroTaskBreakdown, BreakdownStep
+
+MAX_STEPS = 12
+MAX_TASK_NAME = 60
+
+# Minutes per step at each granularity
+STEP_MINUTES = {
+    "micro": 3,
+    "normal": 10,
+    "macro": 25
+}
+
+# Steps a single-action task is expanded into ({task} = the action)
+TEMPLATES = {
+    "micro": [
+        "Get everything you need for: {task}",
+        "Start with the smallest part of: {task}",
+        "Keep going on: {task}",
+        "Finish the last part of: {task}",
+        "Check that it is done"
+    ],
+    "normal": [
+        "Get ready for: {task}",
+        "Do the main part of: {task}",
+        "Finish and check: {task}"
+    ],
+    "macro": [
+        "Start: {task}",
+        "Finish: {task}"
+    ]
+}
+
+# Clause boundaries: sentence ends, semicolons, "then", and commas/"and"
+# in front of a new action verb
+ACTION_VERBS = (
+    "add|answer|ask|book|buy|call|check|clean|clear|close|cook|email|fill|find|finish|fix|"
+    "get|go|make|move|open|order|pack|pay|pick|plan|prepare|print|put|read|reply|review|"
+    "send|set|sign|sort|start|submit|take|text|tidy|update|wash|write"
+)
+CLAUSE_SPLIT = re.compile(
+    rf"[.;!?\n]+|\s*,?\s*\bthen\b\s*|\s*,\s*(?:and\s+)?(?=(?:{ACTION_VERBS})\b)|\s+and\s+(?=(?:{ACTION_VERBS})\b)",
+    re.IGNORECASE
+)
+LEADING_FILLER = re.compile(
+    r"^(?:and|also|after that|first|next|finally|i (?:need|have|want) to|i should|i must|please|to)\s+",
+    re.IGNORECASE
+)
+
+
+def _clauses(text: str) -> list:
+    clauses = []
+    for part in CLAUSE_SPLIT.split(text):
+        part = (part or "").strip(" ,")
+        while True:
+            stripped = LEADING_FILLER.sub("", part)
+            if stripped == part:
+                break
+            part = stripped
+        if part:
+            clauses.append(part[0].upper() + part[1:])
+    return clauses
+
+
+def _merge(texts: list, limit: int) -> list:
+    """Join consecutive texts so there are at most `limit` of them."""
+    size = -(-len(texts) // limit)
+    return [", then ".join(texts[i:i + size]) for i in range(0, len(texts), size)]
+
+
+def _content_limit(minutes: int, break_interval: int) -> int:
+    """Most content steps that fit in MAX_STEPS together with their breaks."""
+    per_break = max(1, break_interval // minutes)
+    limit = MAX_STEPS
+    while limit > 1 and limit + (limit - 1) // per_break > MAX_STEPS:
+        limit -= 1
+    return limit
+
+
+def _difficulty(total_minutes: int) -> int:
+    for level, limit in enumerate((15, 30, 60, 120), start=1):
+        if total_minutes < limit:
+            return level
+    return 5
+
+
+def local_breakdown(task_description: str, user_profile: NeuroUserProfile) -> NeuroTaskBreakdown:
+    """
+    Deterministic breakdown without the LLM, for when it is slow or down.
+
+    Multi-action descriptions become one step per clause; a single action is
+    expanded with the granularity's template. Macro merges clauses into
+    three phases, and long lists are merged until they fit MAX_STEPS with
+    the break steps inserted at the profile's break interval (a break only
+    ever comes before a step, never last).
+    """
+    text = " ".join((task_description or "").split())
+    if not text:
+        raise ValueError("Task description cannot be empty")
+
+    granularity = user_profile.step_granularity
+    minutes = STEP_MINUTES.get(granularity, STEP_MINUTES["normal"])
+    clauses = _clauses(text) or [text]
+
+    if len(clauses) == 1:
+        task = clauses[0][0].lower() + clauses[0][1:]
+        texts = [t.format(task=task) for t in TEMPLATES.get(granularity, TEMPLATES["normal"])]
+    elif granularity == "macro":
+        # At most three phases
+        texts = _merge(clauses, 3)
+    else:
+        texts = clauses
+
+    limit = _content_limit(minutes, user_profile.break_interval_minutes)
+    if len(texts) > limit:
+        texts = _merge(texts, limit)
+
+    steps = []
+    since_break = 0
+    for step_text in texts:
+        if since_break + minutes > user_profile.break_interval_minutes and steps:
+            steps.append(("Take a 5-minute break", 5))
+            since_break = 0
+        steps.append((step_text, minutes))
+        since_break += minutes
+
+    task_name = clauses[0]
+    if len(task_name) > MAX_TASK_NAME:
+        task_name = task_name[:MAX_TASK_NAME - 3].rstrip() + "..."
+
+    return NeuroTaskBreakdown(
+        task_name=task_name,
+        difficulty_level=_difficulty(sum(m for _, m in steps)),
+        breakdown=[
+            BreakdownStep(step_number=number, step_task=step_text, estimated_time_minutes=step_minutes)
+            for number, (step_text, step_minutes) in enumerate(steps, start=1)
+        ]
+    )
@@ -54,3 +54,12 @@ class NeuroTaskBreakdown(BaseModel):
     breakdown: List[BreakdownStep] = Field(
         description="High-level phases of the task"
     )
+
+
+class SubStepBreakdown(BaseModel):
+    """A single stuck step re-broken into smaller steps"""
+    sub_steps: List[BreakdownStep] = Field(
+        min_length=2,
+        max_length=5,
+        description="Smaller steps that together replace the stuck step"
+    )
@@ -1,8 +1,16 @@
 import re
 import json
+import time
 from typing import Optional
 from ai.llm_client import get_llm
-from ai.schemas import NeuroUserProfile, NeuroTaskBreakdown
+from ai.generation_budget import budget_for, record_output, MAX_TOKENS
+from ai.usage_ledger import record_usage
+from ai.schemas import NeuroUserProfile, NeuroTaskBreakdown, SubStepBreakdown
+
+MODEL = "llama-3.3-70b-versatile"  # Updated from deprecated mixtral-8x7b-32768
+
+# 2-5 short sub-steps as JSON; retried once at double if cut short
+SPLIT_MAX_TOKENS = 300
 
 
 def mask_pii_simple(text: str) -> str:
@@ -21,18 +29,23 @@ def mask_pii_simple(text: str) -> str:
     return text
 
 
-def build_prompt(user_profile: NeuroUserProfile, task_description: str) -> str:
-    """Build neurodivergent-friendly prompt"""
-    
-    prompt = f"""You are a neurodivergent-friendly task breakdown assistant.
-
-User Profile:
+def profile_block(user_profile: NeuroUserProfile) -> str:
+    """The "User Profile" section shared by every prompt"""
+    return f"""User Profile:
 - Neurodivergence: {user_profile.neurodivergence}
 - Break Interval: {user_profile.break_interval_minutes} minutes
 - Fatigue Triggers: {', '.join(user_profile.fatigue_triggers or ['none'])}
 - AI Tone: {', '.join(user_profile.ai_tone)}
 - Response Verbosity: {user_profile.response_verbosity}/5
-- Step Granularity: {user_profile.step_granularity}
+- Step Granularity: {user_profile.step_granularity}"""
+
+
+def build_prompt(user_profile: NeuroUserProfile, task_description: str) -> str:
+    """Build neurodivergent-friendly prompt"""
+    
+    prompt = f"""You are a neurodivergent-friendly task breakdown assistant.
+
+{profile_block(user_profile)}
 
 Task: {task_description}
 
@@ -57,6 +70,62 @@ Return ONLY a valid JSON object (no markdown, no explanation) with this structur
     return prompt
 
 
+def build_split_prompt(user_profile: NeuroUserProfile, task_name: str, step_text: str) -> str:
+    """Prompt for re-breaking one stuck step (no full task, no other steps)"""
+
+    return f"""{profile_block(user_profile)}
+
+Task: {task_name}
+Stuck step: {step_text}
+
+This step is too big for the user. Split it into 2-5 smaller steps that together do the same thing.
+
+Return ONLY a valid JSON object (no markdown, no explanation):
+{{"sub_steps": [{{"step_number": 1, "step_task": "one clear action", "estimated_time_minutes": 2}}]}}"""
+
+
+def _complete(groq_client, messages, max_tokens: int, user_profile: NeuroUserProfile, track_budget: bool = True):
+    """
+    Call Groq once and record token usage + latency in the ledger.
+
+    track_budget=False keeps outputs of other prompt shapes out of the
+    breakdown budget distribution.
+    """
+    started = time.monotonic()
+
+    # Call Groq API with error handling
+    try:
+        response = groq_client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+    except Exception as e:
+        raise ValueError(f"Groq API call failed: {str(e)}")
+
+    latency_ms = int((time.monotonic() - started) * 1000)
+    usage = getattr(response, "usage", None)
+    finish_reason = response.choices[0].finish_reason
+    completion_tokens = getattr(usage, "completion_tokens", None)
+
+    if track_budget:
+        record_output(user_profile.step_granularity, completion_tokens, finish_reason == "length")
+    record_usage({
+        "user_id": user_profile.user_id,
+        "neurodivergence": user_profile.neurodivergence,
+        "step_granularity": user_profile.step_granularity,
+        "model": MODEL,
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": completion_tokens,
+        "max_tokens": max_tokens,
+        "finish_reason": finish_reason,
+        "latency_ms": latency_ms
+    })
+
+    return response
+
+
 def generate_neuro_task_breakdown(
     task_description: str,
     user_profile: Optional[NeuroUserProfile] = None
@@ -95,20 +164,23 @@ def generate_neuro_task_breakdown(
     # Build prompt
     prompt_text = build_prompt(user_profile, safe_task_text)
     
-    # Call Groq API with error handling
-    try:
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # Updated from deprecated mixtral-8x7b-32768
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that returns only valid JSON."},
-                {"role": "user", "content": prompt_text}
-            ],
-            temperature=0.3,
-            max_tokens=2048
-        )
-    except Exception as e:
-        raise ValueError(f"Groq API call failed: {str(e)}")
-    
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant that returns only valid JSON."},
+        {"role": "user", "content": prompt_text}
+    ]
+
+    # Budget sized to the granularity's observed output lengths
+    max_tokens = budget_for(user_profile.step_granularity)
+    response = _complete(groq_client, messages, max_tokens, user_profile)
+
+    # Retry once at the ceiling if the adaptive budget cut the output short
+    if response.choices[0].finish_reason == "length" and max_tokens < MAX_TOKENS:
+        response = _complete(groq_client, messages, MAX_TOKENS, user_profile)
+
+    return NeuroTaskBreakdown(**_parse_json(response))
+
+
+def _parse_json(response) -> dict:
     # Extract JSON from response
     response_text = response.choices[0].message.content.strip()
     
@@ -119,8 +191,32 @@ def generate_neuro_task_breakdown(
     
     # Parse JSON
     try:
-        json_data = json.loads(response_text)
-        return NeuroTaskBreakdown(**json_data)
-    except (json.JSONDecodeError, Exception) as e:
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
         raise ValueError(f"Failed to parse LLM response: {e}\nResponse: {response_text}")
 
+
+def generate_sub_steps(task_name: str, step_text: str, user_profile: NeuroUserProfile):
+    """
+    Re-break a single step into smaller ones with a small output budget.
+
+    Returns:
+        Parsed SubStepBreakdown object
+    """
+    groq_client = get_llm()
+
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant that returns only valid JSON."},
+        {"role": "user", "content": build_split_prompt(
+            user_profile,
+            mask_pii_simple(task_name),
+            mask_pii_simple(step_text)
+        )}
+    ]
+
+    response = _complete(groq_client, messages, SPLIT_MAX_TOKENS, user_profile, track_budget=False)
+
+    if response.choices[0].finish_reason == "length":
+        response = _complete(groq_client, messages, SPLIT_MAX_TOKENS * 2, user_profile, track_budget=False)
+
+    return SubStepBreakdown(**_parse_json(response))
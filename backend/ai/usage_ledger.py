@@ -0,0 +1,176 @@
+import queue
+import atexit
+import logging
+import threading
+from database.db import get_db_connection, shard_count
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = 5
+FLUSH_BATCH_SIZE = 100
+
+LEDGER_COLUMNS = [
+    "user_id",
+    "neurodivergence",
+    "step_granularity",
+    "model",
+    "prompt_tokens",
+    "completion_tokens",
+    "max_tokens",
+    "finish_reason",
+    "latency_ms"
+]
+
+_queue = queue.Queue(maxsize=10000)
+_worker = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def record_usage(entry: dict):
+    """
+    Queue one LLM call for the ledger. Never blocks the request: if the
+    queue is full the entry is dropped and logged.
+    """
+    _ensure_worker()
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        logger.warning("LLM usage ledger queue full, dropping entry")
+
+    if _queue.qsize() >= FLUSH_BATCH_SIZE:
+        _wake.set()
+
+
+def flush():
+    """Write every queued entry, one batch insert per user on their shard."""
+    entries = []
+    while True:
+        try:
+            entries.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    if not entries:
+        return
+
+    by_user = {}
+    for entry in entries:
+        by_user.setdefault(entry["user_id"], []).append([entry.get(c) for c in LEDGER_COLUMNS])
+
+    for user_id, rows in by_user.items():
+        conn = None
+        try:
+            # Routed like the user's other writes, so moved users are followed
+            conn = get_db_connection(user_id=user_id)
+            cursor = conn.cursor()
+            cursor.fast_executemany = True
+            cursor.executemany(
+                f"""
+                INSERT INTO llm_usage ({', '.join(LEDGER_COLUMNS)})
+                VALUES ({', '.join('?' for _ in LEDGER_COLUMNS)})
+                """,
+                rows
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"LLM usage ledger flush failed for user {user_id}: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def _run():
+    while True:
+        # Flush on a timer, or early once a full batch is waiting
+        _wake.wait(FLUSH_INTERVAL_SECONDS)
+        _wake.clear()
+        flush()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="llm-usage-ledger", daemon=True)
+            _worker.start()
+            atexit.register(flush)
+
+
+GROUP_KEYS = {
+    "user": ["user_id"],
+    "profile": ["neurodivergence", "step_granularity"]
+}
+
+
+def usage_aggregates(cursor, group_by: str = "user", days: int = 30) -> list:
+    """
+    Token and latency totals over the last `days` days on one shard.
+
+    group_by="user" groups per user_id, group_by="profile" per
+    (neurodivergence, step_granularity). Rows carry sums and counts, so
+    rows of several shards can be merged (see usage_report).
+    """
+    key_sql = ", ".join(GROUP_KEYS[group_by])
+
+    cursor.execute(
+        f"""
+        SELECT {key_sql},
+               COUNT(*) AS calls,
+               SUM(prompt_tokens) AS prompt_tokens,
+               SUM(completion_tokens) AS completion_tokens,
+               COUNT(completion_tokens) AS completion_samples,
+               SUM(CAST(latency_ms AS BIGINT)) AS latency_ms,
+               COUNT(latency_ms) AS latency_samples,
+               SUM(CASE WHEN finish_reason = 'length' THEN 1 ELSE 0 END) AS truncated
+        FROM llm_usage
+        WHERE created_at >= DATEADD(day, -?, SYSDATETIME())
+        GROUP BY {key_sql}
+        """,
+        (days,)
+    )
+
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def merge_aggregates(rows, group_by: str = "user") -> list:
+    """
+    Merge usage_aggregates rows of several shards (a user's calls from
+    before a move stay on the shard they left) and add the averages.
+    Sorted by completion tokens, largest first.
+    """
+    keys = GROUP_KEYS[group_by]
+    totals = {}
+    sums = ("calls", "prompt_tokens", "completion_tokens", "completion_samples",
+            "latency_ms", "latency_samples", "truncated")
+
+    for row in rows:
+        total = totals.setdefault(tuple(row[k] for k in keys), {k: row[k] for k in keys})
+        for column in sums:
+            total[column] = total.get(column, 0) + (row[column] or 0)
+
+    merged = []
+    for total in totals.values():
+        completion_samples = total.pop("completion_samples")
+        latency_ms = total.pop("latency_ms")
+        latency_samples = total.pop("latency_samples")
+        total["avg_completion_tokens"] = total["completion_tokens"] / completion_samples if completion_samples else None
+        total["avg_latency_ms"] = latency_ms / latency_samples if latency_samples else None
+        merged.append(total)
+
+    return sorted(merged, key=lambda total: total["completion_tokens"], reverse=True)
+
+
+def usage_report(group_by: str = "user", days: int = 30) -> list:
+    """usage_aggregates over every shard, merged."""
+    rows = []
+    for shard in range(shard_count()):
+        conn = get_db_connection(shard=shard, read_only=True)
+        try:
+            rows.extend(usage_aggregates(conn.cursor(), group_by, days))
+        finally:
+            conn.close()
+    return merge_aggregates(rows, group_by)
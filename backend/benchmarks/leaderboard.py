@@ -0,0 +1,48 @@
+"""
+In-process leaderboard (user/leaderboard.py SortedBoard) at scale.
+
+Builds a board of N users with random scores, then times score updates,
+top-N reads and rank-and-neighbours reads, the three operations behind
+user/leaderboard and record_scores.
+
+Run from backend/:  python -m benchmarks.leaderboard [--users N] [--ops N]
+"""
+import time
+import random
+import argparse
+from user.leaderboard import SortedBoard
+
+
+def _time(operation, ops: int) -> float:
+    start = time.perf_counter()
+    for n in range(ops):
+        operation(n)
+    return (time.perf_counter() - start) / ops * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    scores = {f"user-{n}": rng.randrange(1, 50000) for n in range(args.users)}
+    user_ids = list(scores)
+
+    start = time.perf_counter()
+    board = SortedBoard(scores)
+    print(f"build {args.users} users: {time.perf_counter() - start:.2f} s")
+
+    updates = [(rng.choice(user_ids), rng.randrange(1, 50000)) for _ in range(args.ops)]
+    lookups = [rng.choice(user_ids) for _ in range(args.ops)]
+
+    print(f"{'operation':<22}{'us/op':>10}")
+    print(f"{'update':<22}{_time(lambda n: board.update(*updates[n]), args.ops):>10.1f}")
+    print(f"{'top 10':<22}{_time(lambda n: board.top(10), args.ops):>10.1f}")
+    print(f"{'top 100':<22}{_time(lambda n: board.top(100), args.ops):>10.1f}")
+    print(f"{'around 3':<22}{_time(lambda n: board.around(lookups[n], 3), args.ops):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
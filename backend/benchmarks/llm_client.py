@@ -0,0 +1,95 @@
+"""
+A new HTTP client per LLM call against the pooled client get_llm uses.
+
+Sends the same GET through a fresh httpx.Client per call (a new TCP and,
+for https, TLS handshake every time) and through one client built by
+_build_http_client (keep-alive connections reused), then prints latency
+percentiles for both. Without --url a local keep-alive server is used,
+which only shows the TCP part; point --url at the Groq API (an
+unauthenticated GET is enough) to include the TLS handshake.
+
+Run from backend/:  python -m benchmarks.llm_client [--url URL] [--calls N]
+"""
+import time
+import argparse
+import threading
+import httpx
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ai.llm_client import _build_http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as two writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every reused connection
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"object": "list", "data": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _local_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def _time_calls(url: str, calls: int, client_for_call) -> list:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client_for_call(url)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Endpoint to call (default: a local keep-alive server)")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server = _local_server()
+        url = f"http://127.0.0.1:{server.server_address[1]}/openai/v1/models"
+
+    def new_client(url):
+        with httpx.Client() as client:
+            client.get(url)
+
+    pooled = _build_http_client()
+
+    try:
+        # One untimed call each so the pooled client's first handshake and
+        # import costs don't skew either side
+        new_client(url)
+        pooled.get(url)
+
+        print(f"{'client':<12}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}")
+        for name, call in (("per-call", new_client), ("pooled", pooled.get)):
+            samples = _time_calls(url, args.calls, call)
+            print(f"{name:<12}{args.calls:>7}{_percentile(samples, 0.5):>10.2f}"
+                  f"{_percentile(samples, 0.95):>10.2f}{sum(samples) / 1000:>10.2f}")
+    finally:
+        pooled.close()
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+The LLM create path against the replay backend.
+
+Measures the simulator's own per-call overhead (no pacing), then
+throughput and latency percentiles of concurrent calls with realistic
+pacing, so a change to the create path can be compared without network
+or API keys.
+
+Run from backend/:  python -m benchmarks.llm_replay [--cassette PATH] [--calls N] [--workers N]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from ai.llm_simulator import ReplayLLM
+
+MODEL = "llama-3.3-70b-versatile"
+MESSAGES = [{"role": "user", "content": "Break down: write the quarterly report"}]
+
+
+def _synthetic_cassette(path: str):
+    content = json.dumps({
+        "task_name": "Write the quarterly report",
+        "difficulty_level": 3,
+        "breakdown": [
+            {"step_number": n, "step_task": f"Write section {n} of the report", "estimated_time_minutes": 10}
+            for n in range(1, 9)
+        ]
+    })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"interactions": [{
+            "key": "synthetic",
+            "response": {"content": content, "finish_reason": "stop", "prompt_tokens": 300}
+        }]}, f)
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cassette", help="Recorded cassette (default: a synthetic one)")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--speed", type=float, default=0.1, help="Pacing scale for the concurrent run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cassette = args.cassette
+        if not cassette:
+            cassette = os.path.join(tmp, "cassette.json")
+            _synthetic_cassette(cassette)
+
+        llm = ReplayLLM(cassette, speed=0)
+        calls = 20000
+        start = time.perf_counter()
+        for _ in range(calls):
+            llm.chat.completions.create(model=MODEL, messages=MESSAGES, max_tokens=800)
+        print(f"create overhead: {(time.perf_counter() - start) / calls * 1e6:.1f} us/call")
+
+        llm = ReplayLLM(cassette, speed=args.speed)
+        latencies = []
+
+        def call(_):
+            started = time.perf_counter()
+            llm.chat.completions.create(model=MODEL, messages=MESSAGES, max_tokens=800)
+            latencies.append(time.perf_counter() - started)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(call, range(args.calls)))
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{args.calls} calls, {args.workers} workers, speed {args.speed}: "
+            f"{args.calls / elapsed:.1f} calls/s, "
+            f"p50 {_percentile(latencies, 0.5) * 1000:.0f} ms, p95 {_percentile(latencies, 0.95) * 1000:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
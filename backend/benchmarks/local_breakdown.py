@@ -0,0 +1,42 @@
+"""
+Cost of the local (no-LLM) breakdown that task/create falls back to.
+
+Times local_breakdown for short, multi-clause and very long task
+descriptions at each granularity, including schema validation of the
+result, against the LLM deadline it stands in for.
+
+Run from backend/:  python -m benchmarks.local_breakdown [--runs N]
+"""
+import time
+import argparse
+from ai.schemas import NeuroUserProfile
+from ai.local_breakdown import local_breakdown
+
+DESCRIPTIONS = {
+    "single": "write the quarterly report",
+    "clauses": "Email Sam, then call the bank and pay the rent; clean the kitchen and buy milk",
+    "long": ". ".join(f"write section {n} of the thesis and check the references" for n in range(1, 101)),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'description':<12}{'granularity':<13}{'steps':>6}{'us/call':>10}")
+    for name, description in DESCRIPTIONS.items():
+        for granularity in ("micro", "normal", "macro"):
+            profile = NeuroUserProfile(user_id="bench", step_granularity=granularity)
+            breakdown = local_breakdown(description, profile)
+
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                local_breakdown(description, profile)
+            elapsed = (time.perf_counter() - start) / args.runs * 1e6
+
+            print(f"{name:<12}{granularity:<13}{len(breakdown.breakdown):>6}{elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
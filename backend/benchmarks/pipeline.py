@@ -0,0 +1,68 @@
+"""
+Per-request overhead of the shared response pipeline.
+
+Compares a handler wrapped in shared.pipeline with the old inline path
+(json.dumps + func.HttpResponse + CORS headers), for a small and a large
+payload, JSON and MessagePack, with and without compression.
+
+Run from backend/:  python -m benchmarks.pipeline [--requests N]
+"""
+import json
+import time
+import argparse
+import azure.functions as func
+from shared.pipeline import pipeline, CORS_HEADERS
+
+SMALL = {"task_id": 1234, "step_number": 2, "step_text": "Open the document", "estimated_time_minutes": 5}
+LARGE = {
+    "task_id": 1234,
+    "steps": [[n, f"Step {n}: write the next paragraph of the report", 10, n < 4] for n in range(1, 11)]
+}
+
+
+def _request(accept=None, accept_encoding=None):
+    headers = {}
+    if accept:
+        headers["Accept"] = accept
+    if accept_encoding:
+        headers["Accept-Encoding"] = accept_encoding
+    return func.HttpRequest(method="GET", url="/api/bench", headers=headers, body=b"")
+
+
+def _inline(payload):
+    def handler(req):
+        return func.HttpResponse(json.dumps(payload), mimetype="application/json", headers=dict(CORS_HEADERS))
+    return handler
+
+
+def _time(handler, req, requests: int) -> float:
+    for _ in range(min(requests, 1000)):
+        handler(req)
+    start = time.perf_counter()
+    for _ in range(requests):
+        handler(req)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = [
+        ("small json", SMALL, _request()),
+        ("large json", LARGE, _request()),
+        ("large json gzip", LARGE, _request(accept_encoding="gzip")),
+        ("large json br", LARGE, _request(accept_encoding="br")),
+        ("large msgpack", LARGE, _request(accept="application/msgpack"))
+    ]
+
+    print(f"{'case':<18}{'inline us':>12}{'pipeline us':>14}{'overhead us':>14}")
+    for name, payload, req in cases:
+        inline = _time(_inline(payload), req, args.requests)
+        wrapped = _time(pipeline(lambda r, p=payload: p), req, args.requests)
+        print(f"{name:<18}{inline:>12.1f}{wrapped:>14.1f}{wrapped - inline:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Step storage: task_steps rows vs packed blobs (STEP_STORAGE_MODE).
+
+Creates N tasks of S steps in each format for a scratch user, then
+reports storage per task (used pages of tasks + task_steps, all indexes)
+and the latency of the get-current-step and mark-done handlers.
+
+Needs a database (DB_CONNECTION_STRING or DB_SHARD_CONNECTION_STRINGS);
+run it against an otherwise idle one, since page counts are compared
+before and after the inserts. The scratch rows are deleted afterwards.
+
+Run from backend/:  python -m benchmarks.steps [--tasks N] [--steps S]
+"""
+import time
+import uuid
+import argparse
+import azure.functions as func
+from database.db import get_db_connection
+from task.step_store import encode_steps, FORMAT_GZIP_JSON
+from task.get_current_step import handle_get_current_step
+from task.mark_step_done import handle_mark_step_done
+
+PAGE_BYTES = 8192
+
+
+def _used_bytes(cursor) -> int:
+    cursor.execute(
+        """
+        SELECT SUM(used_page_count) FROM sys.dm_db_partition_stats
+        WHERE object_id IN (OBJECT_ID('tasks'), OBJECT_ID('task_steps'))
+        """
+    )
+    return cursor.fetchone()[0] * PAGE_BYTES
+
+
+def _create(cursor, user_id: str, packed: bool, tasks: int, step_count: int) -> list:
+    steps = [(f"Step {n}: write the next paragraph of the report", 10) for n in range(1, step_count + 1)]
+    task_ids = []
+
+    for _ in range(tasks):
+        if packed:
+            cursor.execute(
+                """
+                INSERT INTO tasks (user_id, task_name, difficulty_level, steps_blob, steps_format, step_count, steps_done_mask)
+                OUTPUT INSERTED.task_id
+                VALUES (?, 'Benchmark task', 3, ?, ?, ?, 0)
+                """,
+                (user_id, encode_steps(steps), FORMAT_GZIP_JSON, step_count)
+            )
+            task_ids.append(cursor.fetchone()[0])
+        else:
+            cursor.execute(
+                "INSERT INTO tasks (user_id, task_name, difficulty_level) OUTPUT INSERTED.task_id VALUES (?, 'Benchmark task', 3)",
+                (user_id,)
+            )
+            task_id = cursor.fetchone()[0]
+            cursor.fast_executemany = True
+            cursor.executemany(
+                "INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes) VALUES (?, ?, ?, ?)",
+                [(task_id, n, text, minutes) for n, (text, minutes) in enumerate(steps, start=1)]
+            )
+            task_ids.append(task_id)
+
+    return task_ids
+
+
+def _time(handler, requests: list) -> tuple:
+    samples = []
+    for req in requests:
+        start = time.perf_counter()
+        handler(req)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return sum(samples) / len(samples), samples[int(0.95 * (len(samples) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--steps", type=int, default=8)
+    args = parser.parse_args()
+
+    user_id = f"bench-{uuid.uuid4().hex[:12]}"
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text')",
+        (user_id,)
+    )
+    conn.commit()
+
+    print(f"{'mode':<8}{'bytes/task':>12}{'read ms':>10}{'read p95':>10}{'done ms':>10}{'done p95':>10}")
+    try:
+        for mode in ("rows", "packed"):
+            before = _used_bytes(cursor)
+            task_ids = _create(cursor, user_id, mode == "packed", args.tasks, args.steps)
+            conn.commit()
+            size = (_used_bytes(cursor) - before) / args.tasks
+
+            read = _time(handle_get_current_step, [
+                func.HttpRequest(method="GET", url="/api/task/current-step", params={"task_id": str(t)}, body=b"")
+                for t in task_ids
+            ])
+            done = _time(handle_mark_step_done, [
+                func.HttpRequest(method="POST", url="/api/task/mark-done", body=f'{{"task_id": {t}}}'.encode())
+                for t in task_ids
+            ])
+            print(f"{mode:<8}{size:>12.0f}{read[0]:>10.2f}{read[1]:>10.2f}{done[0]:>10.2f}{done[1]:>10.2f}")
+
+    finally:
+        cursor.execute(
+            """
+            DELETE FROM activity_events WHERE user_id = ?;
+            DELETE s FROM task_steps s JOIN tasks t ON t.task_id = s.task_id WHERE t.user_id = ?;
+            DELETE FROM tasks WHERE user_id = ?;
+            DELETE FROM users WHERE user_id = ?;
+            """,
+            (user_id,) * 4
+        )
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
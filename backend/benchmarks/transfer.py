@@ -0,0 +1,75 @@
+"""
+File-side throughput of the data transfer chunk format.
+
+Writes synthetic task and step rows as gzipped NDJSON the way
+export_data does and reads them back the way import_data does, so the
+database side can be compared against the rows/s they log.
+
+Run from backend/:  python -m benchmarks.transfer [--rows N]
+"""
+import os
+import gzip
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+from database.transfer import _type_name, _encode, _decode
+
+CREATED = datetime(2026, 3, 1, 9, 30)
+
+
+def _rows(kind: str, count: int):
+    if kind == "tasks":
+        for n in range(count):
+            yield [n + 1, f"user-{n % 1000}", f"Task {n}", 3, 1, "active", CREATED, None, None, 6, None]
+    else:
+        for n in range(count):
+            yield [n + 1, n // 6 + 1, n % 6 + 1, f"Step {n % 6 + 1}: write the next paragraph", 10, False]
+
+
+def _write(path: str, rows) -> dict:
+    types = {}
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        for row in rows:
+            for i, value in enumerate(row):
+                type_name = _type_name(value)
+                if type_name:
+                    types[i] = type_name
+            out.write(json.dumps([_encode(v) for v in row]) + "\n")
+    return types
+
+
+def _read(path: str, types: dict) -> int:
+    count = 0
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            [_decode(v, types.get(i)) for i, v in enumerate(json.loads(line))]
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'table':<12}{'export rows/s':>16}{'import rows/s':>16}{'bytes/row':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in ("tasks", "task_steps"):
+            path = os.path.join(tmp, f"{kind}.ndjson.gz")
+
+            start = time.perf_counter()
+            types = _write(path, _rows(kind, args.rows))
+            written = time.perf_counter() - start
+
+            start = time.perf_counter()
+            _read(path, types)
+            read = time.perf_counter() - start
+
+            size = os.path.getsize(path) / args.rows
+            print(f"{kind:<12}{args.rows / written:>16.0f}{args.rows / read:>16.0f}{size:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,374 @@
 import os
+import json
+import time
+import bisect
+import hashlib
+import logging
+import threading
 import pyodbc
+from database import metrics
+from shared import profiling
+
+logger = logging.getLogger(__name__)
+
+# Each shard's tasks.task_id IDENTITY starts at shard * TASK_ID_SHARD_SPAN + 1,
+# so a task id alone tells us its shard. Shard 0 keeps IDENTITY(1,1), which
+# keeps single-database deployments unchanged. 2^24 ids per shard leaves
+# room for 127 shards inside INT.
+TASK_ID_SHARD_SPAN = 1 << 24
+
+# Points per shard on the hash ring; more points = more even spread
+VIRTUAL_NODES = 128
+
+# After a write, that user's / task's reads stay on the primary this long
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+
+# Replica reads are skipped while measured lag exceeds this (bounded staleness)
+MAX_REPLICA_LAG_SECONDS = float(os.getenv("MAX_REPLICA_LAG_SECONDS", "5"))
+LAG_SAMPLE_SECONDS = 30
+
+# Users the rebalancer moved off their ring shard, learned from the
+# moved_users forwarding rows on the shards they left (user_id -> shard),
+# and the old task ids of their tasks (old task_id -> newer task_id)
+MOVED_CACHE_SIZE = 100000
+
+# Forwarding rows followed for one task id before giving up: one per move
+MAX_TASK_HOPS = 16
+
+_rings = {}
+
+_moved_lock = threading.Lock()
+_moved = {}
+_moved_tasks = {}
+
+_watermark_lock = threading.Lock()
+_last_writes = {}
+_replica_lag = {}
+
+
+def get_shard_connection_strings() -> list:
+    """
+    Connection strings for every shard, in shard order.
+
+    DB_SHARD_CONNECTION_STRINGS holds a JSON list. Without it the app runs
+    on a single shard from DB_CONNECTION_STRING.
+    """
+    raw = os.getenv("DB_SHARD_CONNECTION_STRINGS")
+    if raw:
+        return json.loads(raw)
 
-def get_db_connection():
     connection_string = os.getenv("DB_CONNECTION_STRING")
 
     if not connection_string:
         raise Exception("DB_CONNECTION_STRING not set")
 
-    conn = pyodbc.connect(connection_string)
-    return conn
\ No newline at end of file
+    return [connection_string]
+
+
+def shard_count() -> int:
+    return len(get_shard_connection_strings())
+
+
+def ring_size() -> int:
+    """
+    Number of shards users are hashed over.
+
+    Defaults to every configured shard. DB_SHARD_RING_SIZE lets a new shard
+    be configured (and filled by the rebalancer) before users route to it.
+    """
+    return int(os.getenv("DB_SHARD_RING_SIZE") or shard_count())
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def _ring(size: int):
+    if size not in _rings:
+        points = sorted(
+            (_hash(f"shard-{shard}#{node}"), shard)
+            for shard in range(size)
+            for node in range(VIRTUAL_NODES)
+        )
+        _rings[size] = ([p[0] for p in points], [p[1] for p in points])
+    return _rings[size]
+
+
+def shard_for_user(user_id: str, size: int = None) -> int:
+    """Consistent-hash a user onto one of `size` shards."""
+    size = size or ring_size()
+    if size == 1:
+        return 0
+
+    keys, shards = _ring(size)
+    index = bisect.bisect(keys, _hash(str(user_id))) % len(keys)
+    return shards[index]
+
+
+def shard_for_task(task_id) -> int:
+    """Shard encoded in a task id. Raises ValueError for non-numeric ids."""
+    return int(task_id) // TASK_ID_SHARD_SPAN
+
+
+def get_read_connection_strings() -> list:
+    """
+    Read-only (secondary) connection strings, in shard order.
+
+    DB_READ_CONNECTION_STRINGS holds a JSON list. Without it each primary
+    string gets ApplicationIntent=ReadOnly, which Azure SQL routes to its
+    read-scale replica.
+    """
+    raw = os.getenv("DB_READ_CONNECTION_STRINGS")
+    if raw:
+        return json.loads(raw)
+
+    return [
+        cs.rstrip(";") + ";ApplicationIntent=ReadOnly"
+        for cs in get_shard_connection_strings()
+    ]
+
+
+def _watermark_keys(user_id, task_id) -> list:
+    keys = []
+    if user_id is not None:
+        keys.append(f"user:{user_id}")
+    if task_id is not None:
+        keys.append(f"task:{task_id}")
+    return keys
+
+
+def mark_write(user_id=None, task_id=None):
+    """Pin a user's / task's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    now = time.monotonic()
+    with _watermark_lock:
+        for key in _watermark_keys(user_id, task_id):
+            _last_writes[key] = now
+
+
+def _recently_written(user_id, task_id) -> bool:
+    cutoff = time.monotonic() - READ_YOUR_WRITES_SECONDS
+    with _watermark_lock:
+        # Drop expired entries while we hold the lock
+        if len(_last_writes) > 10000:
+            for key in [k for k, t in _last_writes.items() if t < cutoff]:
+                del _last_writes[key]
+        return any(
+            _last_writes.get(key, 0) >= cutoff
+            for key in _watermark_keys(user_id, task_id)
+        )
+
+
+def _sample_replica_lag(shard: int, conn) -> float:
+    """
+    Measure replica lag at most every LAG_SAMPLE_SECONDS per shard.
+
+    Lag that can't be measured (the query fails or reports nothing) is
+    taken as unbounded, so reads stay on the primary until a sample works.
+    """
+    now = time.monotonic()
+    sampled_at, lag = _replica_lag.get(shard, (0, 0.0))
+
+    if now - sampled_at < LAG_SAMPLE_SECONDS:
+        return lag
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT MAX(secondary_lag_seconds) FROM sys.dm_database_replica_states"
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        lag = float(row[0]) if row and row[0] is not None else float("inf")
+    except Exception as e:
+        logger.warning(f"Replica lag check failed on shard {shard}: {e}")
+        lag = float("inf")
+
+    _replica_lag[shard] = (now, lag)
+    # -1: unknown (the gauge ends up in JSON, which has no infinity)
+    metrics.set_gauge(f"db.replica_lag_seconds.shard_{shard}", lag if lag != float("inf") else -1)
+    return lag
+
+
+def _connect(connection_string: str):
+    # Statements are timed when the current request is being profiled
+    return profiling.wrap_connection(pyodbc.connect(connection_string))
+
+
+def _open(shard: int, user_id, task_id, read_only: bool):
+    connection_strings = get_shard_connection_strings()
+
+    if shard >= len(connection_strings):
+        raise Exception(f"Shard {shard} is not configured")
+
+    if not read_only:
+        mark_write(user_id, task_id)
+        metrics.increment("db.route.primary_write")
+        return _connect(connection_strings[shard])
+
+    if _recently_written(user_id, task_id):
+        metrics.increment("db.route.primary_read_your_writes")
+        return _connect(connection_strings[shard])
+
+    conn = _connect(get_read_connection_strings()[shard])
+
+    if _sample_replica_lag(shard, conn) > MAX_REPLICA_LAG_SECONDS:
+        conn.close()
+        metrics.increment("db.route.primary_replica_lag")
+        return _connect(connection_strings[shard])
+
+    metrics.increment("db.route.replica")
+    return conn
+
+
+def _open_for_user(user_id, read_only: bool):
+    """
+    Open the shard a user lives on, following moved_users forwarding rows.
+
+    The rebalancer writes the forwarding row on the shard a user leaves
+    before it copies anything, and commits it together with the deletion
+    of their rows there. Write connections read it WITH (HOLDLOCK), which
+    holds the key lock until they commit: a write in flight finishes
+    before the move starts (and is copied), a later one waits for the move
+    and follows it. A write can never land on a shard the user has left.
+    """
+    with _moved_lock:
+        shard = _moved.get(user_id)
+
+    if shard is None:
+        shard = shard_for_user(user_id)
+
+    if shard_count() == 1:
+        return _open(shard, user_id, None, read_only)
+
+    for _ in range(shard_count()):
+        conn = _open(shard, user_id, None, read_only)
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT shard FROM moved_users {'' if read_only else 'WITH (HOLDLOCK)'} WHERE user_id = ?",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+
+        if row is None:
+            return conn
+
+        conn.close()
+        shard = row[0]
+        metrics.increment("db.route.moved_user")
+
+        with _moved_lock:
+            if len(_moved) >= MOVED_CACHE_SIZE:
+                _moved.clear()
+            _moved[user_id] = shard
+
+    raise Exception(f"Forwarding rows for user {user_id} form a loop")
+
+
+def _forwarded_task(conn, task_id: int):
+    cursor = conn.cursor()
+    cursor.execute("SELECT new_task_id FROM moved_tasks WHERE old_task_id = ?", (task_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else None
+
+
+def get_task_connection(task_id, read_only=False) -> tuple:
+    """
+    Open the shard that holds a task, following moved_tasks forwarding rows.
+
+    A task id encodes the shard it was created on. When the rebalancer
+    moves a user their tasks get new ids on the target, and the shard they
+    left keeps a moved_tasks row from each old id to the new one, so an id
+    a client still holds is followed to wherever the task lives now. A
+    request racing the move itself may still see the task missing once.
+
+    Returns:
+        (connection, task_id): the id to use in queries is the task's
+        current one, which differs from the argument for a moved task
+    """
+    requested = task_id = int(task_id)
+
+    if shard_count() == 1:
+        return _open(shard_for_task(task_id), None, task_id, read_only), task_id
+
+    with _moved_lock:
+        task_id = _moved_tasks.get(task_id, task_id)
+
+    for _ in range(MAX_TASK_HOPS):
+        conn = _open(shard_for_task(task_id), None, task_id, read_only)
+        new_task_id = _forwarded_task(conn, task_id)
+
+        if new_task_id is None:
+            return conn, task_id
+
+        conn.close()
+        task_id = new_task_id
+        metrics.increment("db.route.moved_task")
+
+        with _moved_lock:
+            if len(_moved_tasks) >= MOVED_CACHE_SIZE:
+                _moved_tasks.clear()
+            _moved_tasks[requested] = task_id
+
+    raise Exception(f"Forwarding rows for task {requested} form a loop")
+
+
+def resolve_task_id(task_id) -> int:
+    """The current id of a task, following moves (see get_task_connection)."""
+    if shard_count() == 1:
+        return int(task_id)
+
+    conn, task_id = get_task_connection(task_id, read_only=True)
+    conn.close()
+    return task_id
+
+
+def moved_task_ids(cursor, user_id: str, task_ids) -> dict:
+    """
+    Map the old ids among a user's task ids to their current ones, on a
+    cursor of the user's own shard: a move carries the user's earlier
+    task ids along in the target's moved_tasks.
+
+    Returns:
+        Dict of old task_id -> current task_id, for the ids that moved
+    """
+    task_ids = list(task_ids)
+    if not task_ids or shard_count() == 1:
+        return {}
+
+    cursor.execute(
+        f"""
+        SELECT old_task_id, new_task_id
+        FROM moved_tasks
+        WHERE user_id = ? AND old_task_id IN ({", ".join("?" for _ in task_ids)})
+        """,
+        [user_id, *task_ids]
+    )
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def get_db_connection(user_id=None, task_id=None, shard=None, read_only=False):
+    """
+    Open a connection to the shard that owns a user or task.
+
+    Pass task_id for a task's shard by its id alone (no lookup; routes
+    given an id by a client use get_task_connection, which follows moved
+    tasks), user_id for user-keyed routes, or an explicit shard for
+    background jobs.
+    Users are placed by the hash ring unless the rebalancer moved them,
+    which the shard they left records (see _open_for_user).
+
+    read_only=True sends the connection to the shard's replica unless the
+    user/task wrote recently or the replica is lagging too far behind.
+    Write connections mark the user/task so its next reads see the write.
+    """
+    if shard is None:
+        if task_id is not None:
+            shard = shard_for_task(task_id)
+        elif user_id is not None:
+            return _open_for_user(user_id, read_only)
+        else:
+            shard = 0
+
+    return _open(shard, user_id, task_id, read_only)
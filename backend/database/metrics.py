@@ -0,0 +1,21 @@
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def increment(name: str, value: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot() -> dict:
+    """Current counters and gauges of this worker process."""
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges)}
@@ -0,0 +1,384 @@
+import logging
+from database.db import get_db_connection, shard_count, shard_for_user
+from database.upsert import upsert
+from user.activity import EVENT_STEP_DONE, EVENT_TASK_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# Per-user tables copied as-is, parents first, with their keys
+USER_TABLES = [
+    ("users", ["user_id"]),
+    ("user_stats", ["user_id"]),
+    ("user_badges", ["user_id", "badge_code"]),
+    ("user_daily_activity", ["user_id", "activity_date"]),
+    ("user_recent_tasks", ["user_id", "completed_at", "task_name"]),
+]
+
+
+def _fetch(cursor, sql, params):
+    cursor.execute(sql, params)
+    columns = [d[0] for d in cursor.description]
+    return columns, cursor.fetchall()
+
+
+def _insert_rows(cursor, table, columns, rows):
+    if not rows:
+        return
+    cursor.fast_executemany = True
+    cursor.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+        [tuple(row) for row in rows]
+    )
+
+
+def _upsert_rows(cursor, table, keys, columns, rows):
+    """Write rows by key: insert the missing ones, overwrite the rest."""
+    for row in rows:
+        values = dict(zip(columns, row))
+        upsert(cursor, table, keys={k: values[k] for k in keys}, values=values)
+
+
+def _remap(columns, rows, task_columns, task_id_map: dict) -> list:
+    """Rows with their task id columns translated to the target's ids."""
+    return [
+        [task_id_map.get(value, value) if c in task_columns else value for c, value in zip(columns, row)]
+        for row in rows
+    ]
+
+
+def _delete_task(cursor, task_id: int):
+    """Remove a task and its steps from both tiers."""
+    cursor.execute(
+        """
+        DELETE FROM task_steps WHERE task_id = ?;
+        DELETE FROM task_steps_archive WHERE task_id = ?;
+        DELETE FROM tasks WHERE task_id = ?;
+        DELETE FROM tasks_archive WHERE task_id = ?;
+        """,
+        (task_id, task_id, task_id, task_id)
+    )
+
+
+def _insert_task(cursor, table: str, task_id: int, row: dict):
+    """Insert a task row under a given id (IDENTITY_INSERT on the hot table)."""
+    columns = [c for c in row if c != "task_id"]
+    sql = f"""
+        INSERT INTO {table} (task_id, {', '.join(columns)})
+        VALUES (?, {', '.join('?' for _ in columns)});
+    """
+    if table == "tasks":
+        sql = f"SET IDENTITY_INSERT tasks ON; {sql} SET IDENTITY_INSERT tasks OFF;"
+    cursor.execute(sql, [task_id] + [row[c] for c in columns])
+
+
+def _copy_task(src_cursor, dst_cursor, user_id: str, row: dict, archived: bool, new_task_id):
+    """
+    Copy one task (hot or archived) and its steps to the target.
+
+    A task gets a new id from the target's range, recorded in the target's
+    moved_tasks. If an earlier run already copied it (and failed before the
+    source cleanup) the copy is replaced, keeping that id, since the source
+    may have changed since.
+
+    Returns:
+        The task's id on the target
+    """
+    table, steps_table = ("tasks_archive", "task_steps_archive") if archived else ("tasks", "task_steps")
+
+    if new_task_id is None:
+        # Take the next id of the target's range from its IDENTITY
+        columns = [c for c in row if c not in ("task_id", "archived_at")]
+        dst_cursor.execute(
+            f"""
+            INSERT INTO tasks ({', '.join(columns)})
+            OUTPUT INSERTED.task_id
+            VALUES ({', '.join('?' for _ in columns)})
+            """,
+            [row[c] for c in columns]
+        )
+        new_task_id = dst_cursor.fetchone()[0]
+        dst_cursor.execute(
+            "INSERT INTO moved_tasks (old_task_id, new_task_id, user_id) VALUES (?, ?, ?)",
+            (row["task_id"], new_task_id, user_id)
+        )
+        if archived:
+            dst_cursor.execute("DELETE FROM tasks WHERE task_id = ?", (new_task_id,))
+            _insert_task(dst_cursor, table, new_task_id, row)
+    else:
+        _delete_task(dst_cursor, new_task_id)
+        _insert_task(dst_cursor, table, new_task_id, row)
+
+    step_columns, steps = _fetch(
+        src_cursor,
+        f"SELECT * FROM {steps_table} WITH (UPDLOCK, HOLDLOCK) WHERE task_id = ?",
+        (row["task_id"],)
+    )
+
+    # Live step ids are the target's IDENTITY; archived ones are plain values
+    copy_columns = [c for c in step_columns if c != "step_id" or archived]
+    _insert_rows(
+        dst_cursor,
+        steps_table,
+        copy_columns,
+        [
+            [new_task_id if c == "task_id" else value
+             for c, value in zip(step_columns, step) if c in copy_columns]
+            for step in steps
+        ]
+    )
+
+    return new_task_id
+
+
+def _copy_activity(src_cursor, dst_cursor, user_id: str, task_id_map: dict):
+    """
+    Copy the user's rollups (daily activity, recent tasks) and raw
+    activity events.
+
+    Events the source compactor has not rolled up yet are folded into the
+    copied rollups here, and every copied event is flagged rolled_up, so
+    the target's compactor never counts them again. Rollups are written
+    by key and events only where an identical one is missing, so a rerun
+    after a failed cleanup changes nothing.
+    """
+    # Hold off the source compactor so rollups and checkpoint agree
+    src_cursor.execute("SELECT last_event_id FROM activity_rollup_state WITH (UPDLOCK, HOLDLOCK) WHERE id = 1")
+    checkpoint = src_cursor.fetchone()
+    last_event_id = checkpoint[0] if checkpoint else 0
+
+    columns, rows = _fetch(src_cursor, "SELECT * FROM user_daily_activity WHERE user_id = ?", (user_id,))
+    rollups = {row[columns.index("activity_date")]: dict(zip(columns, row)) for row in rows}
+
+    _, recent = _fetch(
+        src_cursor, "SELECT completed_at, task_name FROM user_recent_tasks WHERE user_id = ?", (user_id,)
+    )
+    recent = {tuple(row) for row in recent}
+
+    _, events = _fetch(
+        src_cursor,
+        """
+        SELECT e.event_id, e.task_id, e.event_type, e.step_order, e.created_at, e.rolled_up, t.task_name
+        FROM activity_events e
+        LEFT JOIN tasks_all t ON t.task_id = e.task_id
+        WHERE e.user_id = ?
+        """,
+        (user_id,)
+    )
+
+    for event_id, _, event_type, _, created_at, rolled_up, task_name in events:
+        if event_id <= last_event_id or rolled_up:
+            continue
+        if event_type == EVENT_TASK_COMPLETED and task_name is not None:
+            recent.add((created_at, task_name))
+        day = rollups.setdefault(
+            created_at.date(),
+            {"user_id": user_id, "activity_date": created_at.date(), "steps_done": 0, "tasks_completed": 0}
+        )
+        if event_type == EVENT_STEP_DONE:
+            day["steps_done"] = (day["steps_done"] or 0) + 1
+        elif event_type == EVENT_TASK_COMPLETED:
+            day["tasks_completed"] = (day["tasks_completed"] or 0) + 1
+
+    for day in rollups.values():
+        upsert(
+            dst_cursor,
+            "user_daily_activity",
+            keys={"user_id": user_id, "activity_date": day["activity_date"]},
+            values={"steps_done": day["steps_done"], "tasks_completed": day["tasks_completed"]}
+        )
+
+    dst_cursor.execute("SELECT completed_at, task_name FROM user_recent_tasks WHERE user_id = ?", (user_id,))
+    recent -= {tuple(row) for row in dst_cursor.fetchall()}
+    _insert_rows(
+        dst_cursor,
+        "user_recent_tasks",
+        ["user_id", "completed_at", "task_name"],
+        [(user_id, completed_at, task_name) for completed_at, task_name in recent]
+    )
+
+    dst_cursor.execute(
+        "SELECT task_id, event_type, step_order, created_at FROM activity_events WHERE user_id = ?",
+        (user_id,)
+    )
+    existing = {tuple(row) for row in dst_cursor.fetchall()}
+
+    _insert_rows(
+        dst_cursor,
+        "activity_events",
+        ["user_id", "task_id", "event_type", "step_order", "created_at", "rolled_up"],
+        [
+            (user_id, task_id_map.get(task_id, task_id), event_type, step_order, created_at, 1)
+            for _, task_id, event_type, step_order, created_at, _, _ in events
+            if (task_id_map.get(task_id, task_id), event_type, step_order, created_at) not in existing
+        ]
+    )
+
+
+def move_user(user_id: str, source: int, target: int) -> dict:
+    """
+    Move one user's rows from the source shard to the target shard.
+
+    The first write on the source is the user's moved_users forwarding
+    row, so requests for the user wait for the move and then follow it
+    (see database/db.py); it commits with the deletion of their source
+    rows. Rows are written to the target by key, so a rerun after a
+    failure between the two commits just refreshes the copy.
+
+    Every task gets a new id from the target's range, archived ones
+    included, so ids keep encoding their shard. Activity and sync events
+    move with the user, their task ids remapped. Old ids keep working:
+    the source keeps a moved_tasks row from each id the user's tasks had
+    there (from earlier moves too) to the new one, which routing by task
+    id follows, and the target gets the same rows for lookups by user.
+
+    Returns:
+        Mapping of old task_id -> new task_id
+    """
+    src = get_db_connection(shard=source)
+    dst = get_db_connection(shard=target)
+    src_cursor = src.cursor()
+    dst_cursor = dst.cursor()
+    task_id_map = {}
+
+    try:
+        upsert(src_cursor, "moved_users", keys={"user_id": user_id}, values={"shard": target})
+
+        src_cursor.execute(
+            "SELECT user_id FROM users WITH (UPDLOCK, HOLDLOCK) WHERE user_id = ?",
+            (user_id,)
+        )
+        if not src_cursor.fetchone():
+            src.rollback()
+            return task_id_map
+
+        # Arriving back on a shard the user once left
+        dst_cursor.execute("DELETE FROM moved_users WHERE user_id = ?", (user_id,))
+
+        for table, keys in USER_TABLES:
+            if table in ("user_daily_activity", "user_recent_tasks"):
+                continue
+            columns, rows = _fetch(
+                src_cursor,
+                f"SELECT * FROM {table} WITH (UPDLOCK, HOLDLOCK) WHERE user_id = ?",
+                (user_id,)
+            )
+            _upsert_rows(dst_cursor, table, keys, columns, rows)
+
+        # Tasks an earlier, unfinished run already copied
+        dst_cursor.execute("SELECT old_task_id, new_task_id FROM moved_tasks WHERE user_id = ?", (user_id,))
+        copied = dict(dst_cursor.fetchall())
+
+        for table, archived in (("tasks", False), ("tasks_archive", True)):
+            columns, rows = _fetch(
+                src_cursor,
+                f"SELECT * FROM {table} WITH (UPDLOCK, HOLDLOCK) WHERE user_id = ? ORDER BY task_id",
+                (user_id,)
+            )
+            for task in rows:
+                row = dict(zip(columns, task))
+                task_id_map[row["task_id"]] = _copy_task(
+                    src_cursor, dst_cursor, user_id, row, archived, copied.get(row["task_id"])
+                )
+
+        columns, rows = _fetch(src_cursor, "SELECT * FROM task_recurrences WHERE user_id = ?", (user_id,))
+        _upsert_rows(
+            dst_cursor, "task_recurrences", ["user_id", "source_task_id"], columns,
+            _remap(columns, rows, ("source_task_id", "last_task_id"), task_id_map)
+        )
+
+        # The task/sync replay guard must move too, or replays apply twice
+        columns, rows = _fetch(src_cursor, "SELECT * FROM sync_events WHERE user_id = ?", (user_id,))
+        _upsert_rows(
+            dst_cursor, "sync_events", ["user_id", "device_id", "client_seq"], columns,
+            _remap(columns, rows, ("task_id",), task_id_map)
+        )
+
+        _copy_activity(src_cursor, dst_cursor, user_id, task_id_map)
+
+        # Ids from the user's earlier moves follow their tasks here too
+        src_cursor.execute("SELECT old_task_id, new_task_id FROM moved_tasks WHERE user_id = ?", (user_id,))
+        forwards = {
+            old_task_id: task_id_map[new_task_id]
+            for old_task_id, new_task_id in src_cursor.fetchall()
+            if new_task_id in task_id_map
+        }
+        for old_task_id, new_task_id in forwards.items():
+            upsert(
+                dst_cursor, "moved_tasks",
+                keys={"old_task_id": old_task_id},
+                values={"new_task_id": new_task_id, "user_id": user_id}
+            )
+
+        dst.commit()
+
+        # Source cleanup, children first: exactly the rows read above, which
+        # the locks (and the forwarding row) kept from changing
+        src_cursor.execute(
+            """
+            DELETE FROM activity_events WHERE user_id = ?;
+            DELETE FROM sync_events WHERE user_id = ?;
+            DELETE FROM task_recurrences WHERE user_id = ?;
+            DELETE s FROM task_steps_archive s JOIN tasks_archive t ON t.task_id = s.task_id WHERE t.user_id = ?;
+            DELETE FROM tasks_archive WHERE user_id = ?;
+            DELETE s FROM task_steps s JOIN tasks t ON t.task_id = s.task_id WHERE t.user_id = ?;
+            DELETE FROM tasks WHERE user_id = ?;
+            """,
+            (user_id,) * 7
+        )
+        for table, _ in reversed(USER_TABLES):
+            src_cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+        # Forwarding rows for every id the user's tasks had here
+        forwards.update(task_id_map)
+        for old_task_id, new_task_id in forwards.items():
+            upsert(
+                src_cursor, "moved_tasks",
+                keys={"old_task_id": old_task_id},
+                values={"new_task_id": new_task_id, "user_id": user_id}
+            )
+
+        src.commit()
+
+    except Exception:
+        dst.rollback()
+        src.rollback()
+        raise
+
+    finally:
+        src.close()
+        dst.close()
+
+    return task_id_map
+
+
+def rebalance(ring_size: int = None, dry_run: bool = False, limit: int = None):
+    """
+    Move every user whose consistent-hash placement for `ring_size`
+    differs from the shard they live on.
+
+    Users move one at a time, each in its own short transactions, so the
+    service keeps running and follows each user as soon as their move
+    commits. Yields (user_id, source, target, task_id_map).
+    """
+    ring_size = ring_size or shard_count()
+    moved = 0
+
+    for source in range(shard_count()):
+        conn = get_db_connection(shard=source)
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM users")
+        user_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+
+        for user_id in user_ids:
+            target = shard_for_user(user_id, ring_size)
+            if target == source:
+                continue
+
+            if limit is not None and moved >= limit:
+                return
+
+            task_id_map = {} if dry_run else move_user(user_id, source, target)
+            moved += 1
+            logger.info(f"Moved {user_id} from shard {source} to shard {target}")
+            yield user_id, source, target, task_id_map
@@ -1,15 +1,26 @@
-from database.db import get_db_connection
+import os
+from database.db import get_db_connection, shard_count, TASK_ID_SHARD_SPAN
 
 
 def create_tables():
     """
-    Create all required tables for Azure SQL Server.
+    Create all required tables for Azure SQL Server on every shard.
     Safe for production.
     """
 
-    conn = get_db_connection()
+    for shard in range(shard_count()):
+        create_shard_tables(shard)
+
+
+def create_shard_tables(shard: int):
+    """Create the tables of a single shard."""
+
+    conn = get_db_connection(shard=shard)
     cursor = conn.cursor()
 
+    # Task ids encode their shard (see database/db.py)
+    task_id_seed = shard * TASK_ID_SHARD_SPAN + 1
+
     # USERS TABLE
     cursor.execute("""
     IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='users' AND xtype='U')
@@ -23,10 +34,10 @@ def create_tables():
     """)
 
     # TASKS TABLE
-    cursor.execute("""
+    cursor.execute(f"""
     IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='tasks' AND xtype='U')
     CREATE TABLE tasks (
-        task_id INT IDENTITY(1,1) PRIMARY KEY,
+        task_id INT IDENTITY({task_id_seed},1) PRIMARY KEY,
         user_id NVARCHAR(100) NOT NULL,
         task_name NVARCHAR(255) NOT NULL,
         difficulty_level INT NOT NULL,
@@ -37,6 +48,22 @@ def create_tables():
     )
     """)
 
+    # An id past this shard's range would route to the next shard: fail
+    # the insert instead. NOCHECK skips rescanning the existing rows
+    cursor.execute(f"""
+    IF NOT EXISTS (SELECT * FROM sys.check_constraints WHERE name='CK_tasks_id_range')
+    ALTER TABLE tasks WITH NOCHECK ADD CONSTRAINT CK_tasks_id_range
+    CHECK (task_id >= {task_id_seed} AND task_id < {task_id_seed - 1 + TASK_ID_SHARD_SPAN})
+    """)
+
+    # Keyset pagination index for task history (task/list)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_tasks_user_created')
+    CREATE INDEX IX_tasks_user_created
+    ON tasks (user_id, created_at DESC, task_id DESC)
+    INCLUDE (task_name, difficulty_level, current_step_index, status)
+    """)
+
     # TASK STEPS TABLE
     cursor.execute("""
     IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='task_steps' AND xtype='U')
@@ -51,6 +78,12 @@ def create_tables():
     )
     """)
 
+    # Step lookups are always by task_id + step_order
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_task_steps_task_order')
+    CREATE INDEX IX_task_steps_task_order ON task_steps (task_id, step_order) INCLUDE (is_done)
+    """)
+
     # USER STATS TABLE
     cursor.execute("""
     IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='user_stats' AND xtype='U')
@@ -60,10 +93,18 @@ def create_tables():
         streak INT DEFAULT 0,
         last_active_date DATE,
         last_completed_date DATE,
+        tasks_completed INT DEFAULT 0,
         CONSTRAINT FK_stats_users FOREIGN KEY (user_id) REFERENCES users(user_id)
     )
     """)
 
+    # Completed-task counter used by the badge engine (older databases;
+    # existing rows are filled in once tasks_all exists, below)
+    cursor.execute("""
+    IF COL_LENGTH('user_stats', 'tasks_completed') IS NULL
+    ALTER TABLE user_stats ADD tasks_completed INT DEFAULT 0
+    """)
+
     # USER BADGES TABLE
     cursor.execute("""
     IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='user_badges' AND xtype='U')
@@ -76,5 +117,327 @@ def create_tables():
     )
     """)
 
+    # SYNC EVENTS TABLE (replay guard for task/sync)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='sync_events' AND xtype='U')
+    CREATE TABLE sync_events (
+        user_id NVARCHAR(100) NOT NULL,
+        device_id NVARCHAR(100) NOT NULL,
+        client_seq BIGINT NOT NULL,
+        task_id INT NOT NULL,
+        applied_at DATETIME2 DEFAULT SYSDATETIME(),
+        PRIMARY KEY (user_id, device_id, client_seq)
+    )
+    """)
+
+    # ACTIVITY EVENTS TABLE (append-only)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='activity_events' AND xtype='U')
+    CREATE TABLE activity_events (
+        event_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+        user_id NVARCHAR(100) NOT NULL,
+        task_id INT NOT NULL,
+        event_type NVARCHAR(50) NOT NULL,
+        step_order INT NULL,
+        created_at DATETIME2 DEFAULT SYSDATETIME()
+    )
+    """)
+
+    # Set on events copied in by the rebalancer, already in the copied rollups
+    cursor.execute("""
+    IF COL_LENGTH('activity_events', 'rolled_up') IS NULL
+    ALTER TABLE activity_events ADD rolled_up BIT NULL
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_activity_task_type')
+    CREATE INDEX IX_activity_task_type ON activity_events (task_id, event_type) INCLUDE (created_at)
+    """)
+
+    # USER DAILY ACTIVITY TABLE (rolled up from activity_events)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='user_daily_activity' AND xtype='U')
+    CREATE TABLE user_daily_activity (
+        user_id NVARCHAR(100) NOT NULL,
+        activity_date DATE NOT NULL,
+        steps_done INT DEFAULT 0,
+        tasks_completed INT DEFAULT 0,
+        PRIMARY KEY (user_id, activity_date)
+    )
+    """)
+
+    # USER RECENT TASKS (rolled up from activity_events, newest few per user)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='user_recent_tasks' AND xtype='U')
+    CREATE TABLE user_recent_tasks (
+        user_id NVARCHAR(100) NOT NULL,
+        completed_at DATETIME2 NOT NULL,
+        task_name NVARCHAR(255) NOT NULL,
+        PRIMARY KEY (user_id, completed_at, task_name)
+    )
+    """)
+
+    # ACTIVITY ROLLUP CHECKPOINT
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='activity_rollup_state' AND xtype='U')
+    CREATE TABLE activity_rollup_state (
+        id INT PRIMARY KEY,
+        last_event_id BIGINT NOT NULL
+    )
+    """)
+
+    # LLM USAGE LEDGER (written asynchronously by ai/usage_ledger.py)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='llm_usage' AND xtype='U')
+    CREATE TABLE llm_usage (
+        usage_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+        user_id NVARCHAR(100) NOT NULL,
+        neurodivergence NVARCHAR(50),
+        step_granularity NVARCHAR(50),
+        model NVARCHAR(100),
+        prompt_tokens INT,
+        completion_tokens INT,
+        max_tokens INT,
+        finish_reason NVARCHAR(50),
+        latency_ms INT,
+        created_at DATETIME2 DEFAULT SYSDATETIME()
+    )
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_llm_usage_user')
+    CREATE INDEX IX_llm_usage_user ON llm_usage (user_id, created_at)
+    """)
+
+    # ARCHIVE TABLES (cold tier for old completed tasks, see task/archive_tasks.py)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='tasks_archive' AND xtype='U')
+    CREATE TABLE tasks_archive (
+        task_id INT PRIMARY KEY,
+        user_id NVARCHAR(100) NOT NULL,
+        task_name NVARCHAR(255) NOT NULL,
+        difficulty_level INT NOT NULL,
+        current_step_index INT,
+        status NVARCHAR(50),
+        created_at DATETIME,
+        archived_at DATETIME2 DEFAULT SYSDATETIME()
+    ) WITH (DATA_COMPRESSION = PAGE)
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_tasks_archive_user_created')
+    CREATE INDEX IX_tasks_archive_user_created
+    ON tasks_archive (user_id, created_at DESC, task_id DESC)
+    INCLUDE (task_name, difficulty_level, current_step_index, status)
+    WITH (DATA_COMPRESSION = PAGE)
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='task_steps_archive' AND xtype='U')
+    CREATE TABLE task_steps_archive (
+        step_id INT NOT NULL,
+        task_id INT NOT NULL,
+        step_order INT NOT NULL,
+        step_text NVARCHAR(MAX) NOT NULL,
+        estimated_time_minutes INT NOT NULL,
+        is_done BIT,
+        CONSTRAINT PK_task_steps_archive PRIMARY KEY NONCLUSTERED (task_id, step_order)
+    )
+    """)
+
+    # Columnstore packs the archived step text far tighter than rowstore,
+    # but needs a tier that supports it, so it is opt-in
+    if os.getenv("ARCHIVE_COLUMNSTORE", "false").lower() == "true":
+        cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE object_id = OBJECT_ID('task_steps_archive') AND type IN (1, 5))
+        CREATE CLUSTERED COLUMNSTORE INDEX CCI_task_steps_archive ON task_steps_archive
+        """)
+    else:
+        cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE object_id = OBJECT_ID('task_steps_archive') AND type IN (1, 5))
+        CREATE CLUSTERED INDEX CX_task_steps_archive ON task_steps_archive (task_id, step_order)
+        WITH (DATA_COMPRESSION = PAGE)
+        """)
+
+    # Packed step storage (task/step_store.py): one gzipped blob per task plus
+    # its progress bitmap. step_count is kept for row-stored tasks too.
+    for table in ("tasks", "tasks_archive"):
+        for column, definition in (
+            ("steps_blob", "VARBINARY(MAX) NULL"),
+            ("steps_format", "TINYINT NULL"),
+            ("step_count", "SMALLINT NULL"),
+            ("steps_done_mask", "BIGINT NULL")
+        ):
+            cursor.execute(f"""
+            IF COL_LENGTH('{table}', '{column}') IS NULL
+            ALTER TABLE {table} ADD {column} {definition}
+            """)
+
+    # Keyset index for task/list?status=...: status in the key, so a
+    # filtered page never reads past rows of the other status
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_tasks_user_status_created')
+    CREATE INDEX IX_tasks_user_status_created
+    ON tasks (user_id, status, created_at DESC, task_id DESC)
+    INCLUDE (task_name, difficulty_level, current_step_index, step_count)
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_tasks_archive_user_status_created')
+    CREATE INDEX IX_tasks_archive_user_status_created
+    ON tasks_archive (user_id, status, created_at DESC, task_id DESC)
+    INCLUDE (task_name, difficulty_level, current_step_index, step_count)
+    WITH (DATA_COMPRESSION = PAGE)
+    """)
+
+    # ARCHIVE CHECKPOINT
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='archive_state' AND xtype='U')
+    CREATE TABLE archive_state (
+        id INT PRIMARY KEY,
+        last_task_id INT NOT NULL
+    )
+    """)
+
+    # LEADERBOARD SNAPSHOT (rebuilt by a timer, loaded by user/leaderboard.py)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='leaderboard_snapshot' AND xtype='U')
+    CREATE TABLE leaderboard_snapshot (
+        board NVARCHAR(50) NOT NULL,
+        user_id NVARCHAR(100) NOT NULL,
+        score INT NOT NULL,
+        shard_rank INT NOT NULL,
+        built_at DATETIME2 DEFAULT SYSDATETIME(),
+        PRIMARY KEY (board, user_id)
+    )
+    """)
+
+    # TASK RECURRENCES (task/repeat schedules, copied daily by a timer)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='task_recurrences' AND xtype='U')
+    CREATE TABLE task_recurrences (
+        user_id NVARCHAR(100) NOT NULL,
+        source_task_id INT NOT NULL,
+        schedule NVARCHAR(20) NOT NULL,
+        weekday TINYINT NULL,
+        last_created_date DATE NULL,
+        last_task_id INT NULL,
+        created_at DATETIME2 DEFAULT SYSDATETIME(),
+        PRIMARY KEY (user_id, source_task_id),
+        CONSTRAINT FK_recurrences_users FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    """)
+
+    # SHARD MOVES (database/rebalance.py). moved_users forwards requests for
+    # a user who left this shard; moved_tasks maps old task ids to newer
+    # ones: on the shard a user left, each id their tasks had there (routing
+    # by task id follows it), and on the shard they live on, every earlier
+    # id of their tasks (lookups by user).
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='moved_users' AND xtype='U')
+    CREATE TABLE moved_users (
+        user_id NVARCHAR(100) PRIMARY KEY,
+        shard INT NOT NULL,
+        moved_at DATETIME2 DEFAULT SYSDATETIME()
+    )
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='moved_tasks' AND xtype='U')
+    CREATE TABLE moved_tasks (
+        old_task_id INT PRIMARY KEY,
+        new_task_id INT NOT NULL,
+        user_id NVARCHAR(100) NOT NULL,
+        moved_at DATETIME2 DEFAULT SYSDATETIME()
+    )
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_moved_tasks_user')
+    CREATE INDEX IX_moved_tasks_user ON moved_tasks (user_id) INCLUDE (new_task_id)
+    """)
+
+    # Hot + cold views used by history and stats reads
+    cursor.execute("""
+    CREATE OR ALTER VIEW tasks_all AS
+    SELECT task_id, user_id, task_name, difficulty_level, current_step_index, status, created_at,
+           steps_blob, steps_format, step_count, steps_done_mask
+    FROM tasks
+    UNION ALL
+    SELECT task_id, user_id, task_name, difficulty_level, current_step_index, status, created_at,
+           steps_blob, steps_format, step_count, steps_done_mask
+    FROM tasks_archive
+    """)
+
+    # Fill the completed-task counter on user_stats rows that predate it
+    cursor.execute("""
+    UPDATE s
+    SET tasks_completed = COALESCE(c.value, 0)
+    FROM user_stats s
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) AS value
+        FROM tasks_all
+        WHERE status = 'completed'
+        GROUP BY user_id
+    ) AS c ON c.user_id = s.user_id
+    WHERE s.tasks_completed IS NULL
+    """)
+
+    # Seed the recent-tasks rollup once from history that predates it.
+    # Tasks completed before the activity log existed use created_at
+    cursor.execute("""
+    IF NOT EXISTS (SELECT 1 FROM user_recent_tasks)
+    INSERT INTO user_recent_tasks (user_id, completed_at, task_name)
+    SELECT user_id, completed_at, task_name
+    FROM (
+        SELECT t.user_id, t.task_name, c.completed_at,
+               ROW_NUMBER() OVER (PARTITION BY t.user_id ORDER BY c.completed_at DESC) AS position
+        FROM tasks_all t
+        CROSS APPLY (
+            SELECT COALESCE(MAX(created_at), t.created_at) AS completed_at
+            FROM activity_events
+            WHERE task_id = t.task_id AND event_type = 'task_completed'
+        ) c
+        WHERE t.status = 'completed' AND c.completed_at IS NOT NULL
+    ) ranked
+    WHERE position <= 5
+    """)
+
+    # Packed steps expanded into rows (format 1: gzipped UTF-16 JSON array)
+    cursor.execute("""
+    CREATE OR ALTER VIEW task_steps_packed AS
+    SELECT CAST(NULL AS INT) AS step_id, t.task_id,
+           CAST(j.[key] AS INT) + 1 AS step_order,
+           s.step_text, s.estimated_time_minutes,
+           CAST(CASE WHEN t.steps_done_mask & POWER(CAST(2 AS BIGINT), CAST(j.[key] AS INT)) <> 0
+                THEN 1 ELSE 0 END AS BIT) AS is_done
+    FROM tasks_all t
+    CROSS APPLY OPENJSON(CAST(DECOMPRESS(t.steps_blob) AS NVARCHAR(MAX))) j
+    CROSS APPLY OPENJSON(j.value) WITH (
+        step_text NVARCHAR(MAX) '$[0]',
+        estimated_time_minutes INT '$[1]'
+    ) s
+    WHERE t.steps_blob IS NOT NULL AND t.steps_format = 1
+    """)
+
+    cursor.execute("""
+    CREATE OR ALTER VIEW task_steps_all AS
+    SELECT step_id, task_id, step_order, step_text, estimated_time_minutes, is_done
+    FROM task_steps
+    UNION ALL
+    SELECT step_id, task_id, step_order, step_text, estimated_time_minutes, is_done
+    FROM task_steps_archive
+    UNION ALL
+    SELECT step_id, task_id, step_order, step_text, estimated_time_minutes, is_done
+    FROM task_steps_packed
+    """)
+
     conn.commit()
+
+    # The last id of the range is taken: every new task will fail
+    cursor.execute("SELECT IDENT_CURRENT('tasks')")
+    exhausted = cursor.fetchone()[0] >= task_id_seed - 2 + TASK_ID_SHARD_SPAN
     conn.close()
+
+    if exhausted:
+        raise Exception(f"Shard {shard} has used up its task id range")
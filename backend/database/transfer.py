@@ -0,0 +1,473 @@
+import os
+import json
+import gzip
+import time
+import base64
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from database.db import get_db_connection, shard_count, shard_for_user, shard_for_task
+
+logger = logging.getLogger(__name__)
+
+# Exported tables in load order (parents first) and the key each is
+# streamed and resumed by. How a table is filtered to a set of users:
+# directly by user_id, or through its task.
+TABLES = [
+    ("users", ["user_id"], "user"),
+    ("user_stats", ["user_id"], "user"),
+    ("user_badges", ["user_id", "badge_code"], "user"),
+    ("user_daily_activity", ["user_id", "activity_date"], "user"),
+    ("user_recent_tasks", ["user_id", "completed_at", "task_name"], "user"),
+    ("tasks", ["task_id"], "user"),
+    ("task_steps", ["step_id"], "task"),
+    ("tasks_archive", ["task_id"], "user"),
+    ("task_steps_archive", ["task_id", "step_order"], "archived_task"),
+    ("task_recurrences", ["user_id", "source_task_id"], "user"),
+]
+
+# Identity columns the target assigns itself
+GENERATED_COLUMNS = {"task_steps": ["step_id"]}
+
+# Tables whose identity values are kept so task ids (and their shard) survive
+IDENTITY_INSERT_TABLES = {"tasks"}
+
+# Key a loaded row is matched on, so rows an interrupted run already loaded
+# are skipped: the export key, unless the target generates it
+LOAD_KEYS = {"task_steps": ["task_id", "step_order"]}
+
+# Task rows, and the columns of other tables that hold a task id
+TASK_TABLES = {"tasks", "tasks_archive"}
+TASK_ID_COLUMNS = {
+    "task_steps": ["task_id"],
+    "task_steps_archive": ["task_id"],
+    "task_recurrences": ["source_task_id", "last_task_id"],
+}
+
+CHECKPOINT_FILE = "_checkpoint.json"
+
+
+def _type_name(value) -> str:
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, (bytes, bytearray)):
+        return "bytes"
+    if isinstance(value, Decimal):
+        return "decimal"
+    return None
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode(value, type_name):
+    if value is None or type_name is None:
+        return value
+    if type_name == "datetime":
+        return datetime.fromisoformat(value)
+    if type_name == "date":
+        return date.fromisoformat(value)
+    if type_name == "bytes":
+        return base64.b64decode(value)
+    if type_name == "decimal":
+        return Decimal(value)
+    return value
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _user_filter(filter_kind, user_ids):
+    placeholders = ", ".join("?" for _ in user_ids)
+    if filter_kind == "user":
+        return f"user_id IN ({placeholders})"
+    if filter_kind == "task":
+        return f"task_id IN (SELECT task_id FROM tasks WHERE user_id IN ({placeholders}))"
+    return f"task_id IN (SELECT task_id FROM tasks_archive WHERE user_id IN ({placeholders}))"
+
+
+def _after_key(key_columns):
+    """Keyset predicate `(k1, k2, ...) > (?, ?, ...)` in SQL Server syntax."""
+    clauses = []
+    for i, column in enumerate(key_columns):
+        equal = [f"{c} = ?" for c in key_columns[:i]]
+        clauses.append("(" + " AND ".join(equal + [f"{column} > ?"]) + ")")
+    return "(" + " OR ".join(clauses) + ")"
+
+
+def _after_key_params(last_key):
+    params = []
+    for i in range(len(last_key)):
+        params.extend(last_key[:i + 1])
+    return params
+
+
+def export_data(out_dir: str, user_ids=None, chunk_rows: int = 50000, fetch_size: int = 5000) -> dict:
+    """
+    Stream tables into gzipped NDJSON chunk files with resumable checkpoints.
+
+    Layout: <out_dir>/shard_<n>/<table>/part-<i>.ndjson.gz plus a
+    _manifest.json per table with column names and value types.
+    Memory use is bounded by fetch_size rows regardless of table size.
+
+    Returns:
+        Rows exported per table
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint_path = os.path.join(out_dir, CHECKPOINT_FILE)
+    checkpoint = _load_json(checkpoint_path, {})
+    totals = {}
+    started = time.monotonic()
+
+    for shard in range(shard_count()):
+        conn = get_db_connection(shard=shard, read_only=True)
+        cursor = conn.cursor()
+
+        for table, key_columns, filter_kind in TABLES:
+            state_key = f"{shard}/{table}"
+            state = checkpoint.get(state_key, {"chunks": 0, "last_key": None, "done": False})
+            if state["done"]:
+                continue
+
+            table_dir = os.path.join(out_dir, f"shard_{shard}", table)
+            os.makedirs(table_dir, exist_ok=True)
+
+            where = []
+            params = []
+            if user_ids:
+                where.append(_user_filter(filter_kind, user_ids))
+                params.extend(user_ids)
+            if state["last_key"] is not None:
+                where.append(_after_key(key_columns))
+                params.extend(_after_key_params(state["last_key"]))
+
+            sql = f"SELECT * FROM {table}"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY " + ", ".join(key_columns)
+
+            cursor.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            key_index = [columns.index(c) for c in key_columns]
+            manifest_path = os.path.join(table_dir, "_manifest.json")
+            manifest = _load_json(manifest_path, {"columns": columns, "types": {}})
+
+            out = None
+            rows_in_chunk = 0
+
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+
+                for row in rows:
+                    if out is None:
+                        part = os.path.join(table_dir, f"part-{state['chunks']:05d}.ndjson.gz")
+                        out = gzip.open(part, "wt", encoding="utf-8")
+
+                    for column, value in zip(columns, row):
+                        type_name = _type_name(value)
+                        if type_name:
+                            manifest["types"][column] = type_name
+
+                    out.write(json.dumps([_encode(v) for v in row]) + "\n")
+                    rows_in_chunk += 1
+                    totals[table] = totals.get(table, 0) + 1
+
+                    if rows_in_chunk >= chunk_rows:
+                        out.close()
+                        out = None
+                        rows_in_chunk = 0
+                        state["chunks"] += 1
+                        state["last_key"] = [_encode(row[i]) for i in key_index]
+                        _save_json(manifest_path, manifest)
+                        checkpoint[state_key] = state
+                        _save_json(checkpoint_path, checkpoint)
+
+            if out is not None:
+                out.close()
+                state["chunks"] += 1
+
+            state["done"] = True
+            _save_json(manifest_path, manifest)
+            checkpoint[state_key] = state
+            _save_json(checkpoint_path, checkpoint)
+
+        conn.close()
+
+    elapsed = time.monotonic() - started
+    exported = sum(totals.values())
+    logger.info(f"Exported {exported} rows in {elapsed:.1f}s ({exported / max(elapsed, 1e-9):.0f} rows/s)")
+    return totals
+
+
+def _insert_missing_sql(table: str, columns: list, key_columns: list) -> str:
+    """INSERT of one row unless a row with its key exists; params are the values, then the key."""
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join('?' for _ in columns)} "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {' AND '.join(f'{c} = ?' for c in key_columns)})"
+    )
+
+
+def _route(row: dict) -> int:
+    """
+    Target shard of a non-task row: rows with a user_id follow the user,
+    step rows their task, whose id encodes the shard it was loaded on.
+    """
+    if "user_id" in row:
+        return shard_for_user(row["user_id"])
+    return shard_for_task(row["task_id"])
+
+
+def _read_rows(table_dir: str, part: str, columns: list, types: dict):
+    with gzip.open(os.path.join(table_dir, part), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield {c: _decode(v, types.get(c)) for c, v in zip(columns, json.loads(line))}
+
+
+def _table_parts(in_dir: str, shard_dirs: list, table: str):
+    """(table_dir, part, manifest) of every exported chunk of a table."""
+    for shard_dir in shard_dirs:
+        table_dir = os.path.join(in_dir, shard_dir, table)
+        if not os.path.isdir(table_dir):
+            continue
+        manifest = _load_json(os.path.join(table_dir, "_manifest.json"), None)
+        if manifest is None:
+            continue
+        for part in sorted(p for p in os.listdir(table_dir) if p.endswith(".ndjson.gz")):
+            yield shard_dir, table_dir, part, manifest
+
+
+def _reserve_task_ids(in_dir: str, shard_dirs: list, connection) -> None:
+    """
+    Move each shard's tasks IDENTITY past the exported ids it keeps.
+
+    Tasks whose user stays on the shard their id encodes keep the id
+    (archived ones too, which never advance the IDENTITY); tasks that
+    change shard take the next IDENTITY value. Reseeding first keeps the
+    two apart whatever order the chunks load in. One pass over the task
+    chunks, holding a single id per shard.
+    """
+    highest = {}
+    for table in ("tasks", "tasks_archive"):
+        for _, table_dir, part, manifest in _table_parts(in_dir, shard_dirs, table):
+            for row in _read_rows(table_dir, part, manifest["columns"], manifest["types"]):
+                shard = shard_for_user(row["user_id"])
+                if shard == shard_for_task(row["task_id"]):
+                    highest[shard] = max(highest.get(shard, 0), int(row["task_id"]))
+
+    for shard, task_id in highest.items():
+        # +1: a table that never had a row takes the reseed value itself
+        cursor = connection(shard).cursor()
+        cursor.execute(f"IF IDENT_CURRENT('tasks') <= {task_id} DBCC CHECKIDENT ('tasks', RESEED, {task_id + 1})")
+        connection(shard).commit()
+
+
+def _moved_task_ids(cursor_for, task_ids) -> dict:
+    """
+    Exported id -> new id of the tasks among task_ids that import_data
+    loaded under a new id, from moved_tasks on every shard.
+    """
+    task_ids = sorted(set(task_ids))
+    moved = {}
+    if not task_ids:
+        return moved
+
+    # 1000 ids per query, under SQL Server's 2100 parameter limit
+    for start in range(0, len(task_ids), 1000):
+        ids = task_ids[start:start + 1000]
+        for shard in range(shard_count()):
+            cursor = cursor_for(shard)
+            cursor.execute(
+                f"SELECT old_task_id, new_task_id FROM moved_tasks WHERE old_task_id IN ({', '.join('?' for _ in ids)})",
+                ids
+            )
+            moved.update((row[0], row[1]) for row in cursor.fetchall())
+    return moved
+
+
+def _load_moved_task(cursor, table: str, row: dict) -> int:
+    """
+    Load a task whose user now lives on another shard than its id encodes.
+
+    It gets the next id of the target's range, recorded in moved_tasks
+    (as the rebalancer does), so a rerun finds it instead of loading it
+    twice.
+
+    Returns:
+        The task's id on the target
+    """
+    cursor.execute("SELECT new_task_id FROM moved_tasks WHERE old_task_id = ?", (row["task_id"],))
+    found = cursor.fetchone()
+    if found:
+        return found[0]
+
+    columns = [c for c in row if c not in ("task_id", "archived_at")]
+    cursor.execute(
+        f"""
+        INSERT INTO tasks ({', '.join(columns)})
+        OUTPUT INSERTED.task_id
+        VALUES ({', '.join('?' for _ in columns)})
+        """,
+        [row[c] for c in columns]
+    )
+    task_id = cursor.fetchone()[0]
+    cursor.execute(
+        "INSERT INTO moved_tasks (old_task_id, new_task_id, user_id) VALUES (?, ?, ?)",
+        (row["task_id"], task_id, row["user_id"])
+    )
+
+    if table == "tasks_archive":
+        # Archived tasks only borrow the hot table's IDENTITY
+        columns = [c for c in row if c != "task_id"]
+        cursor.execute(
+            f"""
+            DELETE FROM tasks WHERE task_id = ?;
+            INSERT INTO tasks_archive (task_id, {', '.join(columns)})
+            VALUES (?, {', '.join('?' for _ in columns)});
+            """,
+            [task_id, task_id] + [row[c] for c in columns]
+        )
+
+    return task_id
+
+
+def import_data(in_dir: str, batch_size: int = 1000) -> dict:
+    """
+    Bulk-load an export_data directory with fast_executemany.
+
+    Each chunk file is loaded in one transaction per target shard and
+    recorded in the checkpoint, so a rerun skips finished chunks. Rows are
+    inserted only if their key is missing, so a chunk that was committed
+    on some shards before a crash is not double-loaded either.
+
+    Rows are routed by user_id, step rows by their task. Task ids are kept
+    with IDENTITY_INSERT while the task's user stays on the shard the id
+    encodes; otherwise the task gets a new id on its new shard, recorded
+    in moved_tasks there. Rows pointing at tasks are read in batches of
+    batch_size and their task ids looked up in moved_tasks per batch, so
+    memory stays constant however many tasks change shard.
+
+    Returns:
+        Rows imported per table
+    """
+    checkpoint_path = os.path.join(in_dir, "_import" + CHECKPOINT_FILE)
+    checkpoint = _load_json(checkpoint_path, {"loaded": []})
+    loaded = set(checkpoint["loaded"])
+    totals = {}
+    started = time.monotonic()
+    connections = {}
+
+    def connection(shard):
+        if shard not in connections:
+            connections[shard] = get_db_connection(shard=shard)
+        return connections[shard]
+
+    try:
+        shard_dirs = sorted(d for d in os.listdir(in_dir) if d.startswith("shard_"))
+        _reserve_task_ids(in_dir, shard_dirs, connection)
+
+        for table, key_columns, _ in TABLES:
+            key_columns = LOAD_KEYS.get(table, key_columns)
+            task_columns = TASK_ID_COLUMNS.get(table, [])
+
+            for shard_dir, table_dir, part, manifest in _table_parts(in_dir, shard_dirs, table):
+                part_key = f"{shard_dir}/{table}/{part}"
+                if part_key in loaded:
+                    continue
+
+                columns = manifest["columns"]
+                skip = set(GENERATED_COLUMNS.get(table, []))
+                insert_columns = [c for c in columns if c not in skip]
+                insert_sql = _insert_missing_sql(table, insert_columns, key_columns)
+                cursors = {}
+
+                def cursor_for(shard):
+                    if shard not in cursors:
+                        cursor = connection(shard).cursor()
+                        cursor.fast_executemany = True
+                        cursors[shard] = cursor
+                    return cursors[shard]
+
+                def load(rows):
+                    # Task id columns of rows pointing at tasks that changed shard
+                    moved = _moved_task_ids(
+                        cursor_for, [row[c] for row in rows for c in task_columns if row[c] is not None]
+                    )
+
+                    batches = {}
+                    for row in rows:
+                        if table in TASK_TABLES:
+                            shard = shard_for_user(row["user_id"])
+                            if shard != shard_for_task(row["task_id"]):
+                                _load_moved_task(cursor_for(shard), table, row)
+                                totals[table] = totals.get(table, 0) + 1
+                                continue
+                        else:
+                            for column in task_columns:
+                                row[column] = moved.get(row[column], row[column])
+                            shard = _route(row)
+
+                        batches.setdefault(shard, []).append(
+                            [row[c] for c in insert_columns] + [row[c] for c in key_columns]
+                        )
+                        totals[table] = totals.get(table, 0) + 1
+
+                    for shard, batch in batches.items():
+                        cursor = cursor_for(shard)
+                        if table in IDENTITY_INSERT_TABLES:
+                            cursor.execute(f"SET IDENTITY_INSERT {table} ON")
+                        cursor.executemany(insert_sql, batch)
+                        if table in IDENTITY_INSERT_TABLES:
+                            cursor.execute(f"SET IDENTITY_INSERT {table} OFF")
+
+                rows = []
+                for row in _read_rows(table_dir, part, columns, manifest["types"]):
+                    rows.append(row)
+                    if len(rows) >= batch_size:
+                        load(rows)
+                        rows = []
+                load(rows)
+
+                for shard in cursors:
+                    connections[shard].commit()
+
+                loaded.add(part_key)
+                checkpoint["loaded"] = sorted(loaded)
+                _save_json(checkpoint_path, checkpoint)
+
+    except Exception:
+        for conn in connections.values():
+            conn.rollback()
+        raise
+
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+    elapsed = time.monotonic() - started
+    imported = sum(totals.values())
+    logger.info(f"Imported {imported} rows in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s)")
+    return totals
@@ -0,0 +1,57 @@
+def upsert(cursor, table, keys, values=None, update_set=None, output=None):
+    """
+    Insert-or-update a single row with one MERGE statement (SQL Server way).
+
+    The HOLDLOCK hint takes a key-range lock on the target row, so two
+    concurrent upserts for the same key serialize instead of both seeing
+    "not matched" and racing into a primary key violation.
+
+    Args:
+        cursor: Open pyodbc cursor (caller owns the transaction)
+        table: Target table name
+        keys: Dict of key column -> value used in the ON clause
+        values: Dict of column -> value for the row being written
+        update_set: Dict of column -> SQL expression used when the row
+            already exists. Expressions may reference `target.<col>` and
+            `source.<col>`. Defaults to `source.<col>` for every value
+            column. Pass an empty dict to only insert when missing.
+        output: Optional list of columns to return via OUTPUT INSERTED
+
+    Returns:
+        The OUTPUT row when `output` is given, otherwise None
+    """
+    values = values or {}
+    columns = list(keys) + [c for c in values if c not in keys]
+    params = [keys[c] if c in keys else values[c] for c in columns]
+
+    if update_set is None:
+        update_set = {c: f"source.{c}" for c in values if c not in keys}
+
+    source_cols = ", ".join(f"? AS {c}" for c in columns)
+    on_clause = " AND ".join(f"target.{c} = source.{c}" for c in keys)
+    insert_cols = ", ".join(columns)
+    insert_vals = ", ".join(f"source.{c}" for c in columns)
+
+    sql = f"""
+    MERGE {table} WITH (HOLDLOCK) AS target
+    USING (SELECT {source_cols}) AS source
+    ON {on_clause}
+    """
+
+    if update_set:
+        assignments = ", ".join(f"{c} = {expr}" for c, expr in update_set.items())
+        sql += f"WHEN MATCHED THEN UPDATE SET {assignments}\n"
+
+    sql += f"WHEN NOT MATCHED THEN INSERT ({insert_cols}) VALUES ({insert_vals})\n"
+
+    if output:
+        sql += "OUTPUT " + ", ".join(f"INSERTED.{c}" for c in output) + "\n"
+
+    # MERGE must be terminated with a semicolon
+    sql += ";"
+
+    cursor.execute(sql, params)
+
+    if output:
+        return cursor.fetchone()
+    return None
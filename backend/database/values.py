@@ -0,0 +1,10 @@
+def values_rows(count: int, width: int) -> str:
+    """
+    Placeholders for a multi-row VALUES list: values_rows(2, 3) is
+    "(?, ?, ?), (?, ?, ?)". Params go in row by row.
+
+    SQL Server takes at most 1000 rows per VALUES list and 2100 params per
+    statement, so callers batch larger inputs.
+    """
+    row = "(" + ", ".join("?" for _ in range(width)) + ")"
+    return ", ".join(row for _ in range(count))
@@ -1,26 +1,32 @@
 import azure.functions as func
 import logging
 
+from database.db import shard_count
+from database import metrics
 from database.schema import create_tables
 from user.user_profile import handle_get_profile, handle_update_profile
 from user.get_stats import handle_get_user_stats
+from user.get_leaderboard import handle_get_leaderboard
+from user.leaderboard import rebuild_snapshot
 from task.create_task import handle_create_task
 from task.get_current_step import handle_get_current_step
 from task.mark_step_done import handle_mark_step_done
+from task.list_tasks import handle_list_tasks
+from task.sync_steps import handle_sync_steps
+from task.get_full_task import handle_get_full_task
+from task.task_events import handle_task_events
+from task.split_step import handle_split_step
+from task.repeat_task import handle_repeat_task, create_recurring_tasks
+from user.activity import compact_activity
+from task.archive_tasks import archive_completed_tasks
+from shared.pipeline import pipeline
+from ai.llm_client import warm_up_llm
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = func.FunctionApp()
 
-def add_cors_headers(response: func.HttpResponse) -> func.HttpResponse:
-    """Add CORS headers to allow frontend access"""
-    response.headers['Access-Control-Allow-Origin'] = 'https://micro-wins-ai.vercel.app'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-    response.headers['Access-Control-Max-Age'] = '3600'
-    return response
-
 # Initialize DB tables on startup
 try:
     create_tables()
@@ -28,62 +34,131 @@ try:
 except Exception as e:
     logger.error(f"Database init failed: {e}")
 
+# Open LLM connections before the first request needs them
+warm_up_llm()
+
 
 @app.route(route="user/profile", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
 def get_profile(req: func.HttpRequest) -> func.HttpResponse:
-    if req.method == "OPTIONS":
-        return add_cors_headers(func.HttpResponse(status_code=200))
     logger.info("GET /user/profile")
-    return add_cors_headers(handle_get_profile(req))
+    return handle_get_profile(req)
 
 
 @app.route(route="user/profile/update", methods=["PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
 def update_profile(req: func.HttpRequest) -> func.HttpResponse:
-    if req.method == "OPTIONS":
-        return add_cors_headers(func.HttpResponse(status_code=200))
     logger.info("PUT /user/profile")
-    return add_cors_headers(handle_update_profile(req))
+    return handle_update_profile(req)
 
 
 @app.route(route="task/create", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
 def create_task(req: func.HttpRequest) -> func.HttpResponse:
-    if req.method == "OPTIONS":
-        return add_cors_headers(func.HttpResponse(status_code=200))
     logger.info("POST /task/create")
-    return add_cors_headers(handle_create_task(req))
+    return handle_create_task(req)
 
 
 @app.route(route="task/current-step", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
 def get_current_step(req: func.HttpRequest) -> func.HttpResponse:
-    if req.method == "OPTIONS":
-        return add_cors_headers(func.HttpResponse(status_code=200))
     logger.info("GET /task/current-step")
-    return add_cors_headers(handle_get_current_step(req))
+    return handle_get_current_step(req)
 
 
 @app.route(route="task/mark-done", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
 def mark_step_done(req: func.HttpRequest) -> func.HttpResponse:
-    if req.method == "OPTIONS":
-        return add_cors_headers(func.HttpResponse(status_code=200))
     logger.info("POST /task/mark-done")
-    return add_cors_headers(handle_mark_step_done(req))
+    return handle_mark_step_done(req)
+
+
+@app.route(route="task/full", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
+def get_full_task(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("GET /task/full")
+    return handle_get_full_task(req)
+
+
+@app.route(route="task/sync", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
+def sync_steps(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("POST /task/sync")
+    return handle_sync_steps(req)
+
+
+@app.route(route="task/list", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
+def list_tasks(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("GET /task/list")
+    return handle_list_tasks(req)
+
+
+@app.route(route="task/split-step", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
+def split_step(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("POST /task/split-step")
+    return handle_split_step(req)
+
+
+@app.route(route="task/repeat", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
+def repeat_task(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("POST /task/repeat")
+    return handle_repeat_task(req)
+
+
+@app.route(route="task/events", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
+async def task_events(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("GET /task/events")
+    return await handle_task_events(req)
 
 
 @app.route(route="health", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
 def health_check(req: func.HttpRequest) -> func.HttpResponse:
-    if req.method == "OPTIONS":
-        return add_cors_headers(func.HttpResponse(status_code=200))
     logger.info("GET /health")
-    return add_cors_headers(func.HttpResponse(
-        '{"status": "ok", "service": "smart-companion-backend"}',
-        status_code=200,
-        mimetype="application/json"
-    ))
+    return {
+        "status": "ok",
+        "service": "smart-companion-backend",
+        "metrics": metrics.snapshot()
+    }
 
 
 @app.route(route="user/stats", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
 def get_user_stats(req: func.HttpRequest) -> func.HttpResponse:
-    if req.method == "OPTIONS":
-        return add_cors_headers(func.HttpResponse(status_code=200))
     logger.info("GET /user/stats")
-    return add_cors_headers(handle_get_user_stats(req))
+    return handle_get_user_stats(req)
+
+
+@app.route(route="user/leaderboard", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@pipeline
+def get_leaderboard(req: func.HttpRequest) -> func.HttpResponse:
+    logger.info("GET /user/leaderboard")
+    return handle_get_leaderboard(req)
+
+
+@app.timer_trigger(schedule="0 */15 * * * *", arg_name="timer", run_on_startup=False)
+def compact_activity_events(timer: func.TimerRequest) -> None:
+    compacted = sum(compact_activity(shard) for shard in range(shard_count()))
+    logger.info(f"Activity compaction rolled up {compacted} events")
+
+
+@app.timer_trigger(schedule="0 0 3 * * *", arg_name="timer", run_on_startup=False)
+def archive_tasks(timer: func.TimerRequest) -> None:
+    archived = sum(archive_completed_tasks(shard) for shard in range(shard_count()))
+    logger.info(f"Archived {archived} completed tasks")
+
+
+@app.timer_trigger(schedule="0 */10 * * * *", arg_name="timer", run_on_startup=False)
+def rebuild_leaderboard(timer: func.TimerRequest) -> None:
+    ranked = sum(rebuild_snapshot(shard) for shard in range(shard_count()))
+    logger.info(f"Leaderboard snapshot rebuilt with {ranked} entries")
+
+
+@app.timer_trigger(schedule="0 30 0 * * *", arg_name="timer", run_on_startup=False)
+def recurring_tasks(timer: func.TimerRequest) -> None:
+    created = sum(create_recurring_tasks(shard) for shard in range(shard_count()))
+    logger.info(f"Created {created} recurring tasks")
@@ -0,0 +1,17 @@
+import logging
+from database.db import get_db_connection, shard_count
+from user.badge_engine import backfill_badges
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    for shard in range(shard_count()):
+        conn = get_db_connection(shard=shard)
+        cursor = conn.cursor()
+        inserted = backfill_badges(cursor)
+        conn.commit()
+        conn.close()
+        logger.info(f"Badge backfill complete on shard {shard}: {inserted} badges awarded")
+except Exception as e:
+    logger.error(f"Badge backfill failed: {e}")
@@ -0,0 +1,31 @@
+import json
+import logging
+import argparse
+from database.transfer import export_data, import_data
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(description="Stream user data out of / into the database")
+subparsers = parser.add_subparsers(dest="command", required=True)
+
+export_parser = subparsers.add_parser("export", help="Export tables to chunked NDJSON files")
+export_parser.add_argument("--out", required=True, help="Output directory (rerun with the same one to resume)")
+export_parser.add_argument("--user-id", action="append", dest="user_ids", help="Only export these users (repeatable)")
+export_parser.add_argument("--chunk-rows", type=int, default=50000, help="Rows per chunk file")
+export_parser.add_argument("--fetch-size", type=int, default=5000, help="Rows per fetchmany call")
+
+import_parser = subparsers.add_parser("import", help="Bulk-load an export directory")
+import_parser.add_argument("--in", required=True, dest="in_dir", help="Export directory (rerun to resume)")
+import_parser.add_argument("--batch-size", type=int, default=1000, help="Rows per executemany batch")
+
+args = parser.parse_args()
+
+try:
+    if args.command == "export":
+        totals = export_data(args.out, args.user_ids, args.chunk_rows, args.fetch_size)
+    else:
+        totals = import_data(args.in_dir, args.batch_size)
+    print(json.dumps(totals))
+except Exception as e:
+    logger.error(f"Data transfer failed: {e}")
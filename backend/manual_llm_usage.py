@@ -0,0 +1,18 @@
+import json
+import logging
+import argparse
+from ai.usage_ledger import usage_report, GROUP_KEYS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(description="Report LLM token usage and latency from the usage ledger")
+parser.add_argument("--group-by", choices=sorted(GROUP_KEYS), default="user", help="Group per user or per profile")
+parser.add_argument("--days", type=int, default=30, help="How many days back to report")
+args = parser.parse_args()
+
+try:
+    for row in usage_report(args.group_by, args.days):
+        print(json.dumps(row))
+except Exception as e:
+    logger.error(f"LLM usage report failed: {e}")
@@ -0,0 +1,18 @@
+import logging
+from database.db import shard_count
+from task.step_store import pack_task_steps
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    for shard in range(shard_count()):
+        total = 0
+        while True:
+            packed = pack_task_steps(shard)
+            total += packed
+            if not packed:
+                break
+        logger.info(f"Step packing complete on shard {shard}: {total} tasks packed")
+except Exception as e:
+    logger.error(f"Step packing failed: {e}")
@@ -0,0 +1,26 @@
+import json
+import logging
+import argparse
+from database.rebalance import rebalance
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(description="Move users to the shard the hash ring assigns them")
+parser.add_argument("--ring-size", type=int, help="Shard count to place users over (default: all configured shards)")
+parser.add_argument("--limit", type=int, help="Stop after moving this many users")
+parser.add_argument("--dry-run", action="store_true", help="Only report which users would move")
+args = parser.parse_args()
+
+try:
+    for user_id, source, target, task_id_map in rebalance(args.ring_size, args.dry_run, args.limit):
+        # Old task ids keep resolving through moved_tasks; the remap is
+        # printed for clients that want to update the ids they hold
+        print(json.dumps({
+            "user_id": user_id,
+            "from_shard": source,
+            "to_shard": target,
+            "task_ids": task_id_map
+        }))
+except Exception as e:
+    logger.error(f"Rebalance failed: {e}")
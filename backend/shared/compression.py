@@ -0,0 +1,46 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Small bodies fit in one packet already; compressing them only costs CPU
+MIN_COMPRESS_BYTES = 512
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    """Parse an Accept-Encoding header, ignoring codings with q=0."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token)
+    return accepted
+
+
+def compress_body(body: bytes, accept_encoding: str):
+    """
+    Compress a response body for the client's Accept-Encoding.
+
+    Prefers brotli (when the package is installed) over gzip.
+
+    Returns:
+        (body, content_encoding) - content_encoding is None if untouched
+    """
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+
+    accepted = _accepted_encodings(accept_encoding)
+
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return brotli.compress(body, quality=5), "br"
+
+    if "gzip" in accepted or "*" in accepted:
+        return gzip.compress(body, compresslevel=6), "gzip"
+
+    return body, None
@@ -0,0 +1,145 @@
+import json
+import inspect
+import logging
+import functools
+import azure.functions as func
+from shared.compression import compress_body
+from shared import profiling
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "https://micro-wins-ai.vercel.app",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization, If-None-Match, Accept, Last-Event-ID",
+    "Access-Control-Expose-Headers": "ETag",
+    "Access-Control-Max-Age": "3600"
+}
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+class ApiError(Exception):
+    """Raised by handlers to return a structured error response."""
+
+    def __init__(self, status_code: int, message: str, code: str = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.code = code or {
+            400: "bad_request",
+            404: "not_found",
+            409: "conflict"
+        }.get(status_code, "error")
+
+
+def dumps_json(data) -> bytes:
+    """Serialize with orjson when installed, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def serialize(data, accept: str):
+    """
+    Serialize a payload for the client's Accept header.
+
+    Returns:
+        (body, mimetype)
+    """
+    if msgpack is not None and accept and any(t in accept for t in MSGPACK_TYPES):
+        return msgpack.packb(data, use_bin_type=True, default=str), "application/msgpack"
+    return dumps_json(data), "application/json"
+
+
+def render(req: func.HttpRequest, data, status_code: int = 200) -> func.HttpResponse:
+    """Build a negotiated, compressed response from a payload."""
+    body, mimetype = serialize(data, req.headers.get("Accept"))
+    body, encoding = compress_body(body, req.headers.get("Accept-Encoding"))
+
+    headers = dict(CORS_HEADERS)
+    headers["Vary"] = "Accept, Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return func.HttpResponse(
+        body,
+        status_code=status_code,
+        mimetype=mimetype,
+        headers=headers
+    )
+
+
+def error_response(req: func.HttpRequest, status_code: int, code: str, message: str) -> func.HttpResponse:
+    return render(req, {"error": code, "message": message}, status_code)
+
+
+def _respond(req: func.HttpRequest, result) -> func.HttpResponse:
+    if isinstance(result, func.HttpResponse):
+        for name, value in CORS_HEADERS.items():
+            result.headers[name] = value
+        return result
+
+    return render(req, result)
+
+
+def pipeline(handler):
+    """
+    Wrap an HTTP route with the shared response pipeline.
+
+    - OPTIONS preflight is answered here, before any handler code runs
+    - dict/list results are serialized (JSON or MessagePack) and compressed
+    - func.HttpResponse results pass through with CORS headers added
+    - ApiError becomes a structured error; anything else is logged and
+      returned as a generic 500 so internals never reach the client
+    - opted-in requests are profiled (see shared/profiling.py)
+
+    An async handler gets an async wrapper, so the route runs on the
+    worker's event loop. Those are not profiled: the profilers sample a
+    thread, and an awaiting coroutine has none.
+    """
+
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(req: func.HttpRequest) -> func.HttpResponse:
+            if req.method == "OPTIONS":
+                return func.HttpResponse(status_code=204, headers=dict(CORS_HEADERS))
+
+            try:
+                result = await handler(req)
+            except ApiError as e:
+                return error_response(req, e.status_code, e.code, e.message)
+            except Exception:
+                logger.exception(f"Unhandled error in {handler.__name__}")
+                return error_response(req, 500, "internal_error", "Something went wrong. Please try again.")
+
+            return _respond(req, result)
+
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(req: func.HttpRequest) -> func.HttpResponse:
+        if req.method == "OPTIONS":
+            return func.HttpResponse(status_code=204, headers=dict(CORS_HEADERS))
+
+        try:
+            result = profiling.run(req, handler.__name__, handler)
+        except ApiError as e:
+            return error_response(req, e.status_code, e.code, e.message)
+        except Exception:
+            logger.exception(f"Unhandled error in {handler.__name__}")
+            return error_response(req, 500, "internal_error", "Something went wrong. Please try again.")
+
+        return _respond(req, result)
+
+    return wrapper
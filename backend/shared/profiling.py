@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import hmac
+import uuid
+import random
+import hashlib
+import logging
+import tempfile
+import threading
+import contextvars
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+# Signed opt-in: "<expires_unix>.<hex HMAC-SHA256 of expires_unix>"
+PROFILE_HEADER = "X-Profile-Token"
+SIGNING_KEY = os.getenv("PROFILE_SIGNING_KEY", "")
+
+# Random opt-in for a fraction of all requests (0 = off)
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Never profile more than this many requests per worker per minute
+MAX_PER_MINUTE = int(os.getenv("PROFILE_MAX_PER_MINUTE", "6"))
+
+# "sample" (stack sampler, collapsed stacks) or "cprofile" (deterministic)
+MODE = os.getenv("PROFILE_MODE", "sample")
+INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR") or os.path.join(tempfile.gettempdir(), "profiles")
+
+MAX_SQL_CHARS = 2000
+
+ENABLED = bool(SIGNING_KEY) or SAMPLE_RATE > 0
+
+_started = deque()
+_started_lock = threading.Lock()
+
+# SQL statements of the request being profiled in this context
+_sql_log = contextvars.ContextVar("profile_sql_log", default=None)
+
+
+def sign_token(expires: int, key: str = None) -> str:
+    """Build a PROFILE_HEADER value valid until `expires` (unix seconds)."""
+    key = key or SIGNING_KEY
+    digest = hmac.new(key.encode("utf-8"), str(expires).encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{expires}.{digest}"
+
+
+def _valid_token(token: str) -> bool:
+    if not SIGNING_KEY or not token or "." not in token:
+        return False
+
+    expires, _, _ = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+
+    return hmac.compare_digest(token.encode("utf-8"), sign_token(int(expires)).encode("utf-8"))
+
+
+def _take_slot() -> bool:
+    now = time.monotonic()
+    with _started_lock:
+        while _started and now - _started[0] > 60:
+            _started.popleft()
+        if len(_started) >= MAX_PER_MINUTE:
+            return False
+        _started.append(now)
+        return True
+
+
+def _should_profile(req) -> bool:
+    requested = _valid_token(req.headers.get(PROFILE_HEADER))
+    if not requested and not (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE):
+        return False
+    return _take_slot()
+
+
+class StackSampler:
+    """Samples one thread's stack every interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfiledCursor:
+    """Cursor wrapper that times every statement into the request's SQL log."""
+
+    def __init__(self, cursor, log: list):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_log", log)
+
+    def _timed(self, method, sql, *args):
+        started = time.perf_counter()
+        try:
+            method(sql, *args)
+        finally:
+            self._log.append({
+                "sql": " ".join(sql.split())[:MAX_SQL_CHARS],
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+                "rows": self._cursor.rowcount,
+                "batch": method.__name__ == "executemany"
+            })
+        return self
+
+    def execute(self, sql, *args):
+        return self._timed(self._cursor.execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._timed(self._cursor.executemany, sql, *args)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. cursor.fast_executemany = True
+        setattr(self._cursor, name, value)
+
+
+class ProfiledConnection:
+    def __init__(self, conn, log: list):
+        self._conn = conn
+        self._log = log
+
+    def cursor(self):
+        return ProfiledCursor(self._conn.cursor(), self._log)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def wrap_connection(conn):
+    """Return conn unchanged unless the current request is being profiled."""
+    log = _sql_log.get()
+    if log is None:
+        return conn
+    return ProfiledConnection(conn, log)
+
+
+def _write(request_id, route, elapsed, sql_log, stacks, stats, error):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    base = os.path.join(OUTPUT_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{route}-{request_id}")
+
+    if stacks is not None:
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            f.write(stacks)
+    if stats is not None:
+        stats.dump_stats(base + ".prof")
+
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({
+            "request_id": request_id,
+            "route": route,
+            "mode": MODE,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "sql_ms": round(sum(s["ms"] for s in sql_log), 3),
+            "sql": sql_log,
+            "error": error
+        }, f, indent=2)
+
+    return base
+
+
+def run(req, route: str, handler):
+    """
+    Call handler(req), profiling it if this request opted in.
+
+    Disabled profiling costs one boolean check per request.
+    """
+    if not ENABLED or not _should_profile(req):
+        return handler(req)
+
+    # The id ends up in a file name, so only accept plain tokens from the client
+    request_id = req.headers.get("X-Request-Id") or ""
+    if not request_id.replace("-", "").isalnum() or len(request_id) > 64:
+        request_id = uuid.uuid4().hex
+    sql_log = []
+    token = _sql_log.set(sql_log)
+    sampler = profiler = None
+    error = None
+
+    if MODE == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler is active on this thread (3.12+ allows one)
+            _sql_log.reset(token)
+            logger.warning(f"Not profiling {route} request {request_id}: {e}")
+            return handler(req)
+    else:
+        sampler = StackSampler(threading.get_ident(), INTERVAL_SECONDS)
+        sampler.start()
+
+    started = time.perf_counter()
+    try:
+        return handler(req)
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        if sampler is not None:
+            sampler.stop()
+        _sql_log.reset(token)
+
+        try:
+            path = _write(
+                request_id,
+                route,
+                elapsed,
+                sql_log,
+                sampler.collapsed() if sampler else None,
+                profiler,
+                error
+            )
+            logger.info(f"Profiled {route} request {request_id}: {path}")
+        except Exception as e:
+            logger.error(f"Writing profile for {request_id} failed: {e}")
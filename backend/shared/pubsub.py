@@ -0,0 +1,224 @@
+import time
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Events kept per channel for Last-Event-ID resume
+BUFFER_SIZE = 50
+
+# Channels with no publish for this long are dropped
+CHANNEL_TTL_SECONDS = 3600
+SWEEP_EVERY = 1000
+
+
+class Broker(ABC):
+    """
+    Carries published events to every node's Hub.
+
+    The in-memory broker only reaches hubs in this process; a networked
+    broker (Redis pub/sub, Service Bus, ...) implements the same two methods
+    to fan out across workers.
+    """
+
+    @abstractmethod
+    def attach(self, hub):
+        """Start delivering published events to hub.deliver()."""
+
+    @abstractmethod
+    def publish(self, channel: str, event: dict):
+        """Deliver event on channel to every attached hub, on every node."""
+
+
+class InMemoryBroker(Broker):
+    """Fans out to every attached hub. Several hubs stand in for several nodes."""
+
+    def __init__(self):
+        self._hubs = []
+        self._lock = threading.Lock()
+
+    def attach(self, hub):
+        with self._lock:
+            self._hubs.append(hub)
+
+    def publish(self, channel: str, event: dict):
+        with self._lock:
+            hubs = list(self._hubs)
+        for hub in hubs:
+            hub.deliver(channel, event)
+
+
+class Hub:
+    """
+    One node's view of the event stream: a ring buffer per channel, a
+    condition per channel for threads waiting on new events, and futures
+    for coroutines waiting on them.
+
+    Event ids are microsecond timestamps made strictly increasing, so they
+    keep growing across restarts and clients can resume with Last-Event-ID.
+    """
+
+    def __init__(self, broker: Broker = None, buffer_size: int = BUFFER_SIZE):
+        self.broker = broker or InMemoryBroker()
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._conditions = {}
+        # channel -> [(loop, future)] of coroutines in wait_async
+        self._waiters = {}
+        self._touched = {}
+        # Id of the newest event pushed out of each channel's buffer
+        self._evicted = {}
+        # Newest id of any swept channel (a resume from before it may have lost events)
+        self._floor = 0
+        self._last_id = 0
+        self._published = 0
+        self.broker.attach(self)
+
+    def _next_id(self) -> int:
+        with self._lock:
+            self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+            return self._last_id
+
+    def _condition(self, channel):
+        condition = self._conditions.get(channel)
+        if condition is None:
+            condition = self._conditions[channel] = threading.Condition(self._lock)
+        return condition
+
+    def publish(self, channel: str, event_type: str, data: dict) -> int:
+        event = {"id": self._next_id(), "type": event_type, "data": data}
+        self.broker.publish(channel, event)
+        return event["id"]
+
+    def deliver(self, channel: str, event: dict):
+        """Called by the broker on every node."""
+        with self._lock:
+            buffer = self._buffers.get(channel)
+            if buffer is None:
+                buffer = self._buffers[channel] = deque()
+
+            if len(buffer) >= self.buffer_size:
+                self._evicted[channel] = buffer.popleft()["id"]
+            buffer.append(event)
+            self._last_id = max(self._last_id, event["id"])
+            self._touched[channel] = time.monotonic()
+
+            self._condition(channel).notify_all()
+            for loop, future in self._waiters.pop(channel, ()):
+                try:
+                    loop.call_soon_threadsafe(_resolve, future)
+                except RuntimeError:
+                    # The waiter's loop has shut down
+                    pass
+
+            self._published += 1
+            if self._published % SWEEP_EVERY == 0:
+                self._sweep()
+
+    def _sweep(self):
+        cutoff = time.monotonic() - CHANNEL_TTL_SECONDS
+        for channel in [c for c, t in self._touched.items() if t < cutoff]:
+            if channel in self._buffers:
+                self._floor = max(self._floor, self._buffers[channel][-1]["id"])
+            self._buffers.pop(channel, None)
+            self._conditions.pop(channel, None)
+            self._evicted.pop(channel, None)
+            self._touched.pop(channel, None)
+
+    def _since(self, channel, after_id):
+        buffer = self._buffers.get(channel, ())
+        evicted = self._evicted.get(channel, 0 if channel in self._buffers else self._floor)
+
+        # Events after after_id were dropped: the client has to resync
+        if after_id < evicted:
+            return [{"id": self._last_id, "type": "resync", "data": {}}]
+
+        return [event for event in buffer if event["id"] > after_id]
+
+    def latest_id(self) -> int:
+        with self._lock:
+            return self._last_id
+
+    def wait(self, channel: str, after_id: int, timeout: float) -> list:
+        """
+        Events on channel newer than after_id, waiting up to timeout seconds
+        for the first one. Returns [] on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            condition = self._condition(channel)
+            self._touched.setdefault(channel, time.monotonic())
+            while True:
+                events = self._since(channel, after_id)
+                if events:
+                    return events
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                condition.wait(remaining)
+
+
+    async def wait_async(self, channel: str, after_id: int, timeout: float) -> list:
+        """
+        wait() for coroutines: the caller awaits a future that deliver()
+        resolves, instead of holding a worker thread for up to timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            future = loop.create_future()
+            with self._lock:
+                self._touched.setdefault(channel, time.monotonic())
+                events = self._since(channel, after_id)
+                if events or remaining <= 0:
+                    return events
+                self._waiters.setdefault(channel, []).append((loop, future))
+
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    waiters = self._waiters.get(channel)
+                    if waiters and (loop, future) in waiters:
+                        waiters.remove((loop, future))
+                        if not waiters:
+                            del self._waiters[channel]
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub() -> Hub:
+    """The process-wide hub."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = Hub()
+    return _hub
+
+
+def publish(channel: str, event_type: str, data: dict):
+    """
+    Publish after the write committed. Never raises: a lost event only
+    delays a client until its next reconnect.
+    """
+    try:
+        return get_hub().publish(channel, event_type, data)
+    except Exception as e:
+        logger.error(f"Publishing {event_type} on {channel} failed: {e}")
+        return None
@@ -0,0 +1,97 @@
+import os
+import logging
+from database.db import get_db_connection
+from database.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+
+def archive_completed_tasks(shard: int = 0, max_age_days: int = None, batch_size: int = 500, max_batches: int = 20) -> int:
+    """
+    Move old completed tasks and their steps on one shard into the archive tables.
+
+    Works in bounded batches, one transaction each, walking task_id upward
+    from a checkpoint so an interrupted run resumes where it stopped.
+    When a sweep reaches the end the checkpoint resets, so tasks that
+    complete after the sweep passed them are picked up next time.
+
+    Returns:
+        Number of tasks archived
+    """
+    if max_age_days is None:
+        max_age_days = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+
+    conn = get_db_connection(shard=shard)
+    cursor = conn.cursor()
+    archived = 0
+
+    try:
+        upsert(
+            cursor,
+            "archive_state",
+            keys={"id": 1},
+            values={"last_task_id": 0},
+            update_set={}
+        )
+        conn.commit()
+
+        for _ in range(max_batches):
+            cursor.execute(
+                "SELECT last_task_id FROM archive_state WITH (UPDLOCK, HOLDLOCK) WHERE id = 1"
+            )
+            last_task_id = cursor.fetchone()[0]
+
+            cursor.execute(
+                """
+                SET NOCOUNT ON;
+
+                DECLARE @ids TABLE (task_id INT PRIMARY KEY);
+
+                INSERT INTO @ids (task_id)
+                SELECT TOP (?) task_id
+                FROM tasks
+                WHERE task_id > ?
+                AND status = 'completed'
+                AND created_at < DATEADD(day, -?, GETDATE())
+                ORDER BY task_id;
+
+                INSERT INTO tasks_archive
+                    (task_id, user_id, task_name, difficulty_level, current_step_index, status, created_at,
+                     steps_blob, steps_format, step_count, steps_done_mask)
+                SELECT t.task_id, t.user_id, t.task_name, t.difficulty_level,
+                       t.current_step_index, t.status, t.created_at,
+                       t.steps_blob, t.steps_format, t.step_count, t.steps_done_mask
+                FROM tasks t
+                JOIN @ids i ON i.task_id = t.task_id;
+
+                INSERT INTO task_steps_archive
+                    (step_id, task_id, step_order, step_text, estimated_time_minutes, is_done)
+                SELECT s.step_id, s.task_id, s.step_order, s.step_text, s.estimated_time_minutes, s.is_done
+                FROM task_steps s
+                JOIN @ids i ON i.task_id = s.task_id;
+
+                DELETE s FROM task_steps s JOIN @ids i ON i.task_id = s.task_id;
+                DELETE t FROM tasks t JOIN @ids i ON i.task_id = t.task_id;
+
+                SELECT COUNT(*), MAX(task_id) FROM @ids;
+                """,
+                (batch_size, last_task_id, max_age_days)
+            )
+            count, max_task_id = cursor.fetchone()
+
+            # Sweep finished: start from the beginning next run
+            done = count < batch_size
+            cursor.execute(
+                "UPDATE archive_state SET last_task_id = ? WHERE id = 1",
+                (0 if done else max_task_id,)
+            )
+            conn.commit()
+            archived += count
+
+            if done:
+                break
+
+    finally:
+        conn.close()
+
+    return archived
@@ -1,139 +1,286 @@
-import json
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import azure.functions as func
 
-from database.db import get_db_connection
+from database import metrics
+from database.db import get_db_connection, get_task_connection, mark_write
+from shared.pipeline import ApiError
 from ai.task_breaker import generate_neuro_task_breakdown
+from ai.local_breakdown import local_breakdown
 from ai.schemas import NeuroUserProfile
+from task.task_events import publish_step_advanced
+from user import stats_cache
+from task.step_store import storage_mode, encode_steps, FORMAT_GZIP_JSON, MAX_PACKED_STEPS
 
+logger = logging.getLogger(__name__)
 
-def handle_create_task(req: func.HttpRequest) -> func.HttpResponse:
-    try:
-        body = req.get_json()
-    except ValueError:
-        return func.HttpResponse(
-            "Invalid JSON body",
-            status_code=400
-        )
+# How long task/create waits for the LLM before answering with the local
+# breakdown; the LLM result still upgrades the task if it arrives later
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "8"))
 
-    user_id = body.get("user_id")
-    task_description = body.get("task")
+LLM_EXECUTOR_WORKERS = int(os.getenv("LLM_EXECUTOR_WORKERS", "8"))
 
-    # User profile parameters (with defaults)
-    neurodivergence = body.get("neurodivergence", "ADHD")
-    step_granularity = body.get("step_granularity", "normal")
-    break_interval = body.get("break_interval_minutes", 25)
-    fatigue_triggers = body.get("fatigue_triggers", ["long paragraphs"])
-    ai_tone = body.get("ai_tone", ["calm"])
-    response_verbosity = body.get("response_verbosity", 3)
+# LLM calls running or queued at once; past this, task/create answers with
+# the local breakdown straight away instead of queueing behind calls that
+# would miss the deadline anyway
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", str(LLM_EXECUTOR_WORKERS * 2)))
 
-    if not user_id or not task_description:
-        return func.HttpResponse(
-            "user_id and task are required",
-            status_code=400
-        )
+_llm_executor = ThreadPoolExecutor(
+    max_workers=LLM_EXECUTOR_WORKERS,
+    thread_name_prefix="llm-breakdown"
+)
 
-    # Build user profile
-    user_profile = NeuroUserProfile(
+# Upgrades are DB writes; their own pool keeps them from taking LLM slots
+_upgrade_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_UPGRADE_WORKERS", "2")),
+    thread_name_prefix="llm-upgrade"
+)
+
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_IN_FLIGHT)
+
+
+def user_profile_from_body(body: dict, user_id: str) -> NeuroUserProfile:
+    """Build the LLM profile from request params (with defaults)"""
+    return NeuroUserProfile(
         user_id=user_id,
-        neurodivergence=neurodivergence,
-        break_interval_minutes=break_interval,
-        fatigue_triggers=fatigue_triggers,
-        ai_tone=ai_tone,
-        response_verbosity=response_verbosity,
-        step_granularity=step_granularity
+        neurodivergence=body.get("neurodivergence", "ADHD"),
+        break_interval_minutes=body.get("break_interval_minutes", 25),
+        fatigue_triggers=body.get("fatigue_triggers", ["long paragraphs"]),
+        ai_tone=body.get("ai_tone", ["calm"]),
+        response_verbosity=body.get("response_verbosity", 3),
+        step_granularity=body.get("step_granularity", "normal")
     )
 
-    # Generate steps using LLM
-    try:
-        breakdown = generate_neuro_task_breakdown(
-            task_description=task_description,
-            user_profile=user_profile
-        )
-    except Exception as e:
-        return func.HttpResponse(
-            f"LLM generation failed: {str(e)}",
-            status_code=500
-        )
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+def _sorted_steps(breakdown) -> list:
+    # Stored step orders are positions 1..n in the model's numbering order
+    return sorted(breakdown.breakdown, key=lambda step: step.step_number)
 
-        # 🔥 Insert task and get inserted ID safely (SQL Server way)
-        cursor.execute(
-            """
-            INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index)
-            OUTPUT INSERTED.task_id
-            VALUES (?, ?, ?, 0)
-            """,
-            (
-                user_id,
-                breakdown.task_name,
-                breakdown.difficulty_level
-            )
-        )
 
-        task_id_row = cursor.fetchone()
+def _step_columns(steps: list, packed: bool) -> tuple:
+    """(steps_blob, steps_format, step_count, steps_done_mask) for the tasks row"""
+    if packed:
+        blob = encode_steps([(step.step_task, step.estimated_time_minutes) for step in steps])
+        return (blob, FORMAT_GZIP_JSON, len(steps), 0)
+    return (None, None, len(steps), None)
 
-        if not task_id_row or task_id_row[0] is None:
-            raise Exception("Failed to retrieve inserted task_id")
 
-        task_id = int(task_id_row[0])
+def _insert_step_rows(cursor, task_id: int, steps: list):
+    cursor.executemany(
+        """
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes)
+        VALUES (?, ?, ?, ?)
+        """,
+        [
+            (task_id, step_order, step.step_task, step.estimated_time_minutes)
+            for step_order, step in enumerate(steps, start=1)
+        ]
+    )
 
-        # Insert steps
-        for step in breakdown.breakdown:
-            cursor.execute(
-                """
-                INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes)
-                VALUES (?, ?, ?, ?)
-                """,
-                (
-                    task_id,
-                    step.step_number,
-                    step.step_task,
-                    step.estimated_time_minutes
-                )
-            )
 
-        conn.commit()
+def upgrade_task(task_id: int, breakdown):
+    """
+    Replace a task's local breakdown with the LLM's, unless the user has
+    already started on it (current_step_index > 0).
 
-        # Fetch first step
+    Returns:
+        True if the task was upgraded
+    """
+    steps = _sorted_steps(breakdown)
+    if not steps:
+        return False
+
+    conn, task_id = get_task_connection(task_id)
+    cursor = conn.cursor()
+
+    try:
         cursor.execute(
             """
-            SELECT step_order, step_text, estimated_time_minutes
-            FROM task_steps
-            WHERE task_id = ? AND step_order = 1
+            SELECT current_step_index, status, steps_blob
+            FROM tasks WITH (UPDLOCK, HOLDLOCK)
+            WHERE task_id = ?
             """,
             (task_id,)
         )
+        task = cursor.fetchone()
+
+        if not task or task[0] != 0 or task[1] != "active":
+            conn.rollback()
+            return False
+
+        packed = task[2] is not None and len(steps) <= MAX_PACKED_STEPS
 
-        first_step = cursor.fetchone()
+        cursor.execute("DELETE FROM task_steps WHERE task_id = ?", (task_id,))
+        cursor.execute(
+            """
+            UPDATE tasks
+            SET task_name = ?, difficulty_level = ?,
+                steps_blob = ?, steps_format = ?, step_count = ?, steps_done_mask = ?
+            WHERE task_id = ?
+            """,
+            (breakdown.task_name, breakdown.difficulty_level, *_step_columns(steps, packed), task_id)
+        )
 
-        if not first_step:
-            conn.close()
-            return func.HttpResponse(
-                "No steps generated",
-                status_code=500
-            )
+        if not packed:
+            _insert_step_rows(cursor, task_id, steps)
+        conn.commit()
 
-        response = {
-            "task_id": task_id,
-            "step_number": first_step[0],
-            "step_text": first_step[1],
-            "estimated_time_minutes": first_step[2]
-        }
+    except Exception:
+        conn.rollback()
+        raise
 
-        cursor.close()
+    finally:
         conn.close()
 
-        return func.HttpResponse(
-            json.dumps(response),
-            status_code=200,
-            mimetype="application/json"
-        )
+    mark_write(task_id=task_id)
+
+    # Clients showing the provisional first step switch to the real one
+    publish_step_advanced(task_id, 1, steps[0].step_task, steps[0].estimated_time_minutes, len(steps))
+    return True
+
 
+def _upgrade(task_id: int, future):
+    try:
+        upgraded = upgrade_task(task_id, future.result())
+        metrics.increment("llm.upgrade.applied" if upgraded else "llm.upgrade.skipped")
     except Exception as e:
-        return func.HttpResponse(
-            f"Database error: {str(e)}",
-            status_code=500
+        metrics.increment("llm.upgrade.failed")
+        logger.warning(f"Upgrading task {task_id} to the LLM breakdown failed: {e}")
+
+
+def _upgrade_when_ready(task_id: int, future):
+    # The callback runs inline if the LLM already finished; hand the DB work
+    # to the upgrade pool so it never runs on the request thread
+    future.add_done_callback(lambda f: _upgrade_executor.submit(_upgrade, task_id, f))
+
+
+def _submit_breakdown(task_description: str, user_profile: NeuroUserProfile):
+    """
+    Start the LLM breakdown, or return None when LLM_MAX_IN_FLIGHT calls
+    are already running or queued.
+    """
+    if not _llm_slots.acquire(blocking=False):
+        return None
+
+    try:
+        future = _llm_executor.submit(
+            generate_neuro_task_breakdown,
+            task_description=task_description,
+            user_profile=user_profile
+        )
+    except Exception:
+        _llm_slots.release()
+        raise
+
+    # Also fires when the call is cancelled before it starts
+    future.add_done_callback(lambda f: _llm_slots.release())
+    return future
+
+
+def handle_create_task(req: func.HttpRequest) -> dict:
+    try:
+        body = req.get_json()
+    except ValueError:
+        raise ApiError(400, "Invalid JSON body")
+
+    user_id = body.get("user_id")
+    task_description = body.get("task")
+
+    if not user_id or not task_description:
+        raise ApiError(400, "user_id and task are required")
+
+    # Build user profile
+    user_profile = user_profile_from_body(body, user_id)
+
+    # Generate steps using LLM, bounded by the deadline
+    future = _submit_breakdown(task_description, user_profile)
+    provisional = False
+
+    if future is None:
+        metrics.increment("llm.fallback.saturated")
+        provisional = True
+    else:
+        try:
+            breakdown = future.result(timeout=LLM_DEADLINE_SECONDS)
+        except FutureTimeout:
+            metrics.increment("llm.fallback.deadline")
+            provisional = True
+            # Still queued: drop it rather than spend a worker on a result
+            # that would only arrive as an upgrade
+            if future.cancel():
+                metrics.increment("llm.cancelled")
+                future = None
+        except Exception as e:
+            metrics.increment("llm.fallback.error")
+            logger.warning(f"LLM generation failed, using local breakdown: {e}")
+            future = None
+            provisional = True
+
+    if provisional:
+        try:
+            breakdown = local_breakdown(task_description, user_profile)
+        except Exception as e:
+            raise ApiError(502, f"LLM generation failed: {str(e)}", code="llm_generation_failed")
+
+    steps = _sorted_steps(breakdown)
+
+    if not steps:
+        raise ApiError(500, "No steps generated", code="no_steps")
+
+    packed = storage_mode() == "packed" and len(steps) <= MAX_PACKED_STEPS
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+
+    # 🔥 Insert task and get inserted ID safely (SQL Server way).
+    # Packed mode stores every step in the same row.
+    cursor.execute(
+        """
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index,
+                           steps_blob, steps_format, step_count, steps_done_mask)
+        OUTPUT INSERTED.task_id
+        VALUES (?, ?, ?, 0, ?, ?, ?, ?)
+        """,
+        (
+            user_id,
+            breakdown.task_name,
+            breakdown.difficulty_level,
+            *_step_columns(steps, packed)
         )
+    )
+
+    task_id_row = cursor.fetchone()
+
+    if not task_id_row or task_id_row[0] is None:
+        raise Exception("Failed to retrieve inserted task_id")
+
+    task_id = int(task_id_row[0])
+    mark_write(task_id=task_id)
+
+    # Insert steps
+    if not packed:
+        _insert_step_rows(cursor, task_id, steps)
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    stats_cache.invalidate(user_id, ["counts"])
+
+    # The LLM may still answer: swap in its breakdown if the user hasn't started
+    if provisional and future is not None:
+        _upgrade_when_ready(task_id, future)
+
+    first_step = steps[0]
+
+    response = {
+        "task_id": task_id,
+        "step_number": 1,
+        "step_text": first_step.step_task,
+        "estimated_time_minutes": first_step.estimated_time_minutes,
+        "provisional": provisional
+    }
+
+    return response
@@ -1,66 +1,68 @@
-import json
 import azure.functions as func
-from database.db import get_db_connection
+from database.db import get_task_connection
+from shared.pipeline import ApiError
+from task.step_store import decode_steps, step_at
 
 
-def handle_get_current_step(req: func.HttpRequest) -> func.HttpResponse:
+def handle_get_current_step(req: func.HttpRequest) -> dict:
 
     task_id = req.params.get("task_id")
 
     if not task_id:
-        return func.HttpResponse(
-            "task_id is required",
-            status_code=400
-        )
+        raise ApiError(400, "task_id is required")
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    if not str(task_id).isdigit():
+        raise ApiError(400, "task_id must be a number")
 
-        # Get task progress
-        cursor.execute(
-            """
-            SELECT current_step_index, status, task_name
-            FROM tasks
-            WHERE task_id = ?
-            """,
-            (task_id,)
-        )
+    conn, task_id = get_task_connection(task_id, read_only=True)
+    cursor = conn.cursor()
 
-        task = cursor.fetchone()
+    # Get task progress (and the packed steps, if the task has them)
+    cursor.execute(
+        """
+        SELECT current_step_index, status, task_name, step_count, steps_blob, steps_format
+        FROM tasks
+        WHERE task_id = ?
+        """,
+        (task_id,)
+    )
 
-        if not task:
-            conn.close()
-            return func.HttpResponse(
-                "Task not found",
-                status_code=404
-            )
+    task = cursor.fetchone()
 
-        current_step_index = task[0]
-        status = task[1]
-        task_name = task[2]
+    if not task:
+        conn.close()
+        raise ApiError(404, "Task not found")
 
-        if status == "completed":
-            conn.close()
-            return func.HttpResponse(
-                json.dumps({"completed": True}),
-                status_code=200,
-                mimetype="application/json"
-            )
+    current_step_index = task[0]
+    status = task[1]
+    task_name = task[2]
+    total_steps = task[3]
 
-        current_step_order = current_step_index + 1
+    if status == "completed":
+        conn.close()
+        return {"completed": True}
 
-        # Get total steps
-        cursor.execute(
-            """
-            SELECT COUNT(*)
-            FROM task_steps
-            WHERE task_id = ?
-            """,
-            (task_id,)
-        )
+    current_step_order = current_step_index + 1
+
+    if task[4] is not None:
+        conn.close()
+        steps = decode_steps(task[4], task[5])
+        total_steps = len(steps)
+        step = step_at(steps, current_step_order)
+
+    else:
+        # Get total steps (older tasks have no step_count)
+        if total_steps is None:
+            cursor.execute(
+                """
+                SELECT COUNT(*)
+                FROM task_steps
+                WHERE task_id = ?
+                """,
+                (task_id,)
+            )
 
-        total_steps = cursor.fetchone()[0]
+            total_steps = cursor.fetchone()[0]
 
         # Fetch current step
         cursor.execute(
@@ -75,31 +77,17 @@ def handle_get_current_step(req: func.HttpRequest) -> func.HttpResponse:
         step = cursor.fetchone()
         conn.close()
 
-        if not step:
-            return func.HttpResponse(
-                json.dumps({"completed": True}),
-                status_code=200,
-                mimetype="application/json"
-            )
+    if not step:
+        return {"completed": True}
 
-        response = {
-            "task_id": int(task_id),
-            "task_name": task_name,
-            "current_step_number": step[0],
-            "total_steps": total_steps,
-            "step_description": step[1],
-            "estimated_time_minutes": step[2],
-            "completed": False
-        }
-
-        return func.HttpResponse(
-            json.dumps(response),
-            status_code=200,
-            mimetype="application/json"
-        )
+    response = {
+        "task_id": int(task_id),
+        "task_name": task_name,
+        "current_step_number": step[0],
+        "total_steps": total_steps,
+        "step_description": step[1],
+        "estimated_time_minutes": step[2],
+        "completed": False
+    }
 
-    except Exception as e:
-        return func.HttpResponse(
-            f"Database error: {str(e)}",
-            status_code=500
-        )
+    return response
@@ -0,0 +1,79 @@
+import hashlib
+import azure.functions as func
+from database.db import get_task_connection
+from shared.compression import compress_body
+from shared.pipeline import ApiError, dumps_json
+
+
+def handle_get_full_task(req: func.HttpRequest) -> func.HttpResponse:
+
+    task_id = req.params.get("task_id")
+
+    if not task_id:
+        raise ApiError(400, "task_id is required")
+
+    if not str(task_id).isdigit():
+        raise ApiError(400, "task_id must be a number")
+
+    conn, task_id = get_task_connection(task_id, read_only=True)
+    cursor = conn.cursor()
+
+    # Task and all of its steps in one query (archived tasks included)
+    cursor.execute(
+        """
+        SELECT t.task_name, t.status, t.current_step_index, t.difficulty_level,
+               s.step_order, s.step_text, s.estimated_time_minutes, s.is_done
+        FROM tasks_all t
+        LEFT JOIN task_steps_all s ON s.task_id = t.task_id
+        WHERE t.task_id = ?
+        ORDER BY s.step_order
+        """,
+        (task_id,)
+    )
+
+    rows = cursor.fetchall()
+    conn.close()
+
+    if not rows:
+        raise ApiError(404, "Task not found")
+
+    first = rows[0]
+    step_rows = [row for row in rows if row[4] is not None]
+
+    # Column-oriented steps: one array per field instead of one object per step
+    response = {
+        "task_id": int(task_id),
+        "task_name": first[0],
+        "status": first[1],
+        "current_step_index": first[2],
+        "difficulty_level": first[3],
+        "steps": {
+            "number": [row[4] for row in step_rows],
+            "text": [row[5] for row in step_rows],
+            "minutes": [row[6] for row in step_rows],
+            "done": [1 if row[7] else 0 for row in step_rows]
+        }
+    }
+
+    body = dumps_json(response)
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding"
+    }
+
+    if req.headers.get("If-None-Match") == etag:
+        return func.HttpResponse(status_code=304, headers=headers)
+
+    body, encoding = compress_body(body, req.headers.get("Accept-Encoding"))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return func.HttpResponse(
+        body,
+        status_code=200,
+        mimetype="application/json",
+        headers=headers
+    )
@@ -0,0 +1,132 @@
+import json
+import base64
+from datetime import datetime
+import azure.functions as func
+from database.db import get_db_connection
+from shared.pipeline import ApiError
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+STATUSES = ("active", "completed")
+
+
+def encode_cursor(created_at: datetime, task_id: int) -> str:
+    """Opaque cursor for the last row of a page."""
+    raw = json.dumps([created_at.isoformat(), task_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor_value: str):
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor_value + "=" * (-len(cursor_value) % 4)
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(task_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def handle_list_tasks(req: func.HttpRequest) -> dict:
+
+    user_id = req.params.get("user_id")
+    status = req.params.get("status")
+    cursor_value = req.params.get("cursor")
+    include_steps = req.params.get("include_steps", "false").lower() == "true"
+
+    if not user_id:
+        raise ApiError(400, "user_id is required")
+
+    if status and status not in STATUSES:
+        raise ApiError(400, "status must be 'active' or 'completed'")
+
+    try:
+        limit = min(max(int(req.params.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError(400, "limit must be a number")
+
+    after = None
+    if cursor_value:
+        try:
+            after = decode_cursor(cursor_value)
+        except ValueError:
+            raise ApiError(400, "Invalid cursor")
+
+    # Seek on IX_tasks_user_created (and its twin on tasks_archive through the
+    # tasks_all view): (user_id, created_at DESC, task_id DESC), or on
+    # IX_tasks_user_status_created when filtering by status.
+    # Every page is an index seek + TOP, so cost does not grow with depth.
+    sql = """
+        SELECT TOP (?) t.task_id, t.task_name, t.difficulty_level,
+               t.current_step_index, t.status, t.created_at
+    """
+    if include_steps:
+        # Packed tasks carry their counts on the row (steps finish in order)
+        sql += """,
+            ISNULL(t.step_count, s.total_steps) AS total_steps,
+            CASE WHEN t.steps_blob IS NOT NULL THEN t.current_step_index ELSE s.done_steps END AS done_steps
+        """
+    sql += " FROM tasks_all t"
+    if include_steps:
+        sql += """
+            OUTER APPLY (
+                SELECT COUNT(*) AS total_steps,
+                       SUM(CASE WHEN is_done = 1 THEN 1 ELSE 0 END) AS done_steps
+                FROM task_steps_all
+                WHERE task_id = t.task_id AND t.steps_blob IS NULL
+            ) s
+        """
+    sql += " WHERE t.user_id = ?"
+
+    # Fetch one extra row to know whether another page exists
+    params = [limit + 1, user_id]
+
+    if status:
+        sql += " AND t.status = ?"
+        params.append(status)
+
+    if after:
+        # CAST keeps the comparison in DATETIME precision (the column type)
+        sql += """
+            AND (t.created_at < CAST(? AS DATETIME)
+                 OR (t.created_at = CAST(? AS DATETIME) AND t.task_id < ?))
+        """
+        params.extend([after[0], after[0], after[1]])
+
+    sql += " ORDER BY t.created_at DESC, t.task_id DESC"
+
+    conn = get_db_connection(user_id=user_id, read_only=True)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    tasks = []
+    for row in rows:
+        task = {
+            "task_id": row[0],
+            "task_name": row[1],
+            "difficulty_level": row[2],
+            "current_step_index": row[3],
+            "status": row[4],
+            "created_at": str(row[5]) if row[5] is not None else None
+        }
+        if include_steps:
+            task["steps"] = {
+                "total": row[6] or 0,
+                "done": row[7] or 0
+            }
+        tasks.append(task)
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0])
+
+    response = {
+        "tasks": tasks,
+        "next_cursor": next_cursor
+    }
+
+    return response
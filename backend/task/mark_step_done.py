@@ -1,39 +1,91 @@
-import json
 import azure.functions as func
-from database.db import get_db_connection
-from datetime import date
+from database.db import get_task_connection, mark_write
+from shared.pipeline import ApiError
+from user.rewards import record_task_completion
+from user.leaderboard import record_scores
+from user import stats_cache
+from task.task_events import publish_step_advanced, publish_task_completed
+from user.activity import log_activity, EVENT_STEP_DONE, EVENT_TASK_COMPLETED
+from task.step_store import decode_steps, step_at, done_bits
 
 
-def handle_mark_step_done(req: func.HttpRequest) -> func.HttpResponse:
+def handle_mark_step_done(req: func.HttpRequest) -> dict:
     try:
         body = req.get_json()
     except ValueError:
-        return func.HttpResponse("Invalid JSON body", status_code=400)
+        raise ApiError(400, "Invalid JSON body")
 
     task_id = body.get("task_id")
 
     if not task_id:
-        return func.HttpResponse("task_id is required", status_code=400)
+        raise ApiError(400, "task_id is required")
+
+    if not str(task_id).isdigit():
+        raise ApiError(400, "task_id must be a number")
+
+    conn, task_id = get_task_connection(task_id)
+    cursor = conn.cursor()
+
+    # Get current step index + user_id + difficulty (+ packed steps).
+    # UPDLOCK: the step packer can't rewrite the task between this read
+    # and the updates below
+    cursor.execute(
+        """
+        SELECT current_step_index, user_id, difficulty_level, steps_blob, steps_format, status
+        FROM tasks WITH (UPDLOCK)
+        WHERE task_id = ?
+        """,
+        (task_id,)
+    )
+
+    task = cursor.fetchone()
+    if not task:
+        conn.close()
+        raise ApiError(404, "Task not found")
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    # A repeated request for a finished task: nothing to advance, and the
+    # completion (counters, rewards, badges) was already recorded
+    if task[5] == "completed":
+        conn.close()
+        return {
+            "status": "completed",
+            "new_badges": []
+        }
+
+    current_index = task[0]
+    user_id = task[1]
+    difficulty_level = task[2]
+
+    # The user's stats/history change too; keep their reads on the primary
+    mark_write(user_id=user_id)
+    current_step_order = current_index + 1
+
+    packed = task[3] is not None
+
+    if packed:
+        # Packed steps: progress, bitmap and completion in one row update
+        steps = decode_steps(task[3], task[4])
+        next_step = step_at(steps, current_step_order + 1)
+        total_steps = len(steps)
 
-        # Get current step index + user_id
         cursor.execute(
-            "SELECT current_step_index, user_id FROM tasks WHERE task_id = ?",
-            (task_id,)
+            """
+            UPDATE tasks
+            SET current_step_index = current_step_index + 1,
+                steps_done_mask = steps_done_mask | ?,
+                status = CASE WHEN ? = 1 THEN 'completed' ELSE status END
+            WHERE task_id = ?
+            """,
+            (done_bits(current_index, current_step_order), 0 if next_step else 1, task_id)
         )
 
-        task = cursor.fetchone()
-        if not task:
-            conn.close()
-            return func.HttpResponse("Task not found", status_code=404)
+        log_activity(cursor, user_id, task_id, EVENT_STEP_DONE, current_step_order)
 
-        current_index = task[0]
-        user_id = task[1]
-        current_step_order = current_index + 1
+        if next_step:
+            conn.commit()
+            stats_cache.invalidate(user_id)
 
+    else:
         # Mark step as done
         cursor.execute(
             "UPDATE task_steps SET is_done = 1 WHERE task_id = ? AND step_order = ?",
@@ -46,99 +98,66 @@ def handle_mark_step_done(req: func.HttpRequest) -> func.HttpResponse:
             (task_id,)
         )
 
+        log_activity(cursor, user_id, task_id, EVENT_STEP_DONE, current_step_order)
+
         conn.commit()
+        stats_cache.invalidate(user_id)
 
-        # Get next step
+        # Get next step (and the step count for the pushed event)
         cursor.execute(
             """
-            SELECT step_order, step_text, estimated_time_minutes
+            SELECT step_order, step_text, estimated_time_minutes,
+                   (SELECT COUNT(*) FROM task_steps WHERE task_id = ?) AS total_steps
             FROM task_steps
             WHERE task_id = ? AND step_order = ?
             """,
-            (task_id, current_step_order + 1)
+            (task_id, task_id, current_step_order + 1)
         )
 
         next_step = cursor.fetchone()
+        total_steps = next_step[3] if next_step else None
+
 
-       
-        # IF TASK COMPLETED
-      
-        if not next_step:
+    # IF TASK COMPLETED
 
-            # Mark task completed
+    if not next_step:
+
+        # Mark task completed
+        if not packed:
             cursor.execute(
                 "UPDATE tasks SET status = 'completed' WHERE task_id = ?",
                 (task_id,)
             )
 
-            today = date.today()
-            reward_increment = 10
+        log_activity(cursor, user_id, task_id, EVENT_TASK_COMPLETED)
 
-            # Check if stats row exists
-            cursor.execute(
-                "SELECT reward_points, streak, last_completed_date FROM user_stats WHERE user_id = ?",
-                (user_id,)
-            )
-            stats = cursor.fetchone()
-
-            if stats:
-                reward_points = stats[0] or 0
-                streak = stats[1] or 0
-                last_date = stats[2]
-
-                # Streak logic
-                if last_date:
-                    if (today - last_date).days == 1:
-                        streak += 1
-                    elif (today - last_date).days > 1:
-                        streak = 1
-                else:
-                    streak = 1
-
-                reward_points += reward_increment
-
-                cursor.execute("""
-                    UPDATE user_stats
-                    SET reward_points = ?, streak = ?, last_completed_date = ?
-                    WHERE user_id = ?
-                """, (reward_points, streak, today, user_id))
-
-            else:
-                # First time completion
-                cursor.execute("""
-                    INSERT INTO user_stats (user_id, reward_points, streak, last_completed_date)
-                    VALUES (?, ?, ?, ?)
-                """, (user_id, reward_increment, 1, today))
+        # Rewards, streak and badges in the same transaction
+        stats = record_task_completion(cursor, user_id, difficulty_level)
 
-            conn.commit()
-            conn.close()
+        conn.commit()
+        conn.close()
 
-            return func.HttpResponse(
-                json.dumps({"status": "completed"}),
-                status_code=200,
-                mimetype="application/json"
-            )
+        stats_cache.invalidate(user_id)
+        record_scores(user_id, stats)
+        publish_task_completed(task_id)
 
-        
-        # RETURN NEXT STEP
-       
-        response = {
-            "task_id": int(task_id),
-            "step_number": next_step[0],
-            "step_text": next_step[1],
-            "estimated_time_minutes": next_step[2]
+        return {
+            "status": "completed",
+            "new_badges": stats["new_badges"]
         }
 
-        conn.close()
 
-        return func.HttpResponse(
-            json.dumps(response),
-            status_code=200,
-            mimetype="application/json"
-        )
+    # RETURN NEXT STEP
 
-    except Exception as e:
-        return func.HttpResponse(
-            f"Database error: {str(e)}",
-            status_code=500
-        )
+    response = {
+        "task_id": int(task_id),
+        "step_number": next_step[0],
+        "step_text": next_step[1],
+        "estimated_time_minutes": next_step[2]
+    }
+
+    conn.close()
+
+    publish_step_advanced(task_id, next_step[0], next_step[1], next_step[2], total_steps)
+
+    return response
@@ -0,0 +1,256 @@
+import logging
+from datetime import date
+import azure.functions as func
+from database.db import get_db_connection, moved_task_ids, mark_write
+from database.upsert import upsert
+from shared.pipeline import ApiError
+from user import stats_cache
+from task.step_store import decode_steps, step_at
+
+logger = logging.getLogger(__name__)
+
+# task_recurrences.schedule values ("weekly" repeats on the weekday it was set)
+SCHEDULES = ("daily", "weekdays", "weekly")
+
+# Row-stored steps of a source task, live or archived (packed sources carry
+# their steps in the blob, which is copied with the task row)
+_SOURCE_STEPS = """
+    SELECT task_id, step_order, step_text, estimated_time_minutes FROM task_steps
+    UNION ALL
+    SELECT task_id, step_order, step_text, estimated_time_minutes FROM task_steps_archive
+"""
+
+# Column values of a fresh copy of source task t: progress reset, blob kept
+_COPY_COLUMNS = f"""
+    t.user_id, t.task_name, t.difficulty_level, 0 AS current_step_index,
+    t.steps_blob, t.steps_format,
+    COALESCE(t.step_count, (SELECT COUNT(*) FROM ({_SOURCE_STEPS}) x WHERE x.task_id = t.task_id)) AS step_count,
+    CASE WHEN t.steps_blob IS NULL THEN NULL ELSE 0 END AS steps_done_mask
+"""
+
+
+def handle_repeat_task(req: func.HttpRequest) -> dict:
+    """
+    Start a past task again as a fresh active task, without an LLM call.
+
+    The task row and its steps are copied with INSERT ... SELECT in one
+    batch. Optional recurrence ("daily", "weekdays", "weekly" or "off")
+    has the daily timer create the copies from then on.
+    """
+    try:
+        body = req.get_json()
+    except ValueError:
+        raise ApiError(400, "Invalid JSON body")
+
+    user_id = body.get("user_id")
+    task_id = body.get("task_id")
+    recurrence = body.get("recurrence")
+
+    if not user_id or not task_id:
+        raise ApiError(400, "user_id and task_id are required")
+
+    if not str(task_id).isdigit():
+        raise ApiError(400, "task_id must be a number")
+
+    if recurrence is not None and recurrence not in SCHEDULES + ("off",):
+        raise ApiError(400, f"recurrence must be one of: {', '.join(SCHEDULES)}, off")
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+
+    try:
+        # An id from before the user moved shards
+        task_id = int(task_id)
+        task_id = moved_task_ids(cursor, user_id, [task_id]).get(task_id, task_id)
+
+        # Copy the task (hot or archived) and its step rows in one round trip
+        cursor.execute(
+            f"""
+            SET NOCOUNT ON;
+
+            DECLARE @new TABLE (task_id INT);
+
+            INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index,
+                               steps_blob, steps_format, step_count, steps_done_mask)
+            OUTPUT INSERTED.task_id INTO @new
+            SELECT {_COPY_COLUMNS}
+            FROM tasks_all t
+            WHERE t.task_id = ? AND t.user_id = ?;
+
+            DECLARE @task_id INT = (SELECT task_id FROM @new);
+
+            INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes)
+            SELECT @task_id, s.step_order, s.step_text, s.estimated_time_minutes
+            FROM ({_SOURCE_STEPS}) s
+            WHERE @task_id IS NOT NULL AND s.task_id = ?;
+
+            SELECT t.task_id, t.step_count, t.steps_blob, t.steps_format,
+                   s.step_text, s.estimated_time_minutes
+            FROM tasks t
+            LEFT JOIN task_steps s ON s.task_id = t.task_id AND s.step_order = 1
+            WHERE t.task_id = @task_id;
+            """,
+            (task_id, user_id, task_id)
+        )
+        row = cursor.fetchone()
+
+        if not row:
+            raise ApiError(404, "Task not found")
+
+        new_task_id, total_steps, steps_blob, steps_format = int(row[0]), row[1], row[2], row[3]
+
+        if steps_blob is not None:
+            first_step = step_at(decode_steps(steps_blob, steps_format), 1)
+        else:
+            first_step = (1, row[4], row[5]) if row[4] is not None else None
+
+        if not first_step:
+            raise ApiError(409, "Task has no steps to repeat")
+
+        if recurrence == "off":
+            cursor.execute(
+                "DELETE FROM task_recurrences WHERE user_id = ? AND source_task_id = ?",
+                (user_id, task_id)
+            )
+        elif recurrence:
+            # Today's copy is the one just made
+            today = date.today()
+            upsert(
+                cursor,
+                "task_recurrences",
+                keys={"user_id": user_id, "source_task_id": int(task_id)},
+                values={
+                    "schedule": recurrence,
+                    "weekday": today.weekday(),
+                    "last_created_date": today,
+                    "last_task_id": new_task_id
+                }
+            )
+
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    mark_write(task_id=new_task_id)
+    stats_cache.invalidate(user_id, ["counts"])
+
+    return {
+        "task_id": new_task_id,
+        "repeated_from": int(task_id),
+        "step_number": 1,
+        "step_text": first_step[1],
+        "estimated_time_minutes": first_step[2],
+        "total_steps": total_steps,
+        "recurrence": recurrence
+    }
+
+
+def create_recurring_tasks(shard: int = 0, batch_size: int = 500, max_batches: int = 20) -> int:
+    """
+    Create today's copies of recurring tasks on one shard.
+
+    Each batch claims due recurrences (stamping today's date), copies their
+    source tasks with one MERGE and their step rows with one INSERT ...
+    SELECT, all in one transaction. A recurrence is skipped while its last
+    copy is still active and untouched, so unused copies don't pile up.
+
+    Returns:
+        Number of tasks created
+    """
+    today = date.today()
+    conn = get_db_connection(shard=shard)
+    cursor = conn.cursor()
+    created = 0
+    users = set()
+
+    try:
+        for _ in range(max_batches):
+            cursor.execute(
+                f"""
+                SET NOCOUNT ON;
+
+                DECLARE @due TABLE (
+                    user_id NVARCHAR(100) NOT NULL,
+                    source_task_id INT NOT NULL,
+                    PRIMARY KEY (user_id, source_task_id)
+                );
+                DECLARE @map TABLE (user_id NVARCHAR(100), source_task_id INT, task_id INT);
+
+                UPDATE TOP (?) r
+                SET last_created_date = ?
+                OUTPUT INSERTED.user_id, INSERTED.source_task_id INTO @due
+                FROM task_recurrences r
+                WHERE (r.last_created_date IS NULL OR r.last_created_date < ?)
+                AND (r.schedule = 'daily'
+                     OR (r.schedule = 'weekdays' AND ? < 5)
+                     OR (r.schedule = 'weekly' AND r.weekday = ?))
+                AND NOT EXISTS (
+                    SELECT 1 FROM tasks p
+                    WHERE p.task_id = r.last_task_id AND p.status = 'active' AND p.current_step_index = 0
+                );
+
+                -- MERGE instead of INSERT ... SELECT: only its OUTPUT can pair
+                -- a source column with the new identity, mapping copy -> source
+                MERGE tasks AS target
+                USING (
+                    SELECT t.task_id AS source_task_id, {_COPY_COLUMNS}
+                    FROM @due d
+                    JOIN tasks_all t ON t.task_id = d.source_task_id AND t.user_id = d.user_id
+                    WHERE t.steps_blob IS NOT NULL
+                    OR EXISTS (SELECT 1 FROM ({_SOURCE_STEPS}) x WHERE x.task_id = t.task_id)
+                ) AS source
+                ON 1 = 0
+                WHEN NOT MATCHED THEN
+                    INSERT (user_id, task_name, difficulty_level, current_step_index,
+                            steps_blob, steps_format, step_count, steps_done_mask)
+                    VALUES (source.user_id, source.task_name, source.difficulty_level, source.current_step_index,
+                            source.steps_blob, source.steps_format, source.step_count, source.steps_done_mask)
+                OUTPUT source.user_id, source.source_task_id, INSERTED.task_id
+                INTO @map (user_id, source_task_id, task_id);
+
+                INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes)
+                SELECT m.task_id, s.step_order, s.step_text, s.estimated_time_minutes
+                FROM @map m
+                JOIN ({_SOURCE_STEPS}) s ON s.task_id = m.source_task_id;
+
+                UPDATE r
+                SET last_task_id = m.task_id
+                FROM task_recurrences r
+                JOIN @map m ON m.user_id = r.user_id AND m.source_task_id = r.source_task_id;
+
+                -- One row per claimed recurrence; task_id is NULL if its source is gone
+                SELECT d.user_id, m.task_id
+                FROM @due d
+                LEFT JOIN @map m ON m.user_id = d.user_id AND m.source_task_id = d.source_task_id;
+                """,
+                (batch_size, today, today, today.weekday(), today.weekday())
+            )
+            rows = cursor.fetchall()
+            conn.commit()
+
+            for user_id, task_id in rows:
+                if task_id is not None:
+                    created += 1
+                    users.add(user_id)
+                    mark_write(task_id=task_id)
+
+            if len(rows) < batch_size:
+                break
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    for user_id in users:
+        stats_cache.invalidate(user_id, ["counts"])
+
+    logger.info(f"Created {created} recurring tasks on shard {shard}")
+    return created
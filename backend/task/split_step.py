@@ -0,0 +1,172 @@
+import azure.functions as func
+from database.db import get_db_connection, get_task_connection, mark_write
+from database.values import values_rows
+from shared.pipeline import ApiError
+from ai.task_breaker import generate_sub_steps
+from task.create_task import user_profile_from_body
+from task.step_store import decode_steps, encode_steps, step_at, MAX_PACKED_STEPS
+from task.task_events import publish_step_advanced
+
+
+def _load_step(cursor, task_id, step_number, lock: bool = False):
+    """(user_id, task_name, current_step_index, status, step_count, steps_blob, steps_format, step_text) or None"""
+    cursor.execute(
+        f"""
+        SELECT t.user_id, t.task_name, t.current_step_index, t.status,
+               t.step_count, t.steps_blob, t.steps_format, s.step_text
+        FROM tasks t {"WITH (UPDLOCK, HOLDLOCK)" if lock else ""}
+        LEFT JOIN task_steps s ON s.task_id = t.task_id AND s.step_order = ?
+        WHERE t.task_id = ?
+        """,
+        (step_number, task_id)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    row = list(row)
+    if row[5] is not None:
+        step = step_at(decode_steps(row[5], row[6]), step_number)
+        row[7] = step[1] if step else None
+    return row
+
+
+def handle_split_step(req: func.HttpRequest) -> dict:
+    """
+    Replace one not-yet-done step with 2-5 smaller LLM-generated steps.
+
+    Only the step text, task name and profile go to the LLM. The sub-steps
+    are spliced in place in one transaction: later steps shift down with a
+    set-based update (or the packed blob is rewritten).
+    """
+    try:
+        body = req.get_json()
+    except ValueError:
+        raise ApiError(400, "Invalid JSON body")
+
+    task_id = body.get("task_id")
+    step_number = body.get("step_number")
+
+    if not task_id:
+        raise ApiError(400, "task_id is required")
+
+    if not str(task_id).isdigit():
+        raise ApiError(400, "task_id must be a number")
+
+    if step_number is not None and not str(step_number).isdigit():
+        raise ApiError(400, "step_number must be a number")
+
+    # Read and generate outside the write transaction (the LLM call is slow)
+    conn, task_id = get_task_connection(task_id, read_only=True)
+    cursor = conn.cursor()
+    cursor.execute("SELECT current_step_index FROM tasks WHERE task_id = ?", (task_id,))
+    progress = cursor.fetchone()
+
+    if not progress:
+        conn.close()
+        raise ApiError(404, "Task not found")
+
+    # Default: the step the user is stuck on right now
+    step_number = int(step_number) if step_number is not None else progress[0] + 1
+    task = _load_step(cursor, task_id, step_number)
+    conn.close()
+
+    user_id, task_name, current_index, status, _, _, _, step_text = task
+
+    if status == "completed" or step_number <= current_index:
+        raise ApiError(409, "Only steps that are not done yet can be split")
+
+    if step_text is None:
+        raise ApiError(404, "Step not found")
+
+    try:
+        sub_steps = generate_sub_steps(task_name, step_text, user_profile_from_body(body, user_id)).sub_steps
+    except Exception as e:
+        raise ApiError(502, f"LLM generation failed: {str(e)}", code="llm_generation_failed")
+
+    sub_steps = sorted(sub_steps, key=lambda step: step.step_number)
+    extra = len(sub_steps) - 1
+
+    conn = get_db_connection(task_id=task_id)
+    cursor = conn.cursor()
+
+    try:
+        # Re-check under lock: the step may have been done or split meanwhile
+        task = _load_step(cursor, task_id, step_number, lock=True)
+
+        if not task or task[3] == "completed" or step_number <= task[2] or task[7] != step_text:
+            raise ApiError(409, "Task changed while splitting; please retry")
+
+        steps_blob, steps_format = task[5], task[6]
+
+        if steps_blob is not None:
+            steps = decode_steps(steps_blob, steps_format)
+            steps[step_number - 1:step_number] = [
+                (step.step_task, step.estimated_time_minutes) for step in sub_steps
+            ]
+
+            if len(steps) > MAX_PACKED_STEPS:
+                raise ApiError(409, "Task has too many steps to split further")
+
+            # Done bits all sit below step_number, so the bitmap is unchanged
+            cursor.execute(
+                "UPDATE tasks SET steps_blob = ?, step_count = ? WHERE task_id = ?",
+                (encode_steps(steps), len(steps), task_id)
+            )
+            total_steps = len(steps)
+
+        else:
+            params = [extra, task_id, step_number, task_id, step_number]
+            for offset, step in enumerate(sub_steps):
+                params.extend([task_id, step_number + offset, step.step_task, step.estimated_time_minutes])
+            params.extend([extra, task_id, task_id])
+
+            cursor.execute(
+                f"""
+                SET NOCOUNT ON;
+
+                UPDATE task_steps
+                SET step_order = step_order + ?
+                WHERE task_id = ? AND step_order > ?;
+
+                DELETE FROM task_steps WHERE task_id = ? AND step_order = ?;
+
+                INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes)
+                VALUES {values_rows(len(sub_steps), 4)};
+
+                UPDATE tasks SET step_count = step_count + ? WHERE task_id = ?;
+
+                SELECT COUNT(*) FROM task_steps WHERE task_id = ?;
+                """,
+                params
+            )
+            total_steps = cursor.fetchone()[0]
+
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    mark_write(task_id=task_id)
+
+    # Other devices showing this step move to the first sub-step
+    if step_number == current_index + 1:
+        first = sub_steps[0]
+        publish_step_advanced(task_id, step_number, first.step_task, first.estimated_time_minutes, total_steps)
+
+    return {
+        "task_id": int(task_id),
+        "total_steps": total_steps,
+        "sub_steps": [
+            {
+                "step_number": step_number + offset,
+                "step_text": step.step_task,
+                "estimated_time_minutes": step.estimated_time_minutes
+            }
+            for offset, step in enumerate(sub_steps)
+        ]
+    }
@@ -0,0 +1,134 @@
+import os
+import gzip
+import json
+import logging
+from database.db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# steps_format values stored on tasks / tasks_archive
+FORMAT_GZIP_JSON = 1
+
+# Progress bits live in a BIGINT (bit 0 = step 1); 2^63 would overflow it
+MAX_PACKED_STEPS = 62
+
+
+def storage_mode() -> str:
+    """STEP_STORAGE_MODE: "rows" (task_steps rows, default) or "packed"."""
+    return os.getenv("STEP_STORAGE_MODE", "rows").lower()
+
+
+def encode_steps(steps: list) -> bytes:
+    """
+    Pack [(step_text, estimated_time_minutes), ...] into one blob.
+
+    Format 1 is a JSON array of [text, minutes] pairs, UTF-16LE and gzipped,
+    which is exactly what SQL Server's DECOMPRESS + NVARCHAR cast reads, so
+    the task_steps_packed view can expand it for SQL-side readers.
+    """
+    raw = json.dumps([[text, minutes] for text, minutes in steps], ensure_ascii=False, separators=(",", ":"))
+    return gzip.compress(raw.encode("utf-16-le"), mtime=0)
+
+
+def decode_steps(blob: bytes, steps_format: int = FORMAT_GZIP_JSON) -> list:
+    """Unpack a steps blob into [(step_text, estimated_time_minutes), ...]."""
+    if steps_format != FORMAT_GZIP_JSON:
+        raise ValueError(f"Unknown steps_format: {steps_format}")
+    return [(text, minutes) for text, minutes in json.loads(gzip.decompress(blob).decode("utf-16-le"))]
+
+
+def done_bits(from_index: int, to_index: int) -> int:
+    """Mask bits for steps from_index+1 .. to_index (1-based step orders)."""
+    return (1 << to_index) - (1 << from_index)
+
+
+def step_at(steps: list, step_order: int):
+    """(step_order, step_text, estimated_time_minutes) or None, like the row query."""
+    if 1 <= step_order <= len(steps):
+        text, minutes = steps[step_order - 1]
+        return (step_order, text, minutes)
+    return None
+
+
+def pack_task_steps(shard: int = 0, batch_size: int = 500, max_batches: int = 20) -> int:
+    """
+    Migrate row-stored tasks on one shard to the packed format.
+
+    Each batch claims up to batch_size task rows, reads their steps,
+    writes the blob, counters and bitmap, and deletes the step rows, in one
+    transaction. Both the task rows and their steps are update-locked, so
+    a concurrent mark-done waits for the batch instead of advancing a task
+    whose steps are being rewritten. Tasks a request is writing right now
+    are skipped (READPAST) and packed by a later batch. Rows stay readable
+    the whole time, so this can run while live.
+
+    Returns:
+        Number of tasks packed
+    """
+    conn = get_db_connection(shard=shard)
+    cursor = conn.cursor()
+    packed = 0
+
+    try:
+        # A background job: if it ever deadlocks with a request, it yields
+        cursor.execute("SET DEADLOCK_PRIORITY LOW")
+
+        for _ in range(max_batches):
+            cursor.execute(
+                """
+                SET NOCOUNT ON;
+
+                DECLARE @batch TABLE (task_id INT PRIMARY KEY);
+
+                INSERT INTO @batch (task_id)
+                SELECT TOP (?) t.task_id
+                FROM tasks t WITH (UPDLOCK, ROWLOCK, READPAST)
+                WHERE t.steps_blob IS NULL
+                AND (SELECT COUNT(*) FROM task_steps x WHERE x.task_id = t.task_id) BETWEEN 1 AND ?
+                ORDER BY t.task_id;
+
+                SELECT s.task_id, s.step_order, s.step_text, s.estimated_time_minutes, s.is_done
+                FROM task_steps s WITH (UPDLOCK, HOLDLOCK)
+                JOIN @batch b ON b.task_id = s.task_id
+                ORDER BY s.task_id, s.step_order;
+                """,
+                (batch_size, MAX_PACKED_STEPS)
+            )
+
+            tasks = {}
+            for task_id, step_order, text, minutes, is_done in cursor.fetchall():
+                tasks.setdefault(task_id, []).append((step_order, text, minutes, is_done))
+
+            if not tasks:
+                break
+
+            updates = []
+            for task_id, rows in tasks.items():
+                mask = sum(1 << (step_order - 1) for step_order, _, _, is_done in rows if is_done)
+                blob = encode_steps([(text, minutes) for _, text, minutes, _ in rows])
+                updates.append((blob, FORMAT_GZIP_JSON, len(rows), mask, task_id))
+
+            cursor.executemany(
+                """
+                UPDATE tasks
+                SET steps_blob = ?, steps_format = ?, step_count = ?, steps_done_mask = ?
+                WHERE task_id = ?
+                """,
+                updates
+            )
+            cursor.execute(
+                f"DELETE FROM task_steps WHERE task_id IN ({', '.join('?' for _ in tasks)})",
+                list(tasks)
+            )
+            conn.commit()
+            packed += len(tasks)
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    logger.info(f"Packed steps of {packed} tasks on shard {shard}")
+    return packed
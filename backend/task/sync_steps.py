@@ -0,0 +1,274 @@
+from collections import Counter
+import azure.functions as func
+from database.db import get_db_connection, moved_task_ids, mark_write
+from database.values import values_rows
+from shared.pipeline import ApiError
+from user.rewards import record_task_completion
+from user.leaderboard import record_scores
+from user import stats_cache
+from task.task_events import publish_step_advanced, publish_task_completed
+from task.step_store import decode_steps, step_at
+from user.activity import EVENT_STEP_DONE, EVENT_TASK_COMPLETED
+
+# 2 parameters per event row, well under SQL Server's 2100 parameter limit
+MAX_BATCH_SIZE = 200
+
+
+def handle_sync_steps(req: func.HttpRequest) -> dict:
+    try:
+        body = req.get_json()
+    except ValueError:
+        raise ApiError(400, "Invalid JSON body")
+
+    user_id = body.get("user_id")
+    device_id = body.get("device_id") or "default"
+    events = body.get("events")
+
+    if not user_id or not isinstance(events, list):
+        raise ApiError(400, "user_id and events are required")
+
+    if len(events) > MAX_BATCH_SIZE:
+        raise ApiError(400, f"At most {MAX_BATCH_SIZE} events per sync")
+
+    # Order by client sequence and drop in-batch replays
+    batch = {}
+    try:
+        for event in events:
+            batch.setdefault(int(event["client_seq"]), int(event["task_id"]))
+    except (KeyError, TypeError, ValueError):
+        raise ApiError(400, "Each event needs integer task_id and client_seq")
+
+    seqs = sorted(batch)
+    task_ids = sorted(set(batch.values()))
+
+    if not seqs:
+        return {"applied": [], "skipped": [], "tasks": [], "new_badges": []}
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+
+    # Events queued offline may carry ids from before the user moved shards
+    moved = moved_task_ids(cursor, user_id, task_ids)
+    if moved:
+        batch = {seq: moved.get(task_id, task_id) for seq, task_id in batch.items()}
+        task_ids = sorted(set(batch.values()))
+
+    # Record the events we have not seen before. Replays, other users'
+    # tasks and steps past the end of a task (completed ones included)
+    # are filtered out in the same statement and reported as skipped.
+    # UPDLOCK: the remaining step count holds until the tasks advance below
+    params = [user_id, device_id]
+    for seq in seqs:
+        params.extend([seq, batch[seq]])
+    params.extend([user_id, user_id, device_id])
+
+    cursor.execute(
+        f"""
+        INSERT INTO sync_events (user_id, device_id, client_seq, task_id)
+        OUTPUT INSERTED.client_seq, INSERTED.task_id
+        SELECT ?, ?, e.client_seq, e.task_id
+        FROM (
+            SELECT v.client_seq, v.task_id,
+                   ROW_NUMBER() OVER (PARTITION BY v.task_id ORDER BY v.client_seq) AS position,
+                   c.total_steps - t.current_step_index AS remaining
+            FROM (VALUES {values_rows(len(seqs), 2)}) AS v(client_seq, task_id)
+            JOIN tasks t WITH (UPDLOCK) ON t.task_id = v.task_id
+            CROSS APPLY (
+                SELECT CASE
+                    WHEN t.step_count IS NOT NULL THEN t.step_count
+                    ELSE (SELECT COUNT(*) FROM task_steps WHERE task_id = t.task_id)
+                END AS total_steps
+            ) c
+            WHERE t.user_id = ? AND t.status = 'active'
+            AND NOT EXISTS (
+                SELECT 1 FROM sync_events WITH (UPDLOCK, HOLDLOCK)
+                WHERE user_id = ? AND device_id = ? AND client_seq = v.client_seq
+            )
+        ) AS e
+        WHERE e.position <= e.remaining
+        """,
+        params
+    )
+
+    accepted = cursor.fetchall()
+    applied = sorted(row[0] for row in accepted)
+    per_task = Counter(row[1] for row in accepted)
+
+    completed = []
+    stats = None
+
+    if per_task:
+        params = []
+        for task_id, count in per_task.items():
+            params.extend([task_id, count])
+        params.extend([user_id, user_id, user_id, EVENT_STEP_DONE, user_id])
+
+        # Advance every touched task by its number of new completions
+        # in one set-based batch
+        cursor.execute(
+            f"""
+            SET NOCOUNT ON;
+
+            DECLARE @batch TABLE (task_id INT PRIMARY KEY, n INT NOT NULL);
+            INSERT INTO @batch (task_id, n) VALUES {values_rows(len(per_task), 2)};
+
+            DECLARE @done TABLE (task_id INT, step_order INT);
+
+            UPDATE ts
+            SET is_done = 1
+            OUTPUT INSERTED.task_id, INSERTED.step_order INTO @done
+            FROM task_steps ts
+            JOIN tasks t ON t.task_id = ts.task_id
+            JOIN @batch b ON b.task_id = t.task_id
+            WHERE t.user_id = ? AND t.status = 'active'
+            AND ts.step_order > t.current_step_index
+            AND ts.step_order <= t.current_step_index + b.n;
+
+            -- Packed tasks have no step rows; their steps come from the blob
+            INSERT INTO @done (task_id, step_order)
+            SELECT t.task_id, CAST(j.[key] AS INT) + 1
+            FROM tasks t
+            JOIN @batch b ON b.task_id = t.task_id
+            CROSS APPLY OPENJSON(CAST(DECOMPRESS(t.steps_blob) AS NVARCHAR(MAX))) j
+            WHERE t.user_id = ? AND t.status = 'active' AND t.steps_blob IS NOT NULL
+            AND CAST(j.[key] AS INT) + 1 > t.current_step_index
+            AND CAST(j.[key] AS INT) + 1 <= t.current_step_index + b.n;
+
+            INSERT INTO activity_events (user_id, task_id, event_type, step_order)
+            SELECT ?, task_id, ?, step_order FROM @done;
+
+            UPDATE t
+            SET current_step_index = p.new_index,
+                status = CASE
+                    WHEN p.new_index >= c.total_steps THEN 'completed'
+                    ELSE t.status
+                END,
+                steps_done_mask = CASE
+                    WHEN t.steps_done_mask IS NULL THEN NULL
+                    ELSE t.steps_done_mask
+                         | (POWER(CAST(2 AS BIGINT), p.new_index) - POWER(CAST(2 AS BIGINT), t.current_step_index))
+                END
+            OUTPUT INSERTED.task_id, INSERTED.difficulty_level, INSERTED.status
+            FROM tasks t
+            JOIN @batch b ON b.task_id = t.task_id
+            CROSS APPLY (
+                SELECT CASE
+                    WHEN t.step_count IS NOT NULL THEN t.step_count
+                    ELSE (SELECT COUNT(*) FROM task_steps WHERE task_id = t.task_id)
+                END AS total_steps
+            ) c
+            CROSS APPLY (
+                SELECT CASE
+                    WHEN t.current_step_index + b.n >= c.total_steps THEN c.total_steps
+                    ELSE t.current_step_index + b.n
+                END AS new_index
+            ) p
+            WHERE t.user_id = ? AND t.status = 'active';
+            """,
+            params
+        )
+
+        completed = [row for row in cursor.fetchall() if row[2] == "completed"]
+
+        if completed:
+            cursor.execute(
+                f"""
+                INSERT INTO activity_events (user_id, task_id, event_type)
+                VALUES {values_rows(len(completed), 3)}
+                """,
+                [v for row in completed for v in (user_id, row[0], EVENT_TASK_COMPLETED)]
+            )
+
+            # Streak and rewards are applied once for the whole batch
+            stats = record_task_completion(
+                cursor,
+                user_id,
+                max(row[1] for row in completed),
+                tasks_completed=len(completed)
+            )
+
+    conn.commit()
+
+    for task_id in per_task:
+        mark_write(task_id=task_id)
+
+    if per_task:
+        stats_cache.invalidate(user_id)
+
+    if stats:
+        record_scores(user_id, stats)
+
+    # Resulting state of every task in the batch
+    cursor.execute(
+        f"""
+        SELECT t.task_id, t.task_name, t.status, t.current_step_index, c.total_steps,
+               ns.step_order, ns.step_text, ns.estimated_time_minutes,
+               t.steps_blob, t.steps_format
+        FROM tasks t
+        CROSS APPLY (
+            SELECT CASE
+                WHEN t.step_count IS NOT NULL THEN t.step_count
+                ELSE (SELECT COUNT(*) FROM task_steps WHERE task_id = t.task_id)
+            END AS total_steps
+        ) c
+        OUTER APPLY (
+            SELECT step_order, step_text, estimated_time_minutes
+            FROM task_steps
+            WHERE task_id = t.task_id AND step_order = t.current_step_index + 1
+        ) ns
+        WHERE t.user_id = ? AND t.task_id IN ({", ".join("?" for _ in task_ids)})
+        """,
+        [user_id, *task_ids]
+    )
+
+    tasks = []
+    for row in cursor.fetchall():
+        if row[8] is not None:
+            # Packed task: pick the next step out of the blob
+            row = tuple(row[:5]) + (step_at(decode_steps(row[8], row[9]), row[3] + 1) or (None, None, None))
+
+        task = {
+            "task_id": row[0],
+            "task_name": row[1],
+            "completed": row[2] == "completed",
+            "steps_done": row[3],
+            "total_steps": row[4],
+            "next_step": None
+        }
+        if row[5] is not None and row[2] != "completed":
+            task["next_step"] = {
+                "step_number": row[5],
+                "step_text": row[6],
+                "estimated_time_minutes": row[7]
+            }
+        tasks.append(task)
+
+    conn.close()
+
+    # Push the new position to the task's other devices/tabs
+    for task in tasks:
+        if task["task_id"] not in per_task:
+            continue
+        if task["completed"]:
+            publish_task_completed(task["task_id"])
+        elif task["next_step"]:
+            step = task["next_step"]
+            publish_step_advanced(
+                task["task_id"],
+                step["step_number"],
+                step["step_text"],
+                step["estimated_time_minutes"],
+                task["total_steps"]
+            )
+
+    applied_set = set(applied)
+    response = {
+        "applied": applied,
+        "skipped": [seq for seq in seqs if seq not in applied_set],
+        "tasks": tasks,
+        "reward_points": stats["reward_points"] if stats else None,
+        "streak": stats["streak"] if stats else None,
+        "new_badges": stats["new_badges"] if stats else []
+    }
+
+    return response
@@ -0,0 +1,99 @@
+import os
+import json
+import asyncio
+import azure.functions as func
+from database.db import resolve_task_id
+from shared.pipeline import ApiError
+from shared.pubsub import get_hub, publish
+
+EVENT_STEP_ADVANCED = "step_advanced"
+EVENT_TASK_COMPLETED = "task_completed"
+
+# How long one request waits for events before the client reconnects;
+# keep it under the front end's proxy idle timeout
+HOLD_SECONDS = float(os.getenv("SSE_HOLD_SECONDS", "25"))
+
+# Client reconnect delay after a response ends (EventSource "retry:")
+RETRY_MS = int(os.getenv("SSE_RETRY_MS", "500"))
+
+
+def task_channel(task_id) -> str:
+    return f"task:{int(task_id)}"
+
+
+def publish_step_advanced(task_id, step_number: int, step_text: str, estimated_time_minutes: int, total_steps: int = None):
+    publish(task_channel(task_id), EVENT_STEP_ADVANCED, {
+        "task_id": int(task_id),
+        "current_step_number": step_number,
+        "step_description": step_text,
+        "estimated_time_minutes": estimated_time_minutes,
+        "total_steps": total_steps
+    })
+
+
+def publish_task_completed(task_id):
+    publish(task_channel(task_id), EVENT_TASK_COMPLETED, {"task_id": int(task_id), "completed": True})
+
+
+def format_events(events: list, last_id: int) -> str:
+    """Render events in text/event-stream framing."""
+    lines = [f"retry: {RETRY_MS}", ""]
+
+    for event in events:
+        lines.append(f"id: {event['id']}")
+        lines.append(f"event: {event['type']}")
+        lines.append(f"data: {json.dumps(event['data'], separators=(',', ':'))}")
+        lines.append("")
+
+    if not events:
+        # Heartbeat; the id lets the next reconnect resume from here
+        lines.append(f"id: {last_id}")
+        lines.append(": heartbeat")
+        lines.append("")
+
+    return "\n".join(lines) + "\n"
+
+
+async def handle_task_events(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Step progress for one task as Server-Sent Events.
+
+    func.HttpResponse is buffered, so each request is a long poll that
+    holds until the first event (or HOLD_SECONDS) and ends; EventSource
+    reconnects after RETRY_MS with Last-Event-ID and picks up from there.
+    Without a Last-Event-ID the stream starts at the current position.
+
+    The hold is awaited on the event loop, so open streams don't occupy
+    the worker threads the synchronous routes run on. An id from before
+    the task's user moved shards is followed to the task's current one,
+    which is the channel its events are published on.
+    """
+    task_id = req.params.get("task_id")
+
+    if not task_id:
+        raise ApiError(400, "task_id is required")
+
+    if not str(task_id).isdigit():
+        raise ApiError(400, "task_id must be a number")
+
+    last_event_id = req.headers.get("Last-Event-ID") or req.params.get("last_event_id")
+
+    if last_event_id and not str(last_event_id).isdigit():
+        raise ApiError(400, "Last-Event-ID must be a number")
+
+    task_id = await asyncio.to_thread(resolve_task_id, task_id)
+
+    hub = get_hub()
+    after_id = int(last_event_id) if last_event_id else hub.latest_id()
+
+    events = await hub.wait_async(task_channel(task_id), after_id, HOLD_SECONDS)
+
+    return func.HttpResponse(
+        format_events(events, after_id),
+        status_code=200,
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -0,0 +1,68 @@
+import os
+import json
+import uuid
+import pytest
+
+# Tests that need SQL Server run against databases named by these variables
+# and are skipped without them:
+#   TEST_DB_CONNECTION_STRING       one database
+#   TEST_SHARD_CONNECTION_STRINGS   JSON list of two or more databases
+# The schema is created on them; rows use random user ids, so a shared
+# development database can be reused between runs.
+
+
+def _use_shards(monkeypatch, connection_strings: list):
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    monkeypatch.setenv("DB_SHARD_CONNECTION_STRINGS", json.dumps(connection_strings))
+    monkeypatch.delenv("DB_SHARD_RING_SIZE", raising=False)
+
+    from database.schema import create_tables
+    create_tables()
+    return connection_strings
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """A single test database with the schema created."""
+    connection_string = os.getenv("TEST_DB_CONNECTION_STRING")
+    if not connection_string:
+        pytest.skip("TEST_DB_CONNECTION_STRING not set")
+    return _use_shards(monkeypatch, [connection_string])[0]
+
+
+@pytest.fixture
+def shards(monkeypatch):
+    """Two or more test databases configured as shards, schema created."""
+    connection_strings = json.loads(os.getenv("TEST_SHARD_CONNECTION_STRINGS") or "[]")
+    if len(connection_strings) < 2:
+        pytest.skip("TEST_SHARD_CONNECTION_STRINGS needs two or more databases")
+    return _use_shards(monkeypatch, connection_strings)
+
+
+@pytest.fixture
+def user_id():
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+class RecordingCursor:
+    """Cursor double that records statements and replays queued rows."""
+
+    def __init__(self, rows=None):
+        self.statements = []
+        self.rows = list(rows or [])
+
+    def execute(self, sql, params=()):
+        self.statements.append((" ".join(sql.split()), list(params)))
+        return self
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+@pytest.fixture
+def recording_cursor():
+    return RecordingCursor
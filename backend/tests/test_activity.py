@@ -0,0 +1,112 @@
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from user import activity
+from user.activity import compact_activity, EVENT_STEP_DONE, EVENT_TASK_COMPLETED, RECENT_TASKS
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def compactor(monkeypatch, recording_cursor):
+    """compact_activity on a recording cursor; returns (cursor, connection) for queued rows."""
+    def setup(rows):
+        cursor = recording_cursor(rows)
+        conn = FakeConnection(cursor)
+        monkeypatch.setattr(activity, "get_db_connection", lambda shard: conn)
+        return cursor, conn
+    return setup
+
+
+def _statements(cursor, prefix):
+    return [(sql, params) for sql, params in cursor.statements if sql.startswith(prefix)]
+
+
+def test_nothing_to_compact(compactor):
+    cursor, conn = compactor([(100,), (None, 0)])
+
+    assert compact_activity() == 0
+    assert not _statements(cursor, "MERGE user_daily_activity")
+    assert not _statements(cursor, "UPDATE activity_rollup_state")
+    assert conn.closed
+
+
+def test_batch_rolls_up_and_advances_checkpoint(compactor):
+    cursor, conn = compactor([(100,), (130, 30)])
+
+    assert compact_activity(batch_size=50) == 30
+
+    # Only the batch after the checkpoint is aggregated
+    (_, merge_params), = _statements(cursor, "MERGE user_daily_activity")
+    assert merge_params == [EVENT_STEP_DONE, EVENT_TASK_COMPLETED, 100, 130]
+
+    # Completions land in the recent-tasks rollup, trimmed per user
+    (recent_sql, recent_params), = _statements(cursor, "INSERT INTO user_recent_tasks")
+    assert "rolled_up IS NULL" in recent_sql
+    assert "DELETE FROM ranked WHERE position > ?" in recent_sql
+    assert recent_params == [100, 130, EVENT_TASK_COMPLETED, 100, 130, EVENT_TASK_COMPLETED, RECENT_TASKS]
+
+    assert _statements(cursor, "UPDATE activity_rollup_state") == [
+        ("UPDATE activity_rollup_state SET last_event_id = ? WHERE id = 1", [130])
+    ]
+    assert conn.closed
+
+
+def test_full_batches_continue_up_to_the_limit(compactor):
+    cursor, _ = compactor([(0,), (10, 10), (10,), (20, 10), (20,), (30, 10)])
+
+    assert compact_activity(batch_size=10, max_batches=3) == 30
+    assert [p for _, p in _statements(cursor, "UPDATE activity_rollup_state")] == [[10], [20], [30]]
+
+
+def test_compaction_reads_from_rollups(database, user_id):
+    from database.db import get_db_connection
+    from user.activity import get_daily_activity, get_recent_tasks, get_streak
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+        DECLARE @task INT;
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Rolled up', 1, 1, 'completed');
+        SET @task = SCOPE_IDENTITY();
+
+        -- Completions at the start of yesterday and today, settled enough to compact
+        DECLARE @today DATETIME2 = CAST(CAST(SYSDATETIME() AS DATE) AS DATETIME2);
+        INSERT INTO activity_events (user_id, task_id, event_type, step_order, created_at) VALUES
+            (?, @task, 'step_done', 1, DATEADD(day, -1, @today)),
+            (?, @task, 'task_completed', NULL, DATEADD(day, -1, @today)),
+            (?, @task, 'task_completed', NULL, @today);
+        """,
+        (user_id,) * 5
+    )
+    conn.commit()
+
+    compact_activity()
+    # A second run finds nothing new for this user
+    compact_activity()
+
+    assert sum(day["tasks_completed"] for day in get_daily_activity(cursor, user_id)) == 2
+    assert get_streak(cursor, user_id)[0] == 2
+    recent = get_recent_tasks(cursor, user_id)
+    assert [task["task_name"] for task in recent] == ["Rolled up", "Rolled up"]
+    assert recent[0]["completed_at"] > recent[1]["completed_at"]
+    conn.close()
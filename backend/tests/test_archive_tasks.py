@@ -0,0 +1,115 @@
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from task import archive_tasks
+from task.archive_tasks import archive_completed_tasks
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def archiver(monkeypatch, recording_cursor):
+    """archive_completed_tasks on a recording cursor fed the given rows."""
+    def setup(rows):
+        cursor = recording_cursor(rows)
+        monkeypatch.setattr(archive_tasks, "get_db_connection", lambda shard: FakeConnection(cursor))
+        return cursor
+    return setup
+
+
+def _batches(cursor):
+    return [params for sql, params in cursor.statements if "INSERT INTO tasks_archive" in sql]
+
+
+def _checkpoints(cursor):
+    return [params[0] for sql, params in cursor.statements if sql.startswith("UPDATE archive_state")]
+
+
+def test_batches_resume_from_the_checkpoint(archiver):
+    # Checkpoint at 40, two full batches, then a short one that ends the sweep
+    cursor = archiver([(40,), (10, 60), (60,), (10, 95), (95,), (3, 120)])
+
+    assert archive_completed_tasks(max_age_days=30, batch_size=10) == 23
+
+    assert _batches(cursor) == [[10, 40, 30], [10, 60, 30], [10, 95, 30]]
+    # Full batches move the checkpoint, the end of the sweep resets it
+    assert _checkpoints(cursor) == [60, 95, 0]
+
+
+def test_interrupted_run_keeps_its_checkpoint(archiver):
+    cursor = archiver([(0,), (5, 17), (17,), (5, 30)])
+
+    assert archive_completed_tasks(batch_size=5, max_batches=2) == 10
+    assert _batches(cursor) == [[5, 0, 30], [5, 17, 30]]
+    # Stopped at max_batches mid-sweep: the next run starts after task 30
+    assert _checkpoints(cursor) == [17, 30]
+
+
+def test_age_from_environment(archiver, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_AFTER_DAYS", "7")
+    cursor = archiver([(0,), (0, None)])
+
+    assert archive_completed_tasks() == 0
+    assert _batches(cursor) == [[500, 0, 7]]
+    assert _checkpoints(cursor) == [0]
+
+
+def test_archived_tasks_stay_readable(database, user_id):
+    from database.db import get_db_connection
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+
+        DECLARE @done INT, @active INT;
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Done', 2, 2, 'completed');
+        SET @done = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@done, 1, 'First', 5, 1), (@done, 2, 'Second', 10, 1);
+
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Active', 1, 0, 'active');
+        SET @active = SCOPE_IDENTITY();
+
+        SELECT @done, @active;
+        """,
+        (user_id, user_id, user_id)
+    )
+    done, active = cursor.fetchone()
+    conn.commit()
+
+    # Negative age: tasks created today are old enough
+    while archive_completed_tasks(max_age_days=-1, batch_size=50) == 50:
+        pass
+
+    cursor.execute("SELECT COUNT(*) FROM tasks WHERE task_id = ?", (done,))
+    assert cursor.fetchone()[0] == 0
+    cursor.execute("SELECT COUNT(*) FROM tasks_archive WHERE task_id = ?", (done,))
+    assert cursor.fetchone()[0] == 1
+
+    cursor.execute("SELECT task_id, status FROM tasks_all WHERE user_id = ? ORDER BY task_id", (user_id,))
+    assert [tuple(row) for row in cursor.fetchall()] == [(done, "completed"), (active, "active")]
+    cursor.execute(
+        "SELECT step_order, step_text, is_done FROM task_steps_all WHERE task_id = ? ORDER BY step_order",
+        (done,)
+    )
+    assert [tuple(row) for row in cursor.fetchall()] == [(1, "First", True), (2, "Second", True)]
+    conn.close()
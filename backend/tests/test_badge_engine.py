@@ -0,0 +1,43 @@
+from user.badges import BADGES
+from user.badge_engine import evaluate_badges, backfill_badges, BADGE_RULES
+
+
+def test_evaluate_badges():
+    assert evaluate_badges({}) == []
+    assert evaluate_badges({"tasks_completed": 1, "streak": 0, "difficulty_level": 2}) == ["first_task"]
+    assert sorted(evaluate_badges({"tasks_completed": 10, "streak": 7, "difficulty_level": 4})) == sorted(
+        b["code"] for b in BADGES
+    )
+    # Thresholds are inclusive and metrics independent
+    assert sorted(evaluate_badges({"tasks_completed": 9, "streak": 3, "difficulty_level": 5})) == [
+        "first_task", "hard_worker", "streak_3"
+    ]
+    # Missing or NULL counters count as zero
+    assert evaluate_badges({"tasks_completed": None, "streak": 3}) == ["streak_3"]
+
+
+def test_backfill_badges(recording_cursor):
+    cursor = recording_cursor()
+    cursor.rowcount = 2
+
+    inserted = backfill_badges(cursor)
+
+    rules = [(minimum, code) for rules in BADGE_RULES.values() for minimum, code in rules]
+    assert inserted == 2 * len(rules)
+
+    # The counter is resynced first, from the archive-inclusive view
+    resync, _ = cursor.statements[0]
+    assert resync.startswith("UPDATE s SET tasks_completed = c.value FROM user_stats s")
+    assert "FROM tasks_all" in resync
+
+    # Then one set-based insert per badge rule
+    inserts = cursor.statements[1:]
+    assert [params for _, params in inserts] == [[code, minimum, code] for minimum, code in rules]
+    assert all(sql.startswith("INSERT INTO user_badges") and "NOT EXISTS" in sql for sql, _ in inserts)
+
+
+def test_backfill_counts_no_rowcount_as_zero(recording_cursor):
+    cursor = recording_cursor()
+    cursor.rowcount = -1
+
+    assert backfill_badges(cursor) == 0
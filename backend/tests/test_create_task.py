@@ -0,0 +1,47 @@
+import threading
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from concurrent.futures import ThreadPoolExecutor
+from task import create_task
+
+
+@pytest.fixture
+def blocked_llm(monkeypatch):
+    """One LLM worker, two slots, and an LLM call that blocks until released."""
+    release = threading.Event()
+
+    def generate(task_description, user_profile):
+        release.wait(5)
+        return task_description
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(create_task, "generate_neuro_task_breakdown", generate)
+    monkeypatch.setattr(create_task, "_llm_executor", executor)
+    monkeypatch.setattr(create_task, "_llm_slots", threading.BoundedSemaphore(2))
+    yield release
+    release.set()
+    executor.shutdown(wait=True)
+
+
+def test_in_flight_calls_are_capped(blocked_llm):
+    running = create_task._submit_breakdown("a", None)
+    queued = create_task._submit_breakdown("b", None)
+
+    assert running is not None and queued is not None
+    assert create_task._submit_breakdown("c", None) is None
+
+    blocked_llm.set()
+    assert running.result(5) == "a"
+    assert queued.result(5) == "b"
+    # Slots come back once calls finish
+    assert create_task._submit_breakdown("d", None).result(5) == "d"
+
+
+def test_cancelled_call_frees_its_slot(blocked_llm):
+    create_task._submit_breakdown("a", None)
+    queued = create_task._submit_breakdown("b", None)
+
+    assert queued.cancel()
+    assert create_task._submit_breakdown("c", None) is not None
@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from database import db, metrics
+from database.db import get_db_connection, mark_write, MAX_REPLICA_LAG_SECONDS, READ_YOUR_WRITES_SECONDS
+
+
+class LagConnection:
+    """Connection that answers the replica lag query."""
+
+    def __init__(self, connection_string, lag):
+        self.connection_string = connection_string
+        self.lag = lag
+        self.closed = False
+        self.row = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        if isinstance(self.lag, Exception):
+            raise self.lag
+        self.row = (self.lag,)
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    """One shard with a replica whose lag each test sets; returns the opened connections."""
+    opened = []
+    state = {"lag": 0.5}
+
+    def connect(connection_string):
+        opened.append(LagConnection(connection_string, state["lag"]))
+        return opened[-1]
+
+    monkeypatch.setenv("DB_SHARD_CONNECTION_STRINGS", '["primary"]')
+    monkeypatch.setenv("DB_READ_CONNECTION_STRINGS", '["replica"]')
+    monkeypatch.setattr(db, "_connect", connect)
+    monkeypatch.setattr(db, "_last_writes", {})
+    monkeypatch.setattr(db, "_replica_lag", {})
+
+    def route(lag=0.5, **kwargs):
+        state["lag"] = lag
+        db._replica_lag.clear()
+        conn = get_db_connection(**kwargs)
+        return conn.connection_string
+    route.opened = opened
+    return route
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(db.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_writes_go_to_the_primary(routing):
+    assert routing(user_id="u1") == "primary"
+
+
+def test_reads_go_to_the_replica(routing):
+    assert routing(user_id="u1", read_only=True) == "replica"
+    assert routing(task_id=7, read_only=True) == "replica"
+
+
+def test_reads_after_a_write_stay_on_the_primary(routing, clock):
+    mark_write(user_id="u1", task_id=7)
+
+    assert routing(user_id="u1", read_only=True) == "primary"
+    assert routing(task_id=7, read_only=True) == "primary"
+    # Only the written user and task are pinned
+    assert routing(user_id="u2", read_only=True) == "replica"
+
+    clock[0] += READ_YOUR_WRITES_SECONDS + 1
+    assert routing(user_id="u1", read_only=True) == "replica"
+
+
+def test_write_connections_set_the_watermark(routing):
+    routing(task_id=7)
+    assert routing(task_id=7, read_only=True) == "primary"
+
+
+def test_lagging_replica_is_skipped(routing):
+    assert routing(lag=MAX_REPLICA_LAG_SECONDS + 1, user_id="u1", read_only=True) == "primary"
+    # The replica connection opened for the check is closed again
+    assert [c.closed for c in routing.opened] == [True, False]
+
+
+@pytest.mark.parametrize("lag", [None, Exception("DMV not available")])
+def test_unknown_lag_counts_as_too_far_behind(routing, lag):
+    assert routing(lag=lag, user_id="u1", read_only=True) == "primary"
+    assert metrics.snapshot()["gauges"]["db.replica_lag_seconds.shard_0"] == -1
+
+
+def test_lag_is_sampled_periodically(routing, clock):
+    assert routing(user_id="u1", read_only=True) == "replica"
+
+    # Within the sample interval the last measurement stands
+    db._replica_lag[0] = (clock[0], MAX_REPLICA_LAG_SECONDS + 1)
+    assert get_db_connection(user_id="u1", read_only=True).connection_string == "primary"
+
+    clock[0] += db.LAG_SAMPLE_SECONDS + 1
+    assert get_db_connection(user_id="u1", read_only=True).connection_string == "replica"
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+import pytest
+
+from ai import generation_budget
+from ai.generation_budget import budget_for, record_output, BASE_BUDGETS, MAX_TOKENS, MIN_TOKENS, MIN_SAMPLES, WINDOW
+
+
+@pytest.fixture(autouse=True)
+def observed(monkeypatch):
+    monkeypatch.setattr(generation_budget, "_observed", {})
+    return generation_budget._observed
+
+
+def test_base_budget_until_enough_samples():
+    for _ in range(MIN_SAMPLES - 1):
+        record_output("micro", 100)
+    assert budget_for("micro") == BASE_BUDGETS["micro"]
+    assert budget_for("unknown") == MAX_TOKENS
+
+
+def test_budget_is_high_percentile_plus_headroom():
+    for tokens in range(1, 101):
+        record_output("normal", tokens * 10)
+
+    # 99th of 100 samples is 990, plus 20%
+    assert budget_for("normal") == 1188
+
+
+def test_budget_is_clamped():
+    for _ in range(MIN_SAMPLES):
+        record_output("macro", 10)
+    assert budget_for("macro") == MIN_TOKENS
+
+    for _ in range(MIN_SAMPLES):
+        record_output("micro", MAX_TOKENS)
+    assert budget_for("micro") == MAX_TOKENS
+
+
+def test_truncated_outputs_count_as_the_ceiling(observed):
+    record_output("normal", 500, truncated=True)
+    record_output("normal", None)
+
+    assert list(observed["normal"]) == [MAX_TOKENS]
+
+
+def test_only_the_latest_window_is_kept(observed):
+    for tokens in range(WINDOW + 10):
+        record_output("normal", tokens)
+
+    assert len(observed["normal"]) == WINDOW
+    assert observed["normal"][0] == 10
+
+
+class FakeLLM:
+    """Returns the given finish_reasons in order, recording max_tokens."""
+
+    def __init__(self, *finish_reasons):
+        self.finish_reasons = list(finish_reasons)
+        self.max_tokens = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, max_tokens, **kwargs):
+        self.max_tokens.append(max_tokens)
+        content = '{"task_name": "Report", "difficulty_level": 2, "breakdown": [{"step_number": 1, "step_task": "Open the file", "estimated_time_minutes": 5}]}'
+        return SimpleNamespace(
+            choices=[SimpleNamespace(finish_reason=self.finish_reasons.pop(0), message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=50, completion_tokens=max_tokens)
+        )
+
+
+@pytest.fixture
+def task_breaker(monkeypatch):
+    # task_breaker imports the usage ledger, which writes to the database
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    from ai import task_breaker
+
+    usage = []
+    monkeypatch.setattr(task_breaker, "record_usage", usage.append)
+    return task_breaker, usage
+
+
+def test_truncated_breakdown_is_retried_at_the_ceiling(task_breaker, monkeypatch):
+    task_breaker, usage = task_breaker
+    llm = FakeLLM("length", "stop")
+    monkeypatch.setattr(task_breaker, "get_llm", lambda: llm)
+
+    breakdown = task_breaker.generate_neuro_task_breakdown("write the report")
+
+    assert breakdown.task_name == "Report"
+    assert llm.max_tokens == [BASE_BUDGETS["normal"], MAX_TOKENS]
+    assert [entry["finish_reason"] for entry in usage] == ["length", "stop"]
+
+
+def test_no_retry_when_the_output_fits(task_breaker, monkeypatch):
+    task_breaker, usage = task_breaker
+    llm = FakeLLM("stop")
+    monkeypatch.setattr(task_breaker, "get_llm", lambda: llm)
+
+    task_breaker.generate_neuro_task_breakdown("write the report")
+
+    assert llm.max_tokens == [BASE_BUDGETS["normal"]]
@@ -0,0 +1,157 @@
+import gzip
+import json
+import hashlib
+import pytest
+import azure.functions as func
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from task import get_full_task
+from task.get_full_task import handle_get_full_task
+from task.step_store import encode_steps, FORMAT_GZIP_JSON
+from shared.pipeline import ApiError, dumps_json
+
+# (task_name, status, current_step_index, difficulty_level, step_order, step_text, minutes, is_done)
+ROWS = [
+    ("Write report", "active", 1, 2, 1, "Open the document", 2, True),
+    ("Write report", "active", 1, 2, 2, "Write the intro", 10, False),
+]
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def task_rows(monkeypatch, recording_cursor):
+    """Serve the task query from the given rows."""
+    def serve(rows):
+        monkeypatch.setattr(
+            get_full_task, "get_task_connection",
+            lambda task_id, read_only: (FakeConnection(recording_cursor(list(rows))), int(task_id))
+        )
+    return serve
+
+
+def _request(task_id=7, **headers):
+    return func.HttpRequest(method="GET", url="/api/task/full", params={"task_id": str(task_id)},
+                            headers=headers, body=b"")
+
+
+def test_column_oriented_body_and_etag(task_rows):
+    task_rows(ROWS)
+    response = handle_get_full_task(_request())
+
+    body = json.loads(response.get_body())
+    assert body == {
+        "task_id": 7,
+        "task_name": "Write report",
+        "status": "active",
+        "current_step_index": 1,
+        "difficulty_level": 2,
+        "steps": {
+            "number": [1, 2],
+            "text": ["Open the document", "Write the intro"],
+            "minutes": [2, 10],
+            "done": [1, 0]
+        }
+    }
+    # A hash of the uncompressed body, so every encoding shares it
+    assert response.headers["ETag"] == '"' + hashlib.sha1(dumps_json(body)).hexdigest()[:20] + '"'
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_etag_follows_the_content(task_rows):
+    task_rows(ROWS)
+    etag = handle_get_full_task(_request()).headers["ETag"]
+    assert handle_get_full_task(_request()).headers["ETag"] == etag
+
+    task_rows(ROWS[:1] + [ROWS[1][:7] + (True,)])
+    assert handle_get_full_task(_request()).headers["ETag"] != etag
+
+
+def test_if_none_match(task_rows):
+    task_rows(ROWS)
+    etag = handle_get_full_task(_request()).headers["ETag"]
+
+    task_rows(ROWS)
+    unchanged = handle_get_full_task(_request(**{"If-None-Match": etag}))
+    assert unchanged.status_code == 304
+    assert unchanged.get_body() == b""
+    assert unchanged.headers["ETag"] == etag
+
+    task_rows(ROWS)
+    stale = handle_get_full_task(_request(**{"If-None-Match": '"stale"', "Accept-Encoding": "gzip"}))
+    assert stale.status_code == 200
+    assert stale.headers["ETag"] == etag
+    if stale.headers.get("Content-Encoding") == "gzip":
+        assert json.loads(gzip.decompress(stale.get_body()))["task_id"] == 7
+
+
+def test_task_without_steps(task_rows):
+    task_rows([("Empty", "active", 0, 1, None, None, None, None)])
+    body = json.loads(handle_get_full_task(_request()).get_body())
+    assert body["steps"] == {"number": [], "text": [], "minutes": [], "done": []}
+
+
+def test_not_found(task_rows):
+    task_rows([])
+    with pytest.raises(ApiError) as e:
+        handle_get_full_task(_request())
+    assert e.value.status_code == 404
+
+
+def test_hot_packed_and_archived_tasks(database, user_id):
+    from database.db import get_db_connection
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+
+        DECLARE @hot INT, @packed INT, @archived INT;
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Hot', 2, 1, 'active');
+        SET @hot = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@hot, 1, 'First', 5, 1), (@hot, 2, 'Second', 10, 0);
+
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status,
+                           steps_blob, steps_format, step_count, steps_done_mask)
+        VALUES (?, 'Packed', 1, 1, 'active', ?, ?, 2, 1);
+        SET @packed = SCOPE_IDENTITY();
+
+        -- Moved to the cold tier the way the archive job does it
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Archived', 3, 1, 'completed');
+        SET @archived = SCOPE_IDENTITY();
+        INSERT INTO tasks_archive (task_id, user_id, task_name, difficulty_level, current_step_index, status, created_at)
+        SELECT task_id, user_id, task_name, difficulty_level, current_step_index, status, created_at
+        FROM tasks WHERE task_id = @archived;
+        INSERT INTO task_steps_archive (step_id, task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (1, @archived, 1, 'Cold', 5, 1);
+        DELETE FROM tasks WHERE task_id = @archived;
+
+        SELECT @hot, @packed, @archived;
+        """,
+        (user_id, user_id, user_id, encode_steps([("Open", 2), ("Close", 3)]), FORMAT_GZIP_JSON, user_id)
+    )
+    hot, packed, archived = cursor.fetchone()
+    conn.commit()
+    conn.close()
+
+    def steps(task_id):
+        return json.loads(handle_get_full_task(_request(task_id)).get_body())["steps"]
+
+    assert steps(hot) == {"number": [1, 2], "text": ["First", "Second"], "minutes": [5, 10], "done": [1, 0]}
+    assert steps(packed) == {"number": [1, 2], "text": ["Open", "Close"], "minutes": [2, 3], "done": [1, 0]}
+    assert steps(archived) == {"number": [1], "text": ["Cold"], "minutes": [5], "done": [1]}
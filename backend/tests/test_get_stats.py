@@ -0,0 +1,65 @@
+import pytest
+import azure.functions as func
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from user import get_stats, stats_cache
+from user.get_stats import handle_get_user_stats, motivational_message, SECTIONS
+
+
+class FakeConnection:
+    def cursor(self):
+        return None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sections(monkeypatch):
+    """Stats sections served from fixed values instead of the database."""
+    values = {
+        "counts": {"total_tasks_completed": 4, "total_tasks_active": 1},
+        "steps": {"total_steps_completed": 20},
+        # A counter that lags the real count, as on rows it was never filled for
+        "streak": {"reward_points": 40, "streak": 1, "last_completed_date": None,
+                   "motivational_message": motivational_message(1, 0)},
+        "recent_tasks": {"recent_tasks": []},
+        "badges": {"badges": []},
+        "activity": {"activity": []}
+    }
+    for name, (_, ttl, fields) in list(SECTIONS.items()):
+        monkeypatch.setitem(SECTIONS, name, (lambda cursor, user_id, v=values[name]: dict(v), ttl, fields))
+    monkeypatch.setattr(stats_cache, "get", lambda user_id, section, ttl, loader: loader())
+    monkeypatch.setattr(get_stats, "get_db_connection", lambda **kwargs: FakeConnection())
+    return values
+
+
+def _request(**params):
+    return func.HttpRequest(method="GET", url="/api/user/stats", params=params, body=b"")
+
+
+def test_messages():
+    assert motivational_message(7, 0).startswith("🔥")
+    assert motivational_message(3, 0).startswith("🌟")
+    assert motivational_message(0, 2).startswith("👏")
+    assert motivational_message(0, 0) == "Let's get started with your first win!"
+
+
+def test_full_stats_use_the_loaded_count(sections):
+    response = handle_get_user_stats(_request(user_id="u1"))
+
+    assert response["total_tasks_completed"] == 4
+    assert response["motivational_message"] == motivational_message(1, 4)
+
+
+def test_header_uses_the_counter(sections):
+    response = handle_get_user_stats(_request(user_id="u1", fields="header"))
+
+    assert set(response) == {"user_id", "streak", "reward_points", "motivational_message"}
+    assert response["motivational_message"] == motivational_message(1, 0)
+
+
+def test_unknown_field(sections):
+    with pytest.raises(get_stats.ApiError):
+        handle_get_user_stats(_request(user_id="u1", fields="nope"))
@@ -0,0 +1,124 @@
+import time
+import random
+import threading
+from collections import deque
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from user import leaderboard
+from user.leaderboard import SortedBoard, record_scores, get_boards
+
+
+def test_ranks_share_ties():
+    board = SortedBoard({"a": 50, "b": 30, "c": 30, "d": 10})
+
+    assert board.top(10) == [
+        {"rank": 1, "score": 50},
+        {"rank": 2, "score": 30},
+        {"rank": 2, "score": 30},
+        {"rank": 4, "score": 10}
+    ]
+    assert len(board) == 4
+
+
+def test_update_moves_and_removes():
+    board = SortedBoard({"a": 50, "b": 30})
+
+    board.update("b", 70)
+    board.update("c", 40)
+    board.update("a", 0)
+
+    assert board.scores == {"b": 70, "c": 40}
+    assert [e["score"] for e in board.top(10)] == [70, 40]
+    assert board.rank_of_score(40) == 2
+
+
+def test_around_flags_the_caller_only():
+    board = SortedBoard({f"u{n}": n for n in range(1, 11)})
+
+    me, neighbours = board.around("u5", 2)
+
+    assert me == {"rank": 6, "score": 5}
+    assert [e["score"] for e in neighbours] == [7, 6, 5, 4, 3]
+    assert [e for e in neighbours if e.get("me")] == [{"rank": 6, "score": 5, "me": True}]
+    assert board.around("nobody", 2) == (None, [])
+
+
+def test_entries_never_expose_user_ids():
+    board = SortedBoard({"user-secret": 5})
+
+    assert "user-secret" not in repr(board.top(5))
+    assert "user-secret" not in repr(board.around("user-secret", 3))
+
+
+def test_reads_during_updates_stay_sorted():
+    board = SortedBoard({f"u{n}": n for n in range(1, 2001)})
+    stop = threading.Event()
+    errors = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            board.update(f"u{rng.randrange(2000)}", rng.randrange(5000))
+
+    def reader():
+        try:
+            for _ in range(2000):
+                scores = [e["score"] for e in board.top(50)]
+                assert scores == sorted(scores, reverse=True)
+                me, neighbours = board.around("u1", 3)
+                assert me is None or any(e.get("me") for e in neighbours)
+        except AssertionError as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=writer, args=(n,)) for n in range(2)]
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    stop.set()
+    for thread in writers:
+        thread.join()
+
+    assert errors == []
+    assert len(board) == len(board.scores)
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    """Reloads serve the given snapshot scores, built at the given time."""
+    loaded = {"scores": {}, "built_at": 0}
+
+    def load():
+        return {
+            board: SortedBoard({u: s[board] for u, s in loaded["scores"].items() if board in s})
+            for board in leaderboard.BOARDS
+        }, loaded["built_at"]
+
+    monkeypatch.setattr(leaderboard, "_load_boards", load)
+    monkeypatch.setattr(leaderboard, "_boards", None)
+    monkeypatch.setattr(leaderboard, "_recent", deque())
+    return loaded
+
+
+def test_reload_keeps_local_updates_newer_than_the_snapshot(snapshot):
+    snapshot["scores"] = {"a": {"reward_points": 10}, "b": {"reward_points": 20}}
+    get_boards()
+
+    record_scores("a", {"reward_points": 30, "streak": None})
+    assert get_boards()["reward_points"].scores == {"a": 30, "b": 20}
+
+    # A snapshot built before the update doesn't undo it
+    snapshot["built_at"] = time.time() - 60
+    leaderboard._reload()
+    assert get_boards()["reward_points"].scores == {"a": 30, "b": 20}
+
+    # Once a snapshot built after it is loaded, the update is dropped and
+    # the snapshot's (possibly newer, from another worker) score wins
+    snapshot["scores"]["a"] = {"reward_points": 45}
+    snapshot["built_at"] = time.time() + 1
+    leaderboard._reload()
+    assert get_boards()["reward_points"].scores == {"a": 45, "b": 20}
+    assert len(leaderboard._recent) == 0
@@ -0,0 +1,45 @@
+from datetime import datetime
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+import azure.functions as func
+from shared.pipeline import ApiError
+from task.list_tasks import encode_cursor, decode_cursor, handle_list_tasks
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 9, 30, 15, 123000)
+    value = encode_cursor(created_at, 42)
+
+    assert "=" not in value
+    assert decode_cursor(value) == (created_at, 42)
+
+
+def test_cursor_is_url_safe():
+    value = encode_cursor(datetime(2026, 3, 1), 2 ** 30)
+    assert all(c.isalnum() or c in "-_" for c in value)
+
+
+@pytest.mark.parametrize("value", ["", "not-a-cursor", encode_cursor(datetime(2026, 1, 1), 1)[:-4] + "!!!!"])
+def test_malformed_cursor(value):
+    with pytest.raises(ValueError):
+        decode_cursor(value)
+
+
+def _request(**params):
+    return func.HttpRequest(method="GET", url="/api/task/list", params=params, body=b"")
+
+
+@pytest.mark.parametrize("params, message", [
+    ({}, "user_id is required"),
+    ({"user_id": "u1", "status": "paused"}, "status must be 'active' or 'completed'"),
+    ({"user_id": "u1", "limit": "ten"}, "limit must be a number"),
+    ({"user_id": "u1", "cursor": "garbage"}, "Invalid cursor")
+])
+def test_rejects_bad_params_before_querying(params, message):
+    with pytest.raises(ApiError) as error:
+        handle_list_tasks(_request(**params))
+
+    assert error.value.status_code == 400
+    assert error.value.message == message
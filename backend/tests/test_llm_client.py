@@ -0,0 +1,36 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from ai import llm_client
+from ai.llm_client import get_llm
+from ai.llm_simulator import ReplayLLM
+
+
+@pytest.fixture
+def replay(monkeypatch, tmp_path):
+    """The replay backend on an empty cassette, with no client built yet."""
+    cassette = tmp_path / "cassette.json"
+    cassette.write_text(json.dumps({"interactions": []}))
+    monkeypatch.setenv("LLM_BACKEND", "replay")
+    monkeypatch.setenv("LLM_CASSETTE", str(cassette))
+    monkeypatch.setattr(llm_client, "_client", None)
+
+    built = []
+    build = llm_client._build_llm
+
+    def counting_build():
+        built.append(build())
+        return built[-1]
+
+    monkeypatch.setattr(llm_client, "_build_llm", counting_build)
+    return built
+
+
+def test_get_llm_returns_one_shared_client(replay):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: get_llm(), range(32)))
+
+    assert len(replay) == 1
+    assert isinstance(replay[0], ReplayLLM)
+    assert all(client is replay[0] for client in clients)
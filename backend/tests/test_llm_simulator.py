@@ -0,0 +1,111 @@
+import json
+import pytest
+from ai.llm_simulator import (
+    LLMBackend, ReplayLLM, SimulatedAPIError, SimulatedTimeout, request_key, parse_fault_rates, CHARS_PER_TOKEN
+)
+
+MODEL = "llama-3.3-70b-versatile"
+MESSAGES = [{"role": "user", "content": "Break down: clean the kitchen"}]
+CONTENT = json.dumps({
+    "task_name": "Clean the kitchen",
+    "difficulty_level": 2,
+    "breakdown": [
+        {"step_number": 1, "step_task": "Clear the counter", "estimated_time_minutes": 5},
+        {"step_number": 2, "step_task": "Wash the dishes", "estimated_time_minutes": 15}
+    ]
+})
+
+
+@pytest.fixture
+def cassette(tmp_path):
+    path = tmp_path / "cassette.json"
+    path.write_text(json.dumps({"interactions": [{
+        "key": request_key(MODEL, MESSAGES),
+        "request": {"model": MODEL, "messages": MESSAGES},
+        "response": {"content": CONTENT, "finish_reason": "stop", "prompt_tokens": 120, "completion_tokens": 60}
+    }]}))
+    return str(path)
+
+
+def test_backend_must_implement_create():
+    with pytest.raises(TypeError):
+        LLMBackend()
+
+
+def test_replays_recorded_completion(cassette):
+    llm = ReplayLLM(cassette, speed=0)
+
+    response = llm.chat.completions.create(model=MODEL, messages=MESSAGES, max_tokens=800)
+
+    assert response.choices[0].message.content == CONTENT
+    assert response.choices[0].finish_reason == "stop"
+    assert response.usage.total_tokens == 180
+
+
+def test_max_tokens_truncates(cassette):
+    response = ReplayLLM(cassette, speed=0).create(MODEL, MESSAGES, max_tokens=10)
+
+    assert response.choices[0].finish_reason == "length"
+    assert response.usage.completion_tokens == 10
+    assert len(response.choices[0].message.content) == 10 * CHARS_PER_TOKEN
+
+
+def test_stream_reassembles(cassette):
+    chunks = list(ReplayLLM(cassette, speed=0).create(MODEL, MESSAGES, stream=True))
+
+    assert "".join(c.choices[0].delta.content for c in chunks) == CONTENT
+    assert chunks[-1].choices[0].finish_reason == "stop"
+
+
+def test_unknown_request(cassette):
+    other = [{"role": "user", "content": "something else"}]
+
+    assert ReplayLLM(cassette, speed=0).create(MODEL, other).choices[0].message.content == CONTENT
+    with pytest.raises(SimulatedAPIError):
+        ReplayLLM(cassette, speed=0, strict=True).create(MODEL, other)
+
+
+def test_forced_faults(cassette):
+    llm = ReplayLLM(cassette, speed=0)
+    llm.inject_fault("rate_limit")
+    llm.inject_fault("timeout")
+    llm.inject_fault("malformed")
+
+    with pytest.raises(SimulatedAPIError) as e:
+        llm.create(MODEL, MESSAGES)
+    assert e.value.status_code == 429
+    with pytest.raises(SimulatedTimeout):
+        llm.create(MODEL, MESSAGES)
+    with pytest.raises(ValueError):
+        json.loads(llm.create(MODEL, MESSAGES).choices[0].message.content)
+
+    assert llm.create(MODEL, MESSAGES).choices[0].message.content == CONTENT
+
+
+def test_parse_fault_rates():
+    assert parse_fault_rates("rate_limit=0.1, timeout=0.05") == {"rate_limit": 0.1, "timeout": 0.05}
+    with pytest.raises(ValueError):
+        parse_fault_rates("flaky=1")
+
+
+def test_breakdown_through_replay(cassette, monkeypatch):
+    pytest.importorskip("pyodbc", exc_type=ImportError)
+    from ai import llm_client, task_breaker
+
+    llm = ReplayLLM(cassette, speed=0)
+    monkeypatch.setattr(llm_client, "_client", llm)
+    monkeypatch.setattr(task_breaker, "get_llm", lambda: llm)
+    usage = []
+    monkeypatch.setattr(task_breaker, "record_usage", usage.append)
+
+    breakdown = task_breaker.generate_neuro_task_breakdown("clean the kitchen")
+
+    assert breakdown.task_name == "Clean the kitchen"
+    assert [s.step_number for s in breakdown.breakdown] == [1, 2]
+    assert usage[0]["completion_tokens"] == 60
+    assert usage[0]["finish_reason"] == "stop"
+
+    # A malformed completion surfaces as a parse error
+    llm.inject_fault("malformed")
+    with pytest.raises(ValueError):
+        task_breaker.generate_neuro_task_breakdown("clean the kitchen")
@@ -0,0 +1,77 @@
+import itertools
+import pytest
+from ai.schemas import NeuroUserProfile, NeuroTaskBreakdown
+from ai.local_breakdown import local_breakdown, MAX_STEPS, MAX_TASK_NAME
+
+BREAK = "Take a 5-minute break"
+
+DESCRIPTIONS = [
+    "write the report",
+    "Email Sam, then call the bank and pay the rent",
+    "clean the kitchen; wash the dishes; sort the mail; pay the bills; call mum",
+    ". ".join(f"write section {n} of the thesis" for n in range(1, 31)),
+    "buy milk and " * 20 + "go home",
+]
+
+
+def _profile(granularity="normal", break_interval=25):
+    return NeuroUserProfile(user_id="u1", step_granularity=granularity, break_interval_minutes=break_interval)
+
+
+def _texts(breakdown):
+    return [step.step_task for step in breakdown.breakdown]
+
+
+@pytest.mark.parametrize("description, granularity, break_interval", list(itertools.product(
+    DESCRIPTIONS, ("micro", "normal", "macro"), (5, 25, 120)
+)))
+def test_shape(description, granularity, break_interval):
+    breakdown = local_breakdown(description, _profile(granularity, break_interval))
+    texts = _texts(breakdown)
+
+    # Valid against the schema the LLM output is held to
+    assert NeuroTaskBreakdown.model_validate(breakdown.model_dump()) == breakdown
+    assert 1 <= len(texts) <= MAX_STEPS
+    assert [s.step_number for s in breakdown.breakdown] == list(range(1, len(texts) + 1))
+    assert texts[0] != BREAK and texts[-1] != BREAK
+    assert all(not (a == b == BREAK) for a, b in zip(texts, texts[1:]))
+    assert len(breakdown.task_name) <= MAX_TASK_NAME
+
+
+def test_long_lists_are_merged_not_cut():
+    description = ". ".join(f"write section {n}" for n in range(1, 31))
+    texts = _texts(local_breakdown(description, _profile("normal", 5)))
+    content = " ".join(t for t in texts if t != BREAK)
+
+    # Every clause survives, the last one included
+    for n in range(1, 31):
+        assert f"section {n}" in content
+    assert content.endswith("section 30")
+
+
+def test_one_step_per_clause():
+    breakdown = local_breakdown("Email Sam, then call the bank and pay the rent", _profile("normal", 120))
+
+    assert _texts(breakdown) == ["Email Sam", "Call the bank", "Pay the rent"]
+    assert breakdown.task_name == "Email Sam"
+
+
+def test_single_action_uses_template():
+    texts = _texts(local_breakdown("Write the report", _profile("macro", 120)))
+
+    assert texts == ["Start: write the report", "Finish: write the report"]
+
+
+def test_breaks_follow_interval():
+    texts = _texts(local_breakdown("a; b; c; d", _profile("normal", 25)))
+
+    assert texts == ["A", "B", BREAK, "C", "D"]
+
+
+def test_deterministic():
+    assert local_breakdown(DESCRIPTIONS[2], _profile()) == local_breakdown(DESCRIPTIONS[2], _profile())
+
+
+def test_empty_description():
+    with pytest.raises(ValueError):
+        local_breakdown("   ", _profile())
@@ -0,0 +1,111 @@
+import gzip
+import json
+import asyncio
+import pytest
+import azure.functions as func
+from shared.pipeline import pipeline, ApiError, CORS_HEADERS
+from shared.compression import compress_body, MIN_COMPRESS_BYTES
+
+
+def _request(method="GET", headers=None):
+    return func.HttpRequest(method=method, url="/api/test", headers=headers or {}, body=b"")
+
+
+def test_preflight_skips_handler():
+    calls = []
+
+    @pipeline
+    def handler(req):
+        calls.append(req)
+        return {}
+
+    response = handler(_request("OPTIONS"))
+
+    assert response.status_code == 204
+    assert calls == []
+    assert response.headers["Access-Control-Allow-Origin"] == CORS_HEADERS["Access-Control-Allow-Origin"]
+
+
+def test_dict_result_is_json_with_cors():
+    response = pipeline(lambda req: {"task_id": 7, "steps": [1, 2]})(_request())
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert json.loads(response.get_body()) == {"task_id": 7, "steps": [1, 2]}
+    assert response.headers["Vary"] == "Accept, Accept-Encoding"
+    for name in CORS_HEADERS:
+        assert name in response.headers
+
+
+def test_msgpack_negotiation():
+    msgpack = pytest.importorskip("msgpack")
+
+    response = pipeline(lambda req: {"step_text": "Open the laptop"})(
+        _request(headers={"Accept": "application/msgpack"})
+    )
+
+    assert response.mimetype == "application/msgpack"
+    assert msgpack.unpackb(response.get_body()) == {"step_text": "Open the laptop"}
+
+
+def test_large_body_is_compressed():
+    payload = {"steps": ["Put the dishes in the sink"] * 100}
+    response = pipeline(lambda req: payload)(_request(headers={"Accept-Encoding": "gzip"}))
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.get_body())) == payload
+
+
+def test_api_error_is_structured():
+    def handler(req):
+        raise ApiError(404, "Task not found")
+
+    response = pipeline(handler)(_request())
+
+    assert response.status_code == 404
+    assert json.loads(response.get_body()) == {"error": "not_found", "message": "Task not found"}
+
+
+def test_unexpected_error_hides_details():
+    def handler(req):
+        raise RuntimeError("connection string: secret")
+
+    response = pipeline(handler)(_request())
+    body = json.loads(response.get_body())
+
+    assert response.status_code == 500
+    assert body["error"] == "internal_error"
+    assert "secret" not in body["message"]
+
+
+def test_http_response_passes_through_with_cors():
+    response = pipeline(lambda req: func.HttpResponse("raw", status_code=202))(_request())
+
+    assert response.status_code == 202
+    assert response.get_body() == b"raw"
+    assert response.headers["Access-Control-Allow-Origin"] == CORS_HEADERS["Access-Control-Allow-Origin"]
+
+
+def test_small_bodies_stay_uncompressed():
+    assert compress_body(b"{}", "gzip, br") == (b"{}", None)
+
+
+def test_encoding_with_q_zero_is_refused():
+    body = b"x" * MIN_COMPRESS_BYTES
+    assert compress_body(body, "gzip;q=0, br;q=0") == (body, None)
+    assert compress_body(body, "gzip;q=0.5")[1] == "gzip"
+
+
+def test_async_handler():
+    @pipeline
+    async def handler(req):
+        if req.method == "POST":
+            raise ApiError(409, "Conflict", code="conflict")
+        return {"ok": True}
+
+    response = asyncio.run(handler(_request()))
+    assert json.loads(response.get_body()) == {"ok": True}
+    assert "Access-Control-Allow-Origin" in response.headers
+
+    assert asyncio.run(handler(_request("POST"))).status_code == 409
+    assert asyncio.run(handler(_request("OPTIONS"))).status_code == 204
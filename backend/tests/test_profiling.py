@@ -0,0 +1,90 @@
+import time
+import cProfile
+from collections import deque
+import pytest
+import azure.functions as func
+
+from shared import profiling
+from shared.profiling import PROFILE_HEADER, sign_token
+
+KEY = "test-signing-key"
+
+
+def _request(token=None):
+    headers = {PROFILE_HEADER: token} if token else {}
+    return func.HttpRequest(method="GET", url="/api/test", headers=headers, body=b"")
+
+
+@pytest.fixture
+def profiled(monkeypatch, tmp_path):
+    """Token opt-in enabled, profiles written to a temporary directory."""
+    monkeypatch.setattr(profiling, "SIGNING_KEY", KEY)
+    monkeypatch.setattr(profiling, "SAMPLE_RATE", 0)
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    monkeypatch.setattr(profiling, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_started", deque())
+    return tmp_path
+
+
+def test_token_check(profiled):
+    expires = int(time.time()) + 60
+
+    assert profiling._valid_token(sign_token(expires))
+    assert not profiling._valid_token(sign_token(int(time.time()) - 1))
+    assert not profiling._valid_token(sign_token(expires, key="other-key"))
+    assert not profiling._valid_token(f"{expires}.deadbeef")
+    assert not profiling._valid_token("not-a-token")
+    assert not profiling._valid_token(None)
+
+
+def test_token_needs_a_signing_key(profiled, monkeypatch):
+    token = sign_token(int(time.time()) + 60)
+    monkeypatch.setattr(profiling, "SIGNING_KEY", "")
+
+    assert not profiling._valid_token(token)
+
+
+def test_slots_are_capped_per_minute(profiled, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profiling.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(profiling, "MAX_PER_MINUTE", 2)
+
+    assert [profiling._take_slot() for _ in range(3)] == [True, True, False]
+
+    # Slots free up once the requests that took them are a minute old
+    now[0] += 61
+    assert profiling._take_slot()
+
+
+def test_profiled_request_writes_a_profile(profiled):
+    response = profiling.run(_request(sign_token(int(time.time()) + 60)), "handler", lambda req: "ok")
+
+    assert response == "ok"
+    assert sorted(p.suffix for p in profiled.iterdir()) == [".collapsed", ".json"]
+
+
+def test_unsigned_request_is_not_profiled(profiled):
+    assert profiling.run(_request("123.abc"), "handler", lambda req: "ok") == "ok"
+    assert list(profiled.iterdir()) == []
+
+
+def test_disabled_profiling_only_calls_the_handler(profiled, monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", False)
+    monkeypatch.setattr(profiling, "_should_profile", lambda req: pytest.fail("checked while disabled"))
+
+    assert profiling.run(_request(sign_token(int(time.time()) + 60)), "handler", lambda req: "ok") == "ok"
+    assert list(profiled.iterdir()) == []
+
+
+def test_busy_cprofile_runs_the_handler_unprofiled(profiled, monkeypatch):
+    class BusyProfile(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            # What 3.12+ raises when another profiler is already active
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(profiling, "MODE", "cprofile")
+    monkeypatch.setattr(cProfile, "Profile", BusyProfile)
+
+    assert profiling.run(_request(sign_token(int(time.time()) + 60)), "handler", lambda req: "ok") == "ok"
+    assert list(profiled.iterdir()) == []
+    assert profiling._sql_log.get() is None
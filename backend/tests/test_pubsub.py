@@ -0,0 +1,80 @@
+import time
+import asyncio
+import threading
+import pytest
+from shared.pubsub import Broker, Hub, InMemoryBroker
+
+EVENT_STEP_ADVANCED = "step_advanced"
+
+
+def _publish_later(hub, channel, delay=0.05):
+    def publish():
+        time.sleep(delay)
+        hub.publish(channel, EVENT_STEP_ADVANCED, {"task_id": 1})
+    threading.Thread(target=publish).start()
+
+
+def test_broker_must_implement_both_methods():
+    with pytest.raises(TypeError):
+        Broker()
+
+
+def test_events_reach_every_hub():
+    broker = InMemoryBroker()
+    first, second = Hub(broker), Hub(broker)
+
+    event_id = first.publish("task:1", EVENT_STEP_ADVANCED, {"task_id": 1})
+
+    assert [e["id"] for e in second.wait("task:1", 0, 0)] == [event_id]
+    assert second.wait("task:2", 0, 0) == []
+
+
+def test_wait_wakes_on_publish():
+    hub = Hub()
+    _publish_later(hub, "task:1")
+
+    started = time.monotonic()
+    events = hub.wait("task:1", hub.latest_id(), 5)
+
+    assert len(events) == 1
+    assert time.monotonic() - started < 1
+
+
+def test_wait_async_wakes_on_publish_from_another_thread():
+    hub = Hub()
+    _publish_later(hub, "task:1")
+
+    started = time.monotonic()
+    events = asyncio.run(hub.wait_async("task:1", hub.latest_id(), 5))
+
+    assert len(events) == 1
+    assert time.monotonic() - started < 1
+    assert hub._waiters == {}
+
+
+def test_wait_async_times_out():
+    hub = Hub()
+
+    assert asyncio.run(hub.wait_async("task:1", hub.latest_id(), 0.05)) == []
+    assert hub._waiters == {}
+
+
+def test_many_waiters_share_one_thread():
+    hub = Hub()
+
+    async def waiters():
+        after_id = hub.latest_id()
+        tasks = [hub.wait_async("task:1", after_id, 5) for _ in range(200)]
+        _publish_later(hub, "task:1")
+        return await asyncio.gather(*tasks)
+
+    assert [len(events) for events in asyncio.run(waiters())] == [1] * 200
+
+
+def test_resync_after_eviction():
+    hub = Hub(buffer_size=2)
+    first = hub.publish("task:1", EVENT_STEP_ADVANCED, {})
+    for _ in range(3):
+        hub.publish("task:1", EVENT_STEP_ADVANCED, {})
+
+    assert [e["type"] for e in hub.wait("task:1", first, 0)] == ["resync"]
@@ -0,0 +1,134 @@
+import json
+import pytest
+import azure.functions as func
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from shared.pipeline import ApiError
+from task.repeat_task import handle_repeat_task, create_recurring_tasks
+from task.step_store import encode_steps, FORMAT_GZIP_JSON
+
+
+def _request(body):
+    return func.HttpRequest(method="POST", url="/api/task/repeat", body=json.dumps(body).encode("utf-8"))
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"task_id": 1}, "user_id and task_id are required"),
+    ({"user_id": "u1", "task_id": "abc"}, "task_id must be a number"),
+    ({"user_id": "u1", "task_id": 1, "recurrence": "hourly"}, "recurrence must be one of: daily, weekdays, weekly, off"),
+])
+def test_validation(body, message):
+    with pytest.raises(ApiError) as e:
+        handle_repeat_task(_request(body))
+    assert (e.value.status_code, e.value.message) == (400, message)
+
+
+def _create_tasks(user_id):
+    from database.db import get_db_connection
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+
+        DECLARE @rows INT, @packed INT;
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Rows', 2, 2, 'completed');
+        SET @rows = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@rows, 1, 'First', 5, 1), (@rows, 2, 'Second', 10, 1);
+
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status,
+                           steps_blob, steps_format, step_count, steps_done_mask)
+        VALUES (?, 'Packed', 1, 2, 'completed', ?, ?, 2, 3);
+        SET @packed = SCOPE_IDENTITY();
+
+        SELECT @rows, @packed;
+        """,
+        (user_id, user_id, user_id, encode_steps([("Open", 2), ("Close", 3)]), FORMAT_GZIP_JSON)
+    )
+    task_ids = cursor.fetchone()
+    conn.commit()
+    return conn, task_ids
+
+
+def test_repeat_copies_steps_and_resets_progress(database, user_id):
+    conn, (rows_task, packed_task) = _create_tasks(user_id)
+    cursor = conn.cursor()
+
+    copy = handle_repeat_task(_request({"user_id": user_id, "task_id": rows_task}))
+    assert (copy["step_number"], copy["step_text"], copy["total_steps"]) == (1, "First", 2)
+
+    cursor.execute(
+        "SELECT current_step_index, status FROM tasks WHERE task_id = ?", (copy["task_id"],)
+    )
+    assert tuple(cursor.fetchone()) == (0, "active")
+    cursor.execute(
+        "SELECT step_order, step_text, is_done FROM task_steps WHERE task_id = ? ORDER BY step_order",
+        (copy["task_id"],)
+    )
+    assert [tuple(r) for r in cursor.fetchall()] == [(1, "First", False), (2, "Second", False)]
+
+    packed = handle_repeat_task(_request({"user_id": user_id, "task_id": packed_task}))
+    assert (packed["step_text"], packed["estimated_time_minutes"]) == ("Open", 2)
+    cursor.execute("SELECT steps_done_mask FROM tasks WHERE task_id = ?", (packed["task_id"],))
+    assert cursor.fetchone()[0] == 0
+
+    with pytest.raises(ApiError) as e:
+        handle_repeat_task(_request({"user_id": "someone-else", "task_id": rows_task}))
+    assert e.value.status_code == 404
+    conn.close()
+
+
+def test_recurrence(database, user_id):
+    conn, (rows_task, _) = _create_tasks(user_id)
+    cursor = conn.cursor()
+
+    copy = handle_repeat_task(_request({"user_id": user_id, "task_id": rows_task, "recurrence": "daily"}))
+
+    cursor.execute(
+        "SELECT schedule, last_task_id FROM task_recurrences WHERE user_id = ? AND source_task_id = ?",
+        (user_id, rows_task)
+    )
+    assert tuple(cursor.fetchone()) == ("daily", copy["task_id"])
+
+    def copies():
+        cursor.execute("SELECT COUNT(*) FROM tasks WHERE user_id = ? AND task_name = 'Rows'", (user_id,))
+        return cursor.fetchone()[0]
+
+    # Made yesterday and untouched: no new copy piles up
+    cursor.execute(
+        "UPDATE task_recurrences SET last_created_date = DATEADD(day, -1, CAST(GETDATE() AS DATE)) WHERE user_id = ?",
+        (user_id,)
+    )
+    conn.commit()
+    create_recurring_tasks()
+    assert copies() == 2
+
+    # Once started, the next day's copy is made, steps included
+    cursor.execute(
+        """
+        UPDATE tasks SET current_step_index = 1 WHERE task_id = ?;
+        UPDATE task_recurrences SET last_created_date = DATEADD(day, -1, CAST(GETDATE() AS DATE)) WHERE user_id = ?;
+        """,
+        (copy["task_id"], user_id)
+    )
+    conn.commit()
+    assert create_recurring_tasks() >= 1
+    assert copies() == 3
+
+    cursor.execute(
+        "SELECT last_task_id FROM task_recurrences WHERE user_id = ? AND source_task_id = ?",
+        (user_id, rows_task)
+    )
+    newest = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM task_steps WHERE task_id = ?", (newest,))
+    assert cursor.fetchone()[0] == 2
+
+    handle_repeat_task(_request({"user_id": user_id, "task_id": rows_task, "recurrence": "off"}))
+    cursor.execute("SELECT COUNT(*) FROM task_recurrences WHERE user_id = ?", (user_id,))
+    assert cursor.fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,226 @@
+import uuid
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from database import db
+from database.db import TASK_ID_SHARD_SPAN, shard_for_task, shard_for_user, get_task_connection
+
+USERS = [f"user-{n}" for n in range(5000)]
+
+
+def test_placement_is_deterministic():
+    assert [shard_for_user(u, 4) for u in USERS[:100]] == [shard_for_user(u, 4) for u in USERS[:100]]
+
+
+def test_single_shard():
+    assert {shard_for_user(u, 1) for u in USERS[:100]} == {0}
+
+
+def test_users_spread_over_every_shard():
+    counts = [0] * 4
+    for u in USERS:
+        counts[shard_for_user(u, 4)] += 1
+
+    # 128 virtual nodes per shard keep each within a third of its fair share
+    fair = len(USERS) / 4
+    assert all(abs(count - fair) < fair / 3 for count in counts)
+
+
+def test_growing_the_ring_only_moves_users_to_the_new_shard():
+    moved = [u for u in USERS if shard_for_user(u, 4) != shard_for_user(u, 5)]
+
+    assert all(shard_for_user(u, 5) == 4 for u in moved)
+    # Roughly 1/5 of users move, not the ~4/5 a modulo hash would
+    assert len(moved) < len(USERS) * 0.3
+
+
+def test_shard_for_task():
+    assert shard_for_task(1) == 0
+    assert shard_for_task(TASK_ID_SHARD_SPAN - 1) == 0
+    assert shard_for_task(str(3 * TASK_ID_SHARD_SPAN + 7)) == 3
+
+    with pytest.raises(ValueError):
+        shard_for_task("abc")
+
+
+class ForwardingCursor:
+    def __init__(self, shard, forwards):
+        self.shard = shard
+        self.forwards = forwards
+        self.row = None
+
+    def execute(self, sql, params):
+        new_task_id = self.forwards.get(params[0])
+        self.row = (new_task_id,) if new_task_id and shard_for_task(params[0]) == self.shard else None
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class ForwardingConnection:
+    """A shard connection whose moved_tasks holds the given forwarding rows."""
+
+    def __init__(self, shard, forwards):
+        self.shard = shard
+        self.forwards = forwards
+        self.closed = False
+
+    def cursor(self):
+        return ForwardingCursor(self.shard, self.forwards)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def forwarding(monkeypatch):
+    """Two shards where moves left the given moved_tasks rows behind."""
+    opened = []
+
+    def setup(forwards):
+        def open_shard(shard, user_id, task_id, read_only):
+            opened.append(ForwardingConnection(shard, forwards))
+            return opened[-1]
+        monkeypatch.setattr(db, "_open", open_shard)
+        return opened
+
+    monkeypatch.setattr(db, "shard_count", lambda: 2)
+    monkeypatch.setattr(db, "_moved_tasks", {})
+    return setup
+
+
+def test_task_ids_follow_forwarding_rows(forwarding):
+    a, b, a2 = 5, TASK_ID_SHARD_SPAN + 9, 12
+    # Moved from shard 0 to 1 and back: a -> b -> a2
+    opened = forwarding({a: b, b: a2})
+
+    conn, task_id = get_task_connection(str(a))
+    assert (task_id, conn.shard) == (a2, 0)
+    assert [c.closed for c in opened] == [True, True, False]
+
+    # The hop is cached; only the current id is checked next time
+    opened.clear()
+    conn, task_id = get_task_connection(a)
+    assert (task_id, len(opened)) == (a2, 1)
+
+    # Tasks that never moved stay where their id says
+    assert get_task_connection(b + 1)[1] == b + 1
+
+
+def test_forwarding_loop_is_an_error(forwarding):
+    forwarding({5: TASK_ID_SHARD_SPAN + 5, TASK_ID_SHARD_SPAN + 5: 5})
+
+    with pytest.raises(Exception, match="form a loop"):
+        get_task_connection(5)
+
+
+def _count(cursor, sql, user_id):
+    cursor.execute(sql, (user_id,))
+    return cursor.fetchone()[0]
+
+
+def test_move_user(shards, user_id):
+    from database.db import get_db_connection
+    from database.rebalance import move_user
+
+    source = shard_for_user(user_id)
+    target = (source + 1) % len(shards)
+
+    conn = get_db_connection(shard=source)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+        INSERT INTO user_stats (user_id, reward_points, streak, tasks_completed) VALUES (?, 15, 2, 1);
+        INSERT INTO user_badges (user_id, badge_code) VALUES (?, 'first_task');
+
+        DECLARE @hot INT, @old INT;
+        INSERT INTO tasks (user_id, task_name, difficulty_level) VALUES (?, 'Hot', 2);
+        SET @hot = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@hot, 1, 'First', 5, 1), (@hot, 2, 'Second', 5, 0);
+
+        INSERT INTO tasks (user_id, task_name, difficulty_level, status, current_step_index) VALUES (?, 'Old', 1, 'completed', 1);
+        SET @old = SCOPE_IDENTITY();
+        INSERT INTO tasks_archive (task_id, user_id, task_name, difficulty_level, current_step_index, status, created_at)
+        SELECT task_id, user_id, task_name, difficulty_level, current_step_index, status, created_at FROM tasks WHERE task_id = @old;
+        INSERT INTO task_steps_archive (step_id, task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (0, @old, 1, 'Only', 5, 1);
+        DELETE FROM tasks WHERE task_id = @old;
+
+        INSERT INTO task_recurrences (user_id, source_task_id, schedule) VALUES (?, @old, 'daily');
+        INSERT INTO sync_events (user_id, device_id, client_seq, task_id) VALUES (?, 'phone', 1, @hot);
+        INSERT INTO activity_events (user_id, task_id, event_type, step_order) VALUES (?, @hot, 'step_done', 1);
+
+        SELECT @hot, @old;
+        """,
+        (user_id,) * 8
+    )
+    hot, old = cursor.fetchone()
+    conn.commit()
+    conn.close()
+
+    task_id_map = move_user(user_id, source, target)
+
+    assert set(task_id_map) == {hot, old}
+    assert all(shard_for_task(task_id) == target for task_id in task_id_map.values())
+
+    # Requests for the user now follow the forwarding row to the target
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    assert _count(cursor, "SELECT COUNT(*) FROM users WHERE user_id = ?", user_id) == 1
+    assert _count(cursor, "SELECT reward_points FROM user_stats WHERE user_id = ?", user_id) == 15
+    assert _count(cursor, "SELECT COUNT(*) FROM tasks WHERE user_id = ?", user_id) == 1
+    assert _count(cursor, "SELECT COUNT(*) FROM tasks_archive WHERE user_id = ?", user_id) == 1
+    assert _count(
+        cursor,
+        "SELECT COUNT(*) FROM task_steps_all s JOIN tasks_all t ON t.task_id = s.task_id WHERE t.user_id = ?",
+        user_id
+    ) == 3
+    assert _count(cursor, "SELECT MAX(source_task_id) FROM task_recurrences WHERE user_id = ?", user_id) == task_id_map[old]
+    assert _count(cursor, "SELECT MAX(task_id) FROM sync_events WHERE user_id = ?", user_id) == task_id_map[hot]
+    assert _count(cursor, "SELECT MAX(task_id) FROM activity_events WHERE user_id = ?", user_id) == task_id_map[hot]
+    conn.close()
+
+    conn = get_db_connection(shard=source)
+    cursor = conn.cursor()
+    assert _count(cursor, "SELECT COUNT(*) FROM tasks_all WHERE user_id = ?", user_id) == 0
+    assert _count(cursor, "SELECT COUNT(*) FROM activity_events WHERE user_id = ?", user_id) == 0
+    assert _count(cursor, "SELECT shard FROM moved_users WHERE user_id = ?", user_id) == target
+    conn.close()
+
+    # Nothing left to move; a rerun changes nothing
+    assert move_user(user_id, source, target) == {}
+
+    # Old ids keep working, by task id and by user, after moving back too
+    moved_back = move_user(user_id, target, source)
+    current = moved_back[task_id_map[hot]]
+    conn, task_id = get_task_connection(hot)
+    assert task_id == current
+    assert _count(conn.cursor(), "SELECT COUNT(*) FROM tasks WHERE task_id = ?", task_id) == 1
+    conn.close()
+
+    conn = get_db_connection(user_id=user_id)
+    assert db.moved_task_ids(conn.cursor(), user_id, [hot, task_id_map[hot], current]) == {
+        hot: current, task_id_map[hot]: current
+    }
+    conn.close()
+
+
+def test_move_unknown_user(shards):
+    from database.db import get_db_connection
+    from database.rebalance import move_user
+
+    user_id = f"missing-{uuid.uuid4().hex[:8]}"
+    assert move_user(user_id, 0, 1) == {}
+
+    # The forwarding row is rolled back with the move
+    conn = get_db_connection(shard=0)
+    cursor = conn.cursor()
+    assert _count(cursor, "SELECT COUNT(*) FROM moved_users WHERE user_id = ?", user_id) == 0
+    conn.close()
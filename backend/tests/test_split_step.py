@@ -0,0 +1,181 @@
+import json
+import pytest
+import azure.functions as func
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from ai.schemas import SubStepBreakdown, BreakdownStep
+from shared.pipeline import ApiError
+from task import split_step
+from task.split_step import handle_split_step
+from task.step_store import encode_steps, decode_steps, FORMAT_GZIP_JSON, MAX_PACKED_STEPS
+
+SUB_STEPS = [("Find the file", 1), ("Open it", 1), ("Read the first page", 3)]
+
+
+def _request(body):
+    return func.HttpRequest(method="POST", url="/api/task/split-step", body=json.dumps(body).encode("utf-8"))
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """generate_sub_steps returns SUB_STEPS, after calling on_generate."""
+    calls = {"on_generate": lambda: None, "published": []}
+
+    def generate(task_name, step_text, profile):
+        calls["on_generate"]()
+        return SubStepBreakdown(sub_steps=[
+            BreakdownStep(step_number=n, step_task=text, estimated_time_minutes=minutes)
+            for n, (text, minutes) in enumerate(SUB_STEPS, 1)
+        ])
+
+    monkeypatch.setattr(split_step, "generate_sub_steps", generate)
+    monkeypatch.setattr(split_step, "publish_step_advanced", lambda *args: calls["published"].append(args))
+    return calls
+
+
+@pytest.mark.parametrize("body, message", [
+    ({}, "task_id is required"),
+    ({"task_id": "abc"}, "task_id must be a number"),
+    ({"task_id": 1, "step_number": "x"}, "step_number must be a number"),
+])
+def test_validation(body, message):
+    with pytest.raises(ApiError) as e:
+        handle_split_step(_request(body))
+    assert (e.value.status_code, e.value.message) == (400, message)
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("status, step_number", [
+    ("active", 1),
+    ("completed", 2),
+])
+def test_done_steps_cannot_be_split(monkeypatch, recording_cursor, llm, status, step_number):
+    # (current_step_index,), then the step: one of two steps done
+    rows = [(1,), ("u1", "Task", 1, status, None, None, None, "Some step")]
+    monkeypatch.setattr(
+        split_step, "get_task_connection",
+        lambda task_id, read_only: (FakeConnection(recording_cursor(list(rows))), int(task_id))
+    )
+    llm["on_generate"] = lambda: pytest.fail("LLM called for a done step")
+
+    with pytest.raises(ApiError) as e:
+        handle_split_step(_request({"task_id": 7, "step_number": step_number}))
+    assert (e.value.status_code, e.value.message) == (409, "Only steps that are not done yet can be split")
+
+
+def _create_tasks(user_id, packed_steps):
+    from database.db import get_db_connection
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+
+        DECLARE @rows INT, @packed INT;
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Rows', 2, 1, 'active');
+        SET @rows = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@rows, 1, 'First', 5, 1), (@rows, 2, 'Second', 10, 0), (@rows, 3, 'Third', 5, 0);
+
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status,
+                           steps_blob, steps_format, step_count, steps_done_mask)
+        VALUES (?, 'Packed', 1, 1, 'active', ?, ?, ?, 1);
+        SET @packed = SCOPE_IDENTITY();
+
+        SELECT @rows, @packed;
+        """,
+        (user_id, user_id, user_id, encode_steps(packed_steps), FORMAT_GZIP_JSON, len(packed_steps))
+    )
+    task_ids = cursor.fetchone()
+    conn.commit()
+    return conn, task_ids
+
+
+def test_split_shifts_later_rows(database, user_id, llm):
+    conn, (rows_task, _) = _create_tasks(user_id, [("Open", 2), ("Middle", 3), ("Close", 3)])
+    cursor = conn.cursor()
+
+    response = handle_split_step(_request({"task_id": rows_task}))
+
+    assert response["total_steps"] == 5
+    assert [s["step_number"] for s in response["sub_steps"]] == [2, 3, 4]
+    cursor.execute(
+        "SELECT step_order, step_text, is_done FROM task_steps WHERE task_id = ? ORDER BY step_order",
+        (rows_task,)
+    )
+    assert [tuple(r) for r in cursor.fetchall()] == [
+        (1, "First", True),
+        (2, "Find the file", False),
+        (3, "Open it", False),
+        (4, "Read the first page", False),
+        (5, "Third", False)
+    ]
+
+    # The split step was the current one, so other devices move to the first sub-step
+    assert llm["published"] == [(rows_task, 2, "Find the file", 1, 5)]
+    conn.close()
+
+
+def test_split_rewrites_the_packed_blob(database, user_id, llm):
+    conn, (_, packed_task) = _create_tasks(user_id, [("Open", 2), ("Middle", 3), ("Close", 3)])
+    cursor = conn.cursor()
+
+    # Not the current step: nothing is published
+    response = handle_split_step(_request({"task_id": packed_task, "step_number": 3}))
+
+    assert response["total_steps"] == 5
+    cursor.execute("SELECT steps_blob, steps_format, step_count, steps_done_mask FROM tasks WHERE task_id = ?", (packed_task,))
+    blob, steps_format, step_count, mask = cursor.fetchone()
+    assert decode_steps(blob, steps_format) == [("Open", 2), ("Middle", 3)] + SUB_STEPS
+    # Only step 1 is done, and it sits below the split, so its bit stays put
+    assert (step_count, mask) == (5, 1)
+    assert llm["published"] == []
+    conn.close()
+
+
+def test_split_beyond_the_packed_limit(database, user_id, llm):
+    steps = [(f"Step {n}", 1) for n in range(1, MAX_PACKED_STEPS + 1)]
+    conn, (_, packed_task) = _create_tasks(user_id, steps)
+    cursor = conn.cursor()
+
+    with pytest.raises(ApiError) as e:
+        handle_split_step(_request({"task_id": packed_task}))
+    assert (e.value.status_code, e.value.message) == (409, "Task has too many steps to split further")
+
+    cursor.execute("SELECT step_count FROM tasks WHERE task_id = ?", (packed_task,))
+    assert cursor.fetchone()[0] == MAX_PACKED_STEPS
+    conn.close()
+
+
+def test_step_done_during_generation(database, user_id, llm):
+    conn, (rows_task, _) = _create_tasks(user_id, [("Open", 2), ("Close", 3)])
+    cursor = conn.cursor()
+
+    def finish_the_step():
+        cursor.execute("UPDATE tasks SET current_step_index = 2 WHERE task_id = ?", (rows_task,))
+        conn.commit()
+
+    llm["on_generate"] = finish_the_step
+
+    with pytest.raises(ApiError) as e:
+        handle_split_step(_request({"task_id": rows_task}))
+    assert (e.value.status_code, e.value.message) == (409, "Task changed while splitting; please retry")
+
+    # Rolled back: the steps are as they were
+    cursor.execute("SELECT COUNT(*) FROM task_steps WHERE task_id = ?", (rows_task,))
+    assert cursor.fetchone()[0] == 3
+    conn.close()
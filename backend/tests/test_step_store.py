@@ -0,0 +1,82 @@
+import gzip
+import json
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from task.step_store import (
+    encode_steps, decode_steps, done_bits, step_at, FORMAT_GZIP_JSON, MAX_PACKED_STEPS
+)
+
+STEPS = [("Open the document", 2), ("Write the intro — two lines", 10), ("Lire à voix haute 📖", 5)]
+
+
+def test_round_trip():
+    assert decode_steps(encode_steps(STEPS), FORMAT_GZIP_JSON) == STEPS
+
+
+def test_blob_is_what_sql_server_decompresses():
+    # DECOMPRESS + CAST(... AS NVARCHAR(MAX)) reads gzip of UTF-16LE JSON
+    text = gzip.decompress(encode_steps(STEPS)).decode("utf-16-le")
+    assert json.loads(text) == [[t, m] for t, m in STEPS]
+
+
+def test_encoding_is_deterministic():
+    assert encode_steps(STEPS) == encode_steps(list(STEPS))
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        decode_steps(encode_steps(STEPS), 99)
+
+
+def test_done_bits():
+    assert done_bits(0, 1) == 0b1
+    assert done_bits(1, 3) == 0b110
+    assert done_bits(0, 3) | done_bits(3, 4) == 0b1111
+    # The last packable step still fits a signed BIGINT
+    assert done_bits(0, MAX_PACKED_STEPS) < 2 ** 63
+
+
+def test_step_at():
+    assert step_at(STEPS, 1) == (1, "Open the document", 2)
+    assert step_at(STEPS, 3)[0] == 3
+    assert step_at(STEPS, 0) is None
+    assert step_at(STEPS, 4) is None
+
+
+def test_pack_task_steps(database, user_id):
+    from database.db import get_db_connection
+    from task.step_store import pack_task_steps
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index) VALUES (?, 'Task', 2, 2);
+        DECLARE @task INT = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@task, 1, ?, ?, 1), (@task, 2, ?, ?, 1), (@task, 3, ?, ?, 0);
+        SELECT @task;
+        """,
+        [user_id, user_id] + [value for step in STEPS for value in step]
+    )
+    task_id = cursor.fetchone()[0]
+    conn.commit()
+
+    while pack_task_steps(batch_size=100):
+        pass
+
+    cursor.execute(
+        "SELECT steps_blob, steps_format, step_count, steps_done_mask FROM tasks WHERE task_id = ?",
+        (task_id,)
+    )
+    blob, steps_format, step_count, mask = cursor.fetchone()
+    assert decode_steps(blob, steps_format) == STEPS
+    assert (step_count, mask) == (3, 0b11)
+
+    cursor.execute("SELECT COUNT(*) FROM task_steps WHERE task_id = ?", (task_id,))
+    assert cursor.fetchone()[0] == 0
+    conn.close()
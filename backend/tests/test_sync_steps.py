@@ -0,0 +1,141 @@
+import json
+import pytest
+import azure.functions as func
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from shared.pipeline import ApiError
+from task.sync_steps import handle_sync_steps, MAX_BATCH_SIZE
+from task.step_store import encode_steps, FORMAT_GZIP_JSON
+
+
+def _request(body):
+    return func.HttpRequest(method="POST", url="/api/task/sync", body=json.dumps(body).encode("utf-8"))
+
+
+def _sync(user_id, *events, device_id="phone"):
+    return handle_sync_steps(_request({
+        "user_id": user_id,
+        "device_id": device_id,
+        "events": [{"client_seq": seq, "task_id": task_id} for seq, task_id in events]
+    }))
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"events": []}, "user_id and events are required"),
+    ({"user_id": "u1", "events": {}}, "user_id and events are required"),
+    ({"user_id": "u1", "events": [{"task_id": 1}]}, "Each event needs integer task_id and client_seq"),
+    ({"user_id": "u1", "events": [{"task_id": "x", "client_seq": 1}]}, "Each event needs integer task_id and client_seq"),
+    ({"user_id": "u1", "events": [{"task_id": 1, "client_seq": n} for n in range(MAX_BATCH_SIZE + 1)]},
+     f"At most {MAX_BATCH_SIZE} events per sync"),
+])
+def test_validation(body, message):
+    with pytest.raises(ApiError) as e:
+        handle_sync_steps(_request(body))
+    assert (e.value.status_code, e.value.message) == (400, message)
+
+
+def test_empty_batch():
+    assert _sync("u1") == {"applied": [], "skipped": [], "tasks": [], "new_badges": []}
+
+
+def _create_tasks(user_id):
+    from database.db import get_db_connection
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+
+        DECLARE @rows INT, @packed INT, @done INT;
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Rows', 2, 0, 'active');
+        SET @rows = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@rows, 1, 'First', 5, 0), (@rows, 2, 'Second', 10, 0), (@rows, 3, 'Third', 5, 0);
+
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status,
+                           steps_blob, steps_format, step_count, steps_done_mask)
+        VALUES (?, 'Packed', 3, 0, 'active', ?, ?, 2, 0);
+        SET @packed = SCOPE_IDENTITY();
+
+        INSERT INTO tasks (user_id, task_name, difficulty_level, current_step_index, status)
+        VALUES (?, 'Done', 1, 1, 'completed');
+        SET @done = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes, is_done)
+        VALUES (@done, 1, 'Only', 5, 1);
+
+        SELECT @rows, @packed, @done;
+        """,
+        (user_id, user_id, user_id, encode_steps([("Open", 2), ("Close", 3)]), FORMAT_GZIP_JSON, user_id)
+    )
+    task_ids = cursor.fetchone()
+    conn.commit()
+    return conn, task_ids
+
+
+def test_advances_each_task_by_its_events(database, user_id):
+    conn, (rows_task, packed_task, _) = _create_tasks(user_id)
+    cursor = conn.cursor()
+
+    response = _sync(user_id, (1, rows_task), (2, packed_task), (3, rows_task))
+
+    assert response["applied"] == [1, 2, 3]
+    tasks = {task["task_id"]: task for task in response["tasks"]}
+    assert tasks[rows_task]["steps_done"] == 2
+    assert tasks[rows_task]["next_step"]["step_text"] == "Third"
+    assert tasks[packed_task]["steps_done"] == 1
+    assert tasks[packed_task]["next_step"]["step_text"] == "Close"
+
+    cursor.execute("SELECT step_order FROM task_steps WHERE task_id = ? AND is_done = 1 ORDER BY step_order", (rows_task,))
+    assert [row[0] for row in cursor.fetchall()] == [1, 2]
+    cursor.execute("SELECT steps_done_mask FROM tasks WHERE task_id = ?", (packed_task,))
+    assert cursor.fetchone()[0] == 0b1
+    conn.close()
+
+
+def test_replays_are_skipped(database, user_id):
+    conn, (rows_task, _, _) = _create_tasks(user_id)
+    cursor = conn.cursor()
+
+    # In-batch duplicate sequence numbers count once
+    assert _sync(user_id, (1, rows_task), (1, rows_task))["applied"] == [1]
+
+    replay = _sync(user_id, (1, rows_task), (2, rows_task))
+    assert (replay["applied"], replay["skipped"]) == ([2], [1])
+
+    # The same sequence number from another device is a new event
+    assert _sync(user_id, (1, rows_task), device_id="laptop")["applied"] == [1]
+
+    cursor.execute("SELECT current_step_index FROM tasks WHERE task_id = ?", (rows_task,))
+    assert cursor.fetchone()[0] == 3
+    conn.close()
+
+
+def test_completion(database, user_id):
+    conn, (rows_task, packed_task, done_task) = _create_tasks(user_id)
+    cursor = conn.cursor()
+
+    # One event too many for the packed task, and one for a finished task
+    response = _sync(user_id, (1, packed_task), (2, packed_task), (3, packed_task), (4, done_task))
+
+    assert (response["applied"], response["skipped"]) == ([1, 2], [3, 4])
+    tasks = {task["task_id"]: task for task in response["tasks"]}
+    assert tasks[packed_task]["completed"] and tasks[packed_task]["next_step"] is None
+    assert tasks[done_task]["steps_done"] == 1
+    assert response["streak"] == 1 and "first_task" in response["new_badges"]
+
+    cursor.execute("SELECT status, steps_done_mask FROM tasks WHERE task_id = ?", (packed_task,))
+    assert tuple(cursor.fetchone()) == ("completed", 0b11)
+    cursor.execute("SELECT tasks_completed FROM user_stats WHERE user_id = ?", (user_id,))
+    assert cursor.fetchone()[0] == 1
+
+    # Events for the now completed task are skipped and change nothing
+    again = _sync(user_id, (5, packed_task), (6, rows_task))
+    assert (again["applied"], again["skipped"]) == ([6], [5])
+    assert again["new_badges"] == []
+    cursor.execute("SELECT tasks_completed FROM user_stats WHERE user_id = ?", (user_id,))
+    assert cursor.fetchone()[0] == 1
+    conn.close()
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+import azure.functions as func
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from shared.pubsub import Hub
+from task import task_events
+from task.task_events import handle_task_events, task_channel, EVENT_STEP_ADVANCED
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = Hub()
+    monkeypatch.setattr(task_events, "get_hub", lambda: hub)
+    # Task 7 was moved to another shard and is task 9 there now
+    monkeypatch.setattr(task_events, "resolve_task_id", lambda task_id: {7: 9}.get(int(task_id), int(task_id)))
+    return hub
+
+
+def _events(task_id, after_id):
+    req = func.HttpRequest(
+        method="GET", url="/api/task/events", params={"task_id": str(task_id)},
+        headers={"Last-Event-ID": str(after_id)}, body=b""
+    )
+    return asyncio.run(handle_task_events(req))
+
+
+def test_handler_streams_published_event(hub):
+    after_id = hub.latest_id()
+    hub.publish(task_channel(3), EVENT_STEP_ADVANCED, {"task_id": 3, "total_steps": 4})
+
+    response = _events(3, after_id)
+    body = response.get_body().decode("utf-8")
+
+    assert response.mimetype == "text/event-stream"
+    assert f"event: {EVENT_STEP_ADVANCED}" in body
+    assert '"total_steps":4' in body
+
+
+def test_moved_task_streams_from_its_current_id(hub):
+    after_id = hub.latest_id()
+    hub.publish(task_channel(9), EVENT_STEP_ADVANCED, {"task_id": 9, "total_steps": 2})
+
+    assert '"task_id":9' in _events(7, after_id).get_body().decode("utf-8")
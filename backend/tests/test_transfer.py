@@ -0,0 +1,152 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from database.db import TASK_ID_SHARD_SPAN
+from database.transfer import (
+    _type_name, _encode, _decode, _after_key, _after_key_params, _insert_missing_sql, _route, _moved_task_ids
+)
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2026, 3, 1, 9, 30, 15, 250000),
+    date(2026, 3, 1),
+    b"\x00\x01packed\xff",
+    Decimal("12.50"),
+    "text",
+    42,
+    None
+])
+def test_encode_decode_round_trip(value):
+    # Through JSON, as the chunk files store it
+    encoded = json.loads(json.dumps(_encode(value)))
+    assert _decode(encoded, _type_name(value)) == value
+
+
+def test_after_key():
+    assert _after_key(["task_id"]) == "((task_id > ?))"
+    assert _after_key(["user_id", "badge_code"]) == "((user_id > ?) OR (user_id = ? AND badge_code > ?))"
+    assert _after_key_params(["u1", "streak_7"]) == ["u1", "u1", "streak_7"]
+
+
+def test_insert_missing_sql():
+    sql = _insert_missing_sql("task_steps", ["task_id", "step_order", "step_text"], ["task_id", "step_order"])
+    assert sql == (
+        "INSERT INTO task_steps (task_id, step_order, step_text) SELECT ?, ?, ? "
+        "WHERE NOT EXISTS (SELECT 1 FROM task_steps WHERE task_id = ? AND step_order = ?)"
+    )
+
+
+@pytest.fixture
+def three_shards(monkeypatch):
+    monkeypatch.setenv("DB_SHARD_CONNECTION_STRINGS", json.dumps(["a", "b", "c"]))
+    monkeypatch.delenv("DB_SHARD_RING_SIZE", raising=False)
+
+
+def test_route(three_shards):
+    # Step rows go where their task id says, user rows with the user
+    assert _route({"task_id": 2 * TASK_ID_SHARD_SPAN + 5, "step_order": 1}) == 2
+    assert _route({"task_id": TASK_ID_SHARD_SPAN + 9, "step_order": 1}) == 1
+    row = {"user_id": "u1", "source_task_id": 2 * TASK_ID_SHARD_SPAN + 5, "last_task_id": None}
+    assert _route(row) == _route({"user_id": "u1"})
+
+
+def test_moved_task_ids_are_read_from_every_shard(three_shards, recording_cursor):
+    moved = 2 * TASK_ID_SHARD_SPAN + 5
+    cursors = [recording_cursor(), recording_cursor(), recording_cursor([(5, moved)])]
+
+    task_ids = [5, 5] + list(range(100, 1600))
+    assert _moved_task_ids(lambda shard: cursors[shard], task_ids) == {5: moved}
+
+    # Distinct ids, 1000 per query, each batch asked of every shard
+    for cursor in cursors:
+        assert [len(params) for _, params in cursor.statements] == [1000, 501]
+        assert all(sql.startswith("SELECT old_task_id, new_task_id FROM moved_tasks") for sql, _ in cursor.statements)
+
+    assert _moved_task_ids(lambda shard: cursors[shard], []) == {}
+
+
+def test_rerun_import_loads_nothing_twice(database, user_id, tmp_path):
+    from database.db import get_db_connection
+    from database.transfer import export_data, import_data
+
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+        INSERT INTO tasks (user_id, task_name, difficulty_level) VALUES (?, 'Task', 2);
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes)
+        VALUES (SCOPE_IDENTITY(), 1, 'First', 5), (SCOPE_IDENTITY(), 2, 'Second', 5);
+        """,
+        (user_id, user_id)
+    )
+    conn.commit()
+
+    exported = export_data(str(tmp_path), [user_id])
+    assert exported["task_steps"] == 2
+
+    # Into the database the rows came from: every row is already there
+    import_data(str(tmp_path))
+
+    cursor.execute(
+        "SELECT COUNT(*) FROM task_steps s JOIN tasks t ON t.task_id = s.task_id WHERE t.user_id = ?",
+        (user_id,)
+    )
+    assert cursor.fetchone()[0] == 2
+    cursor.execute("SELECT COUNT(*) FROM tasks WHERE user_id = ?", (user_id,))
+    assert cursor.fetchone()[0] == 1
+    conn.close()
+
+
+def test_import_moves_tasks_to_the_users_shard(shards, monkeypatch, tmp_path):
+    import uuid
+    from database.db import get_db_connection, shard_for_user, shard_for_task
+    from database.transfer import export_data, import_data
+
+    user_id = next(u for u in (f"test-{uuid.uuid4().hex[:12]}" for _ in range(1000)) if shard_for_user(u, 2) == 1)
+
+    # Written while every user lived on shard 0
+    monkeypatch.setenv("DB_SHARD_RING_SIZE", "1")
+    conn = get_db_connection(user_id=user_id)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SET NOCOUNT ON;
+        INSERT INTO users (user_id, step_granularity, font_preference, input_mode) VALUES (?, 'normal', 'default', 'text');
+        INSERT INTO tasks (user_id, task_name, difficulty_level) VALUES (?, 'Task', 2);
+        DECLARE @task INT = SCOPE_IDENTITY();
+        INSERT INTO task_steps (task_id, step_order, step_text, estimated_time_minutes)
+        VALUES (@task, 1, 'First', 5), (@task, 2, 'Second', 5);
+        INSERT INTO task_recurrences (user_id, source_task_id, schedule) VALUES (?, @task, 'daily');
+        SELECT @task;
+        """,
+        (user_id, user_id, user_id)
+    )
+    old_task_id = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+
+    export_data(str(tmp_path / "export"), [user_id])
+
+    # Imported with the user placed on shard 1
+    monkeypatch.setenv("DB_SHARD_RING_SIZE", "2")
+    import_data(str(tmp_path / "export"), batch_size=1)
+    # A rerun loads nothing twice
+    import_data(str(tmp_path / "export"), batch_size=1)
+
+    conn = get_db_connection(shard=1)
+    cursor = conn.cursor()
+    cursor.execute("SELECT new_task_id FROM moved_tasks WHERE old_task_id = ?", (old_task_id,))
+    new_task_id = cursor.fetchone()[0]
+    assert shard_for_task(new_task_id) == 1
+
+    cursor.execute("SELECT step_text FROM task_steps WHERE task_id = ? ORDER BY step_order", (new_task_id,))
+    assert [row[0] for row in cursor.fetchall()] == ["First", "Second"]
+    cursor.execute("SELECT source_task_id FROM task_recurrences WHERE user_id = ?", (user_id,))
+    assert [row[0] for row in cursor.fetchall()] == [new_task_id]
+    conn.close()
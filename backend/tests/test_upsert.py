@@ -0,0 +1,127 @@
+import threading
+from database.upsert import upsert
+
+
+def test_single_merge_statement(recording_cursor):
+    cursor = recording_cursor()
+
+    upsert(
+        cursor,
+        "users",
+        keys={"user_id": "u1"},
+        values={"step_granularity": "micro", "font_preference": "dyslexic", "input_mode": "voice"}
+    )
+
+    assert len(cursor.statements) == 1
+    sql, params = cursor.statements[0]
+    assert sql.startswith("MERGE users WITH (HOLDLOCK) AS target")
+    assert "USING (SELECT ? AS user_id, ? AS step_granularity, ? AS font_preference, ? AS input_mode) AS source" in sql
+    assert "ON target.user_id = source.user_id" in sql
+    assert "WHEN MATCHED THEN UPDATE SET step_granularity = source.step_granularity, " \
+           "font_preference = source.font_preference, input_mode = source.input_mode" in sql
+    assert "WHEN NOT MATCHED THEN INSERT (user_id, step_granularity, font_preference, input_mode) " \
+           "VALUES (source.user_id, source.step_granularity, source.font_preference, source.input_mode)" in sql
+    assert sql.endswith(";")
+    assert params == ["u1", "micro", "dyslexic", "voice"]
+
+
+def test_composite_key_and_custom_update(recording_cursor):
+    cursor = recording_cursor()
+
+    upsert(
+        cursor,
+        "user_daily_activity",
+        keys={"user_id": "u1", "activity_date": "2026-01-01"},
+        values={"steps_done": 3},
+        update_set={"steps_done": "target.steps_done + source.steps_done"}
+    )
+
+    sql, params = cursor.statements[0]
+    assert "ON target.user_id = source.user_id AND target.activity_date = source.activity_date" in sql
+    assert "WHEN MATCHED THEN UPDATE SET steps_done = target.steps_done + source.steps_done" in sql
+    assert params == ["u1", "2026-01-01", 3]
+
+
+def test_insert_only(recording_cursor):
+    cursor = recording_cursor()
+
+    upsert(cursor, "user_stats", keys={"user_id": "u1"}, values={"streak": 0}, update_set={})
+
+    sql, _ = cursor.statements[0]
+    assert "WHEN MATCHED" not in sql
+    assert "WHEN NOT MATCHED THEN INSERT (user_id, streak)" in sql
+
+
+def test_output_row(recording_cursor):
+    cursor = recording_cursor(rows=[(7, 2)])
+
+    row = upsert(
+        cursor,
+        "user_stats",
+        keys={"user_id": "u1"},
+        values={"streak": 1},
+        output=["reward_points", "streak"]
+    )
+
+    assert row == (7, 2)
+    assert "OUTPUT INSERTED.reward_points, INSERTED.streak ;" in cursor.statements[0][0]
+
+
+class CountingCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.executed = 0
+
+    def execute(self, sql, params=()):
+        self.executed += 1
+        return self.cursor.execute(sql, params)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+
+def test_concurrent_upserts_same_user(database, user_id):
+    from database.db import get_db_connection
+
+    threads = 16
+    rounds = 20
+    errors = []
+    statements = []
+    barrier = threading.Barrier(threads)
+
+    def hammer(worker: int):
+        conn = get_db_connection(user_id=user_id)
+        cursor = CountingCursor(conn.cursor())
+        barrier.wait()
+
+        try:
+            for _ in range(rounds):
+                upsert(
+                    cursor,
+                    "users",
+                    keys={"user_id": user_id},
+                    values={"step_granularity": "normal", "font_preference": f"f{worker}", "input_mode": "text"}
+                )
+                upsert(
+                    cursor,
+                    "user_stats",
+                    keys={"user_id": user_id},
+                    values={"reward_points": 0, "streak": 0},
+                    update_set={}
+                )
+                conn.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            statements.append(cursor.executed)
+            conn.close()
+
+    workers = [threading.Thread(target=hammer, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    # One statement per write; the old check-then-write paths took two
+    assert statements == [2 * rounds] * threads
@@ -0,0 +1,122 @@
+import queue
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from ai import usage_ledger
+from ai.usage_ledger import record_usage, flush, merge_aggregates, usage_aggregates
+
+
+class FakeConnection:
+    def __init__(self, user_id, fail=False):
+        self.user_id = user_id
+        self.fail = fail
+        self.rows = None
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, rows):
+        if self.fail:
+            raise RuntimeError("shard down")
+        self.rows = rows
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def ledger(monkeypatch):
+    """An empty ledger queue with no worker; connections are recorded."""
+    opened = []
+
+    def connect(user_id):
+        opened.append(FakeConnection(user_id))
+        return opened[-1]
+
+    monkeypatch.setattr(usage_ledger, "_queue", queue.Queue(maxsize=3))
+    monkeypatch.setattr(usage_ledger, "_ensure_worker", lambda: None)
+    monkeypatch.setattr(usage_ledger, "get_db_connection", connect)
+    return opened
+
+
+def _entry(user_id, completion_tokens=100):
+    return {"user_id": user_id, "model": "m", "completion_tokens": completion_tokens}
+
+
+def test_full_queue_drops_entries(ledger):
+    for n in range(5):
+        record_usage(_entry("u1", n))
+
+    assert usage_ledger._queue.qsize() == 3
+    flush()
+    assert [row[5] for row in ledger[0].rows] == [0, 1, 2]
+
+
+def test_flush_writes_one_batch_per_user(ledger):
+    record_usage(_entry("u1", 1))
+    record_usage(_entry("u2", 2))
+    record_usage(_entry("u1", 3))
+
+    flush()
+
+    assert [(conn.user_id, len(conn.rows), conn.closed) for conn in ledger] == [("u1", 2, True), ("u2", 1, True)]
+    assert ledger[0].rows[0] == ["u1", None, None, "m", None, 1, None, None, None]
+
+    # Nothing queued, nothing opened
+    flush()
+    assert len(ledger) == 2
+
+
+def test_failed_flush_closes_the_connection(ledger, monkeypatch):
+    opened = []
+
+    def connect(user_id):
+        opened.append(FakeConnection(user_id, fail=user_id == "u1"))
+        return opened[-1]
+
+    monkeypatch.setattr(usage_ledger, "get_db_connection", connect)
+    record_usage(_entry("u1"))
+    record_usage(_entry("u2"))
+
+    flush()
+
+    # One user's shard failing doesn't lose the others' entries
+    assert [(conn.closed, conn.rows is not None) for conn in opened] == [(True, False), (True, True)]
+
+
+def test_usage_aggregates(recording_cursor):
+    cursor = recording_cursor([("u1", 4)])
+    cursor.description = [("user_id",), ("calls",)]
+
+    assert usage_aggregates(cursor, "user", 7) == [{"user_id": "u1", "calls": 4}]
+    sql, params = cursor.statements[0]
+    assert "GROUP BY user_id" in sql and params == [7]
+
+
+def _row(user_id, calls, completion_tokens, completion_samples, latency_ms, latency_samples):
+    return {
+        "user_id": user_id, "calls": calls, "prompt_tokens": None, "truncated": 0,
+        "completion_tokens": completion_tokens, "completion_samples": completion_samples,
+        "latency_ms": latency_ms, "latency_samples": latency_samples
+    }
+
+
+def test_merge_aggregates_across_shards():
+    merged = merge_aggregates([
+        _row("u1", 1, 300, 1, 100, 1),
+        _row("u2", 2, 100, 2, None, 0),
+        # u1's calls from before a move, on the old shard
+        _row("u1", 3, 300, 3, 500, 3)
+    ])
+
+    assert merged == [
+        {"user_id": "u1", "calls": 4, "prompt_tokens": 0, "truncated": 0,
+         "completion_tokens": 600, "avg_completion_tokens": 150, "avg_latency_ms": 150},
+        {"user_id": "u2", "calls": 2, "prompt_tokens": 0, "truncated": 0,
+         "completion_tokens": 100, "avg_completion_tokens": 50, "avg_latency_ms": None}
+    ]
@@ -0,0 +1,215 @@
+import logging
+from database.db import get_db_connection
+from database.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+EVENT_STEP_DONE = "step_done"
+EVENT_TASK_COMPLETED = "task_completed"
+
+# Events younger than this are left for the next run, so rows from
+# transactions still in flight (lower identity, later commit) are not skipped
+SETTLE_SECONDS = 60
+
+# Completed tasks kept per user in the user_recent_tasks rollup
+RECENT_TASKS = 5
+
+
+def log_activity(cursor, user_id: str, task_id: int, event_type: str, step_order=None):
+    """Append one activity event inside the caller's transaction."""
+    cursor.execute(
+        """
+        INSERT INTO activity_events (user_id, task_id, event_type, step_order)
+        VALUES (?, ?, ?, ?)
+        """,
+        (user_id, task_id, event_type, step_order)
+    )
+
+
+def compact_activity(shard: int = 0, batch_size: int = 5000, max_batches: int = 20) -> int:
+    """
+    Roll new activity events on one shard into per-user daily aggregates.
+
+    Each batch is one transaction: aggregate events after the checkpoint,
+    merge them into user_daily_activity, add completions to
+    user_recent_tasks (trimmed to the newest RECENT_TASKS per user) and
+    advance the checkpoint.
+    Raw events are never modified. Events flagged rolled_up arrived with
+    a user from another shard, already counted in the copied rollups.
+
+    Returns:
+        Number of events compacted
+    """
+    conn = get_db_connection(shard=shard)
+    cursor = conn.cursor()
+    compacted = 0
+
+    try:
+        upsert(
+            cursor,
+            "activity_rollup_state",
+            keys={"id": 1},
+            values={"last_event_id": 0},
+            update_set={}
+        )
+        conn.commit()
+
+        for _ in range(max_batches):
+            # Lock the checkpoint so two compactors never double count
+            cursor.execute(
+                "SELECT last_event_id FROM activity_rollup_state WITH (UPDLOCK, HOLDLOCK) WHERE id = 1"
+            )
+            last_event_id = cursor.fetchone()[0]
+
+            cursor.execute(
+                """
+                SELECT MAX(event_id), COUNT(*)
+                FROM (
+                    SELECT TOP (?) event_id
+                    FROM activity_events
+                    WHERE event_id > ?
+                    AND created_at < DATEADD(second, -?, SYSDATETIME())
+                    ORDER BY event_id
+                ) AS batch
+                """,
+                (batch_size, last_event_id, SETTLE_SECONDS)
+            )
+            upper_event_id, count = cursor.fetchone()
+
+            if not count:
+                conn.commit()
+                break
+
+            cursor.execute(
+                """
+                MERGE user_daily_activity WITH (HOLDLOCK) AS target
+                USING (
+                    SELECT
+                        user_id,
+                        CAST(created_at AS DATE) AS activity_date,
+                        SUM(CASE WHEN event_type = ? THEN 1 ELSE 0 END) AS steps_done,
+                        SUM(CASE WHEN event_type = ? THEN 1 ELSE 0 END) AS tasks_completed
+                    FROM activity_events
+                    WHERE event_id > ? AND event_id <= ?
+                    AND rolled_up IS NULL
+                    GROUP BY user_id, CAST(created_at AS DATE)
+                ) AS source
+                ON target.user_id = source.user_id AND target.activity_date = source.activity_date
+                WHEN MATCHED THEN UPDATE SET
+                    steps_done = target.steps_done + source.steps_done,
+                    tasks_completed = target.tasks_completed + source.tasks_completed
+                WHEN NOT MATCHED THEN INSERT (user_id, activity_date, steps_done, tasks_completed)
+                    VALUES (source.user_id, source.activity_date, source.steps_done, source.tasks_completed);
+                """,
+                (EVENT_STEP_DONE, EVENT_TASK_COMPLETED, last_event_id, upper_event_id)
+            )
+
+            cursor.execute(
+                """
+                INSERT INTO user_recent_tasks (user_id, completed_at, task_name)
+                SELECT DISTINCT e.user_id, e.created_at, t.task_name
+                FROM activity_events e
+                JOIN tasks_all t ON t.task_id = e.task_id
+                WHERE e.event_id > ? AND e.event_id <= ?
+                AND e.event_type = ? AND e.rolled_up IS NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM user_recent_tasks r
+                    WHERE r.user_id = e.user_id AND r.completed_at = e.created_at AND r.task_name = t.task_name
+                );
+
+                WITH ranked AS (
+                    SELECT ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY completed_at DESC) AS position
+                    FROM user_recent_tasks
+                    WHERE user_id IN (
+                        SELECT user_id FROM activity_events
+                        WHERE event_id > ? AND event_id <= ? AND event_type = ?
+                    )
+                )
+                DELETE FROM ranked WHERE position > ?;
+                """,
+                (last_event_id, upper_event_id, EVENT_TASK_COMPLETED,
+                 last_event_id, upper_event_id, EVENT_TASK_COMPLETED, RECENT_TASKS)
+            )
+
+            cursor.execute(
+                "UPDATE activity_rollup_state SET last_event_id = ? WHERE id = 1",
+                (upper_event_id,)
+            )
+            conn.commit()
+            compacted += count
+
+            if count < batch_size:
+                break
+
+    finally:
+        conn.close()
+
+    return compacted
+
+
+def get_streak(cursor, user_id: str) -> tuple:
+    """
+    Return (streak, last_completed_date) from the daily rollups: the run
+    of consecutive days with a completion that ends on the latest one.
+    """
+    cursor.execute(
+        """
+        SELECT TOP 1 COUNT(*), MAX(activity_date)
+        FROM (
+            SELECT activity_date,
+                   DATEADD(day, -ROW_NUMBER() OVER (ORDER BY activity_date), activity_date) AS run
+            FROM user_daily_activity
+            WHERE user_id = ? AND tasks_completed > 0
+        ) AS days
+        GROUP BY run
+        ORDER BY MAX(activity_date) DESC
+        """,
+        (user_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return 0, None
+    return row[0], row[1]
+
+
+def get_recent_tasks(cursor, user_id: str) -> list:
+    """Return the user's latest completed tasks from the rollup, newest first."""
+    cursor.execute(
+        """
+        SELECT TOP (?) task_name, completed_at
+        FROM user_recent_tasks
+        WHERE user_id = ?
+        ORDER BY completed_at DESC
+        """,
+        (RECENT_TASKS, user_id)
+    )
+
+    return [
+        {
+            "task_name": row[0],
+            "completed_at": str(row[1]) if row[1] is not None else None
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+def get_daily_activity(cursor, user_id: str, days: int = 30) -> list:
+    """Return the user's rollup rows for the last `days` days, newest first."""
+    cursor.execute(
+        """
+        SELECT activity_date, steps_done, tasks_completed
+        FROM user_daily_activity
+        WHERE user_id = ? AND activity_date >= DATEADD(day, -?, CAST(GETDATE() AS DATE))
+        ORDER BY activity_date DESC
+        """,
+        (user_id, days)
+    )
+
+    return [
+        {
+            "date": str(row[0]),
+            "steps_done": row[1],
+            "tasks_completed": row[2]
+        }
+        for row in cursor.fetchall()
+    ]
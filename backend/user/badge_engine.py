@@ -0,0 +1,116 @@
+from user.badges import BADGES
+
+
+# metric -> [(min, code)], built once from the badge definitions
+BADGE_RULES = {}
+for _badge in BADGES:
+    _rule = _badge.get("rule")
+    if _rule:
+        BADGE_RULES.setdefault(_rule["metric"], []).append((_rule["min"], _badge["code"]))
+
+# Set-based source for each metric, used by the backfill job.
+# Each query returns (user_id, value) for every user with history,
+# reading the archive tier too.
+METRIC_SOURCES = {
+    "tasks_completed": """
+        SELECT user_id, COUNT(*) AS value
+        FROM tasks_all
+        WHERE status = 'completed'
+        GROUP BY user_id
+    """,
+    "streak": """
+        SELECT user_id, streak AS value
+        FROM user_stats
+    """,
+    "difficulty_level": """
+        SELECT user_id, MAX(difficulty_level) AS value
+        FROM tasks_all
+        WHERE status = 'completed'
+        GROUP BY user_id
+    """
+}
+
+
+def evaluate_badges(event: dict) -> list:
+    """
+    Return the badge codes satisfied by a completion event.
+
+    The event carries the maintained counters after the completion
+    (tasks_completed, streak) plus the completed task's difficulty_level,
+    so this never touches history.
+    """
+    earned = []
+    for metric, rules in BADGE_RULES.items():
+        value = event.get(metric) or 0
+        for minimum, code in rules:
+            if value >= minimum:
+                earned.append(code)
+    return earned
+
+
+def award_badges(cursor, user_id: str, codes: list) -> list:
+    """
+    Insert badges the user does not have yet in one statement.
+
+    Returns:
+        The badge codes that were newly awarded
+    """
+    if not codes:
+        return []
+
+    placeholders = ", ".join("(?)" for _ in codes)
+    cursor.execute(
+        f"""
+        INSERT INTO user_badges (user_id, badge_code)
+        OUTPUT INSERTED.badge_code
+        SELECT ?, v.code
+        FROM (VALUES {placeholders}) AS v(code)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM user_badges WITH (UPDLOCK, HOLDLOCK)
+            WHERE user_id = ? AND badge_code = v.code
+        )
+        """,
+        (user_id, *codes, user_id)
+    )
+
+    return [row[0] for row in cursor.fetchall()]
+
+
+def backfill_badges(cursor) -> int:
+    """
+    Award historical badges for every user with set-based SQL.
+
+    Also resyncs the user_stats.tasks_completed counter that the
+    incremental engine relies on. Caller commits.
+
+    Returns:
+        Number of badges inserted
+    """
+    cursor.execute(
+        f"""
+        UPDATE s
+        SET tasks_completed = c.value
+        FROM user_stats s
+        JOIN ({METRIC_SOURCES["tasks_completed"]}) AS c ON c.user_id = s.user_id
+        """
+    )
+
+    inserted = 0
+    for metric, rules in BADGE_RULES.items():
+        for minimum, code in rules:
+            cursor.execute(
+                f"""
+                INSERT INTO user_badges (user_id, badge_code)
+                SELECT m.user_id, ?
+                FROM ({METRIC_SOURCES[metric]}) AS m
+                WHERE m.value >= ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM user_badges b
+                    WHERE b.user_id = m.user_id AND b.badge_code = ?
+                )
+                """,
+                (code, minimum, code)
+            )
+            inserted += max(cursor.rowcount, 0)
+
+    return inserted
@@ -1,34 +1,40 @@
 # Badge definitions for the Micro-Wins app
-# Format: code, name, description, emoji
+# Format: code, name, description, emoji, rule
+# rule: badge is earned once `metric` reaches `min` (see user/badge_engine.py)
 BADGES = [
     {
         "code": "first_task",
         "name": "First Win!",
         "description": "Completed your first task.",
-        "emoji": "🥇"
+        "emoji": "🥇",
+        "rule": {"metric": "tasks_completed", "min": 1}
     },
     {
         "code": "streak_3",
         "name": "3-Day Streak",
         "description": "Completed tasks 3 days in a row.",
-        "emoji": "🔥"
+        "emoji": "🔥",
+        "rule": {"metric": "streak", "min": 3}
     },
     {
         "code": "streak_7",
         "name": "7-Day Streak",
         "description": "Completed tasks 7 days in a row.",
-        "emoji": "🏆"
+        "emoji": "🏆",
+        "rule": {"metric": "streak", "min": 7}
     },
     {
         "code": "ten_tasks",
         "name": "10 Tasks Done",
         "description": "Completed 10 tasks.",
-        "emoji": "🎯"
+        "emoji": "🎯",
+        "rule": {"metric": "tasks_completed", "min": 10}
     },
     {
         "code": "hard_worker",
         "name": "Hard Worker",
         "description": "Completed a hard difficulty task.",
-        "emoji": "💪"
+        "emoji": "💪",
+        "rule": {"metric": "difficulty_level", "min": 4}
     }
 ]
@@ -0,0 +1,49 @@
+import azure.functions as func
+from shared.pipeline import ApiError
+from user.leaderboard import BOARDS, get_boards
+
+MAX_LIMIT = 100
+MAX_AROUND = 25
+
+
+def _int_param(req, name, default, maximum):
+    value = req.params.get(name, str(default))
+    if not value.isdigit():
+        raise ApiError(400, f"{name} must be a number")
+    return min(int(value), maximum)
+
+
+def handle_get_leaderboard(req: func.HttpRequest) -> dict:
+    """
+    Top-N of a board, plus the caller's rank and neighbours when user_id
+    is given. Entries are rank and score only; the caller's own entry is
+    marked "me".
+
+    Query params: board (reward_points | streak), limit, user_id, around.
+    """
+    board_name = req.params.get("board", "reward_points")
+
+    if board_name not in BOARDS:
+        raise ApiError(400, f"board must be one of: {', '.join(BOARDS)}")
+
+    limit = _int_param(req, "limit", 10, MAX_LIMIT)
+    around = _int_param(req, "around", 3, MAX_AROUND)
+    user_id = req.params.get("user_id")
+
+    try:
+        board = get_boards()[board_name]
+    except RuntimeError as e:
+        raise ApiError(503, str(e), code="leaderboard_unavailable")
+
+    response = {
+        "board": board_name,
+        "total": len(board),
+        "top": board.top(limit, user_id)
+    }
+
+    if user_id:
+        me, neighbours = board.around(user_id, around)
+        response["me"] = me
+        response["around"] = neighbours
+
+    return response
@@ -1,153 +1,197 @@
-import json
 import azure.functions as func
 from database.db import get_db_connection
+from shared.pipeline import ApiError
 from user.badges import BADGES
+from user.activity import get_daily_activity, get_recent_tasks, get_streak
+from user import stats_cache
+
+
+def motivational_message(streak: int, tasks_completed: int) -> str:
+    if streak >= 7:
+        return "🔥 Amazing! You're on a hot streak!"
+    if streak >= 3:
+        return "🌟 Great job! Keep your streak going!"
+    if tasks_completed > 0:
+        return "👏 Every step counts. Keep it up!"
+    return "Let's get started with your first win!"
+
+
+def _load_counts(cursor, user_id: str) -> dict:
+    # Completed tasks (hot + archived)
+    cursor.execute(
+        "SELECT COUNT(*) FROM tasks_all WHERE user_id = ? AND status = 'completed'",
+        (user_id,)
+    )
+    total_completed = cursor.fetchone()[0] # type: ignore
+
+    # Active tasks
+    cursor.execute(
+        "SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = 'active'",
+        (user_id,)
+    )
+    total_active = cursor.fetchone()[0] # type: ignore
+
+    return {
+        "total_tasks_completed": total_completed,
+        "total_tasks_active": total_active
+    }
+
+
+def _load_steps(cursor, user_id: str) -> dict:
+    # Total steps completed
+    cursor.execute(
+        """
+        SELECT COUNT(*)
+        FROM task_steps_all ts
+        JOIN tasks_all t ON ts.task_id = t.task_id
+        WHERE t.user_id = ? AND ts.is_done = 1
+        """,
+        (user_id,)
+    )
+    return {"total_steps_completed": cursor.fetchone()[0]} # type: ignore
+
+
+def _load_streak(cursor, user_id: str) -> dict:
+    # Points and the completed counter from user_stats (one row)
+    cursor.execute(
+        "SELECT reward_points, tasks_completed FROM user_stats WHERE user_id = ?",
+        (user_id,)
+    )
+
+    stats_row = cursor.fetchone()
+    reward_points = (stats_row[0] or 0) if stats_row else 0
+    tasks_completed = (stats_row[1] or 0) if stats_row else 0
+
+    # Streak from the daily rollups, as of the last compaction
+    streak, last_completed_date = get_streak(cursor, user_id)
+    if last_completed_date is not None:
+        last_completed_date = str(last_completed_date)
+
+    return {
+        "reward_points": reward_points,
+        "streak": streak,
+        "last_completed_date": last_completed_date,
+        # From the maintained counter, so the header needs no count query
+        "motivational_message": motivational_message(streak, tasks_completed)
+    }
+
+
+def _load_recent_tasks(cursor, user_id: str) -> dict:
+    # Latest completions from the rollup, not raw activity history
+    return {"recent_tasks": get_recent_tasks(cursor, user_id)}
+
+
+def _load_badges(cursor, user_id: str) -> dict:
+    # Badges
+    cursor.execute(
+        "SELECT badge_code, earned_at FROM user_badges WHERE user_id = ?",
+        (user_id,)
+    )
+
+    badge_dict = {b["code"]: b for b in BADGES}
+
+    earned_badges = []
+    for row in cursor.fetchall():
+        code = row[0]
+        earned_at = row[1]
+        if earned_at is not None:
+            earned_at = str(earned_at)
+        badge = badge_dict.get(code)
+        if badge:
+            earned_badges.append({
+                "code": code,
+                "name": badge["name"],
+                "description": badge["description"],
+                "emoji": badge["emoji"],
+                "earned_at": earned_at
+            })
 
+    return {"badges": earned_badges}
 
-def handle_get_user_stats(req: func.HttpRequest) -> func.HttpResponse:
 
-    user_id = req.params.get("user_id")
+def _load_activity(cursor, user_id: str) -> dict:
+    # Daily activity heatmap from the rollup table
+    return {"activity": get_daily_activity(cursor, user_id)}
 
-    if not user_id:
-        return func.HttpResponse(
-            "user_id is required",
-            status_code=400
-        )
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+# section -> (loader, cache TTL in seconds, response fields it provides)
+SECTIONS = {
+    "counts": (_load_counts, 30, ("total_tasks_completed", "total_tasks_active")),
+    "steps": (_load_steps, 30, ("total_steps_completed",)),
+    "streak": (_load_streak, 10, ("reward_points", "streak", "last_completed_date", "motivational_message")),
+    "recent_tasks": (_load_recent_tasks, 30, ("recent_tasks",)),
+    "badges": (_load_badges, 60, ("badges",)),
+    "activity": (_load_activity, 60, ("activity",))
+}
 
-        # Completed tasks
-        cursor.execute(
-            "SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = 'completed'",
-            (user_id,)
-        )
-        total_completed = cursor.fetchone()[0] # type: ignore
+FIELD_SECTIONS = {field: section for section, (_, _, fields) in SECTIONS.items() for field in fields}
 
-        # Active tasks
-        cursor.execute(
-            "SELECT COUNT(*) FROM tasks WHERE user_id = ? AND status = 'active'",
-            (user_id,)
-        )
-        total_active = cursor.fetchone()[0] # type: ignore
-
-        # Total steps completed
-        cursor.execute(
-            """
-            SELECT COUNT(*)
-            FROM task_steps ts
-            JOIN tasks t ON ts.task_id = t.task_id
-            WHERE t.user_id = ? AND ts.is_done = 1
-            """,
-            (user_id,)
-        )
-        total_steps = cursor.fetchone()[0] # type: ignore
-
-        # User stats
-        cursor.execute(
-            """
-            SELECT reward_points, streak, last_completed_date
-            FROM user_stats
-            WHERE user_id = ?
-            """,
-            (user_id,)
-        )
+# Named selections; "header" is what the app bar shows
+FIELD_GROUPS = {
+    "header": ("streak", "reward_points", "motivational_message")
+}
 
-        stats_row = cursor.fetchone()
 
-        if stats_row:
-            reward_points = stats_row[0] or 0
-            streak = stats_row[1] or 0
-            last_completed_date = stats_row[2]
-            if last_completed_date is not None:
-                last_completed_date = str(last_completed_date)
+def _requested_sections(fields_param: str) -> tuple:
+    """Resolve fields= into (sections to load, fields to return or None for all)."""
+    if not fields_param:
+        return list(SECTIONS), None
+
+    fields = []
+    for name in (f.strip() for f in fields_param.split(",")):
+        if not name:
+            continue
+        if name in FIELD_GROUPS:
+            fields.extend(FIELD_GROUPS[name])
+        elif name in SECTIONS:
+            fields.extend(SECTIONS[name][2])
+        elif name in FIELD_SECTIONS:
+            fields.append(name)
         else:
-            reward_points = 0
-            streak = 0
-            last_completed_date = None
-
-        # Recent tasks (SQL Server uses TOP not LIMIT)
-        cursor.execute(
-            """
-            SELECT TOP 5 task_name, created_at
-            FROM tasks
-            WHERE user_id = ? AND status = 'completed'
-            ORDER BY created_at DESC
-            """,
-            (user_id,)
-        )
+            raise ApiError(400, f"Unknown field: {name}")
 
-        recent_rows = cursor.fetchall()
+    sections = list(dict.fromkeys(FIELD_SECTIONS[f] for f in fields))
+    return sections, set(fields)
 
-        recent_tasks = []
-        for row in recent_rows:
-            completed_at = row[1]
-            if completed_at is not None:
-                completed_at = str(completed_at)
-            recent_tasks.append({
-                "task_name": row[0],
-                "completed_at": completed_at
-            })
 
-        # Badges
-        cursor.execute(
-            "SELECT badge_code, earned_at FROM user_badges WHERE user_id = ?",
-            (user_id,)
-        )
+def handle_get_user_stats(req: func.HttpRequest) -> dict:
+    """
+    User stats, optionally narrowed with fields= (field names, section
+    names or "header"). Only the requested sections are queried, each from
+    its own short-TTL cache, and the DB connection is opened only on a miss.
+    """
+    user_id = req.params.get("user_id")
 
-        badge_rows = cursor.fetchall()
-        badge_dict = {b["code"]: b for b in BADGES}
-
-        earned_badges = []
-        for row in badge_rows:
-            code = row[0]
-            earned_at = row[1]
-            if earned_at is not None:
-                earned_at = str(earned_at)
-            badge = badge_dict.get(code)
-            if badge:
-                earned_badges.append({
-                    "code": code,
-                    "name": badge["name"],
-                    "description": badge["description"],
-                    "emoji": badge["emoji"],
-                    "earned_at": earned_at
-                })
-
-        conn.close()
-
-        # Motivational message
-        if streak >= 7:
-            motivational_message = "🔥 Amazing! You're on a hot streak!"
-        elif streak >= 3:
-            motivational_message = "🌟 Great job! Keep your streak going!"
-        elif total_completed > 0:
-            motivational_message = "👏 Every step counts. Keep it up!"
-        else:
-            motivational_message = "Let's get started with your first win!"
-
-        response = {
-            "user_id": user_id,  # yahan int(user_id) hata do, sirf user_id likho
-            "total_tasks_completed": total_completed,
-            "total_tasks_active": total_active,
-            "total_steps_completed": total_steps,
-            "reward_points": reward_points,
-            "streak": streak,
-            "last_completed_date": last_completed_date,
-            "motivational_message": motivational_message,
-            "badges": earned_badges,
-            "recent_tasks": recent_tasks
-        }
-
-        return func.HttpResponse(
-            json.dumps(response),
-            status_code=200,
-            mimetype="application/json"
-        )
+    if not user_id:
+        raise ApiError(400, "user_id is required")
+
+    sections, fields = _requested_sections(req.params.get("fields"))
 
-    except Exception as e:
-        return func.HttpResponse(
-            f"Database error: {str(e)}",
-            status_code=500
+    conn = None
+
+    def load(loader):
+        nonlocal conn
+        if conn is None:
+            conn = get_db_connection(user_id=user_id, read_only=True)
+        return loader(conn.cursor(), user_id)
+
+    response = {"user_id": user_id}
+
+    try:
+        for section in sections:
+            loader, ttl, _ = SECTIONS[section]
+            response.update(stats_cache.get(user_id, section, ttl, lambda: load(loader)))
+    finally:
+        if conn is not None:
+            conn.close()
+
+    # When the counts section is loaded anyway, its exact count decides
+    if "counts" in sections and "streak" in sections:
+        response["motivational_message"] = motivational_message(
+            response["streak"], response["total_tasks_completed"]
         )
+
+    if fields is not None:
+        response = {k: v for k, v in response.items() if k == "user_id" or k in fields}
+
+    return response
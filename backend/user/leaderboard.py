@@ -0,0 +1,245 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from database.db import get_db_connection, shard_count
+
+logger = logging.getLogger(__name__)
+
+BOARDS = ("reward_points", "streak")
+
+# How long a worker serves its in-process boards before reloading the
+# snapshot (which picks up changes made by other workers)
+REFRESH_SECONDS = int(os.getenv("LEADERBOARD_REFRESH_SECONDS", "300"))
+
+FETCH_SIZE = 10000
+
+# Local score changes kept to re-apply over reloaded snapshots that were
+# built before them
+RECENT_LIMIT = 10000
+
+
+class SortedBoard:
+    """
+    Scores kept as a sorted list of (-score, user_id).
+
+    Rank lookups and top-N are a bisect / slice (O(log n)); a score change
+    is a bisect plus one list insert/delete. Ties share a rank, like RANK().
+
+    Every method holds the board's lock, so a read never sees the list
+    half-way through an update.
+
+    Entries carry rank and score only: the board is served on an anonymous
+    route, so user ids never leave it. The caller's own entry is flagged.
+    """
+
+    def __init__(self, entries=None):
+        self.scores = dict(entries or {})
+        self.keys = sorted((-score, user_id) for user_id, score in self.scores.items())
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self.keys)
+
+    def update(self, user_id: str, score: int):
+        with self._lock:
+            old = self.scores.get(user_id)
+            if old == score:
+                return
+
+            if old is not None:
+                index = bisect_left(self.keys, (-old, user_id))
+                if index < len(self.keys) and self.keys[index] == (-old, user_id):
+                    del self.keys[index]
+
+            if score:
+                self.scores[user_id] = score
+                self.keys.insert(bisect_left(self.keys, (-score, user_id)), (-score, user_id))
+            else:
+                self.scores.pop(user_id, None)
+
+    def rank_of_score(self, score: int) -> int:
+        # Users with a strictly higher score, plus one
+        with self._lock:
+            return bisect_left(self.keys, (-score,)) + 1
+
+    def entries(self, start: int, stop: int, user_id: str = None) -> list:
+        with self._lock:
+            entries = []
+            for key in self.keys[max(start, 0):stop]:
+                entry = {"rank": self.rank_of_score(-key[0]), "score": -key[0]}
+                if key[1] == user_id:
+                    entry["me"] = True
+                entries.append(entry)
+            return entries
+
+    def top(self, limit: int, user_id: str = None) -> list:
+        return self.entries(0, limit, user_id)
+
+    def around(self, user_id: str, k: int):
+        """The user's own entry and the k entries either side of it."""
+        with self._lock:
+            score = self.scores.get(user_id)
+            if score is None:
+                return None, []
+
+            index = bisect_left(self.keys, (-score, user_id))
+            me = {"rank": self.rank_of_score(score), "score": score}
+            return me, self.entries(index - k, index + k + 1, user_id)
+
+
+_boards = None
+_loaded_at = 0
+_reloading = False
+_recent = deque(maxlen=RECENT_LIMIT)
+_lock = threading.Lock()
+_load_lock = threading.Lock()
+
+
+def rebuild_snapshot(shard: int = 0) -> int:
+    """
+    Recompute one shard's leaderboard_snapshot from user_stats.
+
+    A streak only counts while it is alive (completed today or yesterday).
+
+    Returns:
+        Number of snapshot rows written
+    """
+    conn = get_db_connection(shard=shard)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("DELETE FROM leaderboard_snapshot")
+        cursor.execute(
+            """
+            INSERT INTO leaderboard_snapshot (board, user_id, score, shard_rank)
+            SELECT 'reward_points', user_id, reward_points,
+                   RANK() OVER (ORDER BY reward_points DESC)
+            FROM user_stats
+            WHERE reward_points > 0
+            UNION ALL
+            SELECT 'streak', user_id, streak,
+                   RANK() OVER (ORDER BY streak DESC)
+            FROM user_stats
+            WHERE streak > 0
+            AND DATEDIFF(day, last_completed_date, CAST(GETDATE() AS DATE)) <= 1
+            """
+        )
+        written = cursor.rowcount
+        conn.commit()
+        return written
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+
+def _load_boards() -> tuple:
+    """
+    Merge every shard's snapshot into one in-process board per metric.
+
+    Returns:
+        (boards, built_at) where built_at is the time.time() the oldest
+        shard snapshot was built, or 0 if a shard has none
+    """
+    entries = {board: {} for board in BOARDS}
+    built_at = None
+
+    for shard in range(shard_count()):
+        conn = get_db_connection(shard=shard, read_only=True)
+        cursor = conn.cursor()
+
+        # Age by the database's own clock, so worker clock skew doesn't matter
+        cursor.execute("SELECT DATEDIFF_BIG(millisecond, MIN(built_at), SYSDATETIME()) FROM leaderboard_snapshot")
+        age_ms = cursor.fetchone()[0]
+        shard_built_at = time.time() - age_ms / 1000 if age_ms is not None else 0
+        built_at = shard_built_at if built_at is None else min(built_at, shard_built_at)
+
+        cursor.execute("SELECT board, user_id, score FROM leaderboard_snapshot")
+
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for board, user_id, score in rows:
+                if board in entries:
+                    entries[board][user_id] = score
+
+        conn.close()
+
+    return {board: SortedBoard(scores) for board, scores in entries.items()}, built_at or 0
+
+
+def _reload():
+    global _boards, _loaded_at, _reloading
+
+    try:
+        boards, built_at = _load_boards()
+    except Exception as e:
+        logger.error(f"Leaderboard reload failed: {e}")
+        with _lock:
+            _reloading = False
+        return
+
+    with _lock:
+        # Changes recorded here after the snapshot was built are newer than
+        # it; older ones are already in it and can be forgotten
+        while _recent and _recent[0][0] < built_at:
+            _recent.popleft()
+        for _, user_id, stats in _recent:
+            _apply(boards, user_id, stats)
+        _boards = boards
+        _loaded_at = time.monotonic()
+        _reloading = False
+
+
+def _apply(boards, user_id, stats):
+    for board in BOARDS:
+        if stats.get(board) is not None:
+            boards[board].update(user_id, stats[board])
+
+
+def get_boards() -> dict:
+    """
+    The in-process boards. The first call loads the snapshot; later
+    refreshes happen in the background while the current boards keep serving.
+    """
+    global _reloading
+
+    if _boards is None:
+        with _load_lock:
+            if _boards is None:
+                with _lock:
+                    _reloading = True
+                _reload()
+        if _boards is None:
+            raise RuntimeError("Leaderboard is not available")
+
+    elif time.monotonic() - _loaded_at > REFRESH_SECONDS:
+        with _lock:
+            if _reloading:
+                return _boards
+            _reloading = True
+        threading.Thread(target=_reload, name="leaderboard-reload", daemon=True).start()
+
+    return _boards
+
+
+def record_scores(user_id: str, stats: dict):
+    """
+    Apply a reward/streak change from record_task_completion to the
+    in-process boards. Call after the transaction commits.
+
+    The change is also kept until a reloaded snapshot includes it, so a
+    reload of an older snapshot doesn't undo it.
+    """
+    with _lock:
+        if _boards is not None:
+            _apply(_boards, user_id, stats)
+        _recent.append((time.time(), user_id, stats))
@@ -0,0 +1,62 @@
+from datetime import date
+
+from database.upsert import upsert
+from user.badge_engine import evaluate_badges, award_badges
+
+REWARD_PER_TASK = 10
+
+
+def record_task_completion(cursor, user_id: str, difficulty_level: int, tasks_completed: int = 1) -> dict:
+    """
+    Apply rewards, streak and badges for completed tasks.
+
+    Runs inside the caller's transaction. Same day keeps the streak,
+    next day extends it, a gap resets it.
+
+    Returns:
+        Dict with updated reward_points, streak, tasks_completed and new_badges
+    """
+    today = date.today()
+
+    stats = upsert(
+        cursor,
+        "user_stats",
+        keys={"user_id": user_id},
+        values={
+            "reward_points": REWARD_PER_TASK * tasks_completed,
+            "streak": 1,
+            "last_completed_date": today,
+            "tasks_completed": tasks_completed
+        },
+        update_set={
+            "reward_points": "ISNULL(target.reward_points, 0) + source.reward_points",
+            "streak": """CASE
+                WHEN target.last_completed_date IS NULL THEN 1
+                WHEN DATEDIFF(day, target.last_completed_date, source.last_completed_date) = 1
+                    THEN ISNULL(target.streak, 0) + 1
+                WHEN DATEDIFF(day, target.last_completed_date, source.last_completed_date) > 1
+                    THEN 1
+                ELSE ISNULL(target.streak, 0)
+            END""",
+            "last_completed_date": "source.last_completed_date",
+            "tasks_completed": "ISNULL(target.tasks_completed, 0) + source.tasks_completed"
+        },
+        output=["reward_points", "streak", "tasks_completed"]
+    )
+
+    reward_points, streak, total_completed = stats[0], stats[1], stats[2]
+
+    # Badge rules only need the counters we just wrote
+    codes = evaluate_badges({
+        "tasks_completed": total_completed,
+        "streak": streak,
+        "difficulty_level": difficulty_level
+    })
+    new_badges = award_badges(cursor, user_id, codes)
+
+    return {
+        "reward_points": reward_points,
+        "streak": streak,
+        "tasks_completed": total_completed,
+        "new_badges": new_badges
+    }
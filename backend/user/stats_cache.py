@@ -0,0 +1,58 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Users kept per worker (least recently used dropped first)
+MAX_USERS = 10000
+
+_lock = threading.Lock()
+# user_id -> [generation, {section: (expires_at, value)}]
+_users = OrderedDict()
+
+
+def _user(user_id):
+    user = _users.get(user_id)
+    if user is None:
+        user = _users[user_id] = [0, {}]
+    _users.move_to_end(user_id)
+    while len(_users) > MAX_USERS:
+        _users.popitem(last=False)
+    return user
+
+
+def get(user_id: str, section: str, ttl: float, loader):
+    """
+    Cached value of one stats section for a user, loading it on a miss.
+
+    The cache is per worker: write paths on this worker invalidate it right
+    away, writes on other workers show up once the TTL runs out.
+    """
+    now = time.monotonic()
+
+    with _lock:
+        user = _user(user_id)
+        generation = user[0]
+        entry = user[1].get(section)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+    value = loader()
+
+    with _lock:
+        user = _user(user_id)
+        # An invalidation during the load means the value may predate a write
+        if user[0] == generation:
+            user[1][section] = (now + ttl, value)
+
+    return value
+
+
+def invalidate(user_id: str, sections=None):
+    """Drop a user's cached sections (all of them by default)."""
+    with _lock:
+        user = _users.get(user_id)
+        if user is None:
+            return
+        user[0] += 1
+        for section in list(user[1]) if sections is None else sections:
+            user[1].pop(section, None)